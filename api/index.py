@@ -1,158 +1,334 @@
+"""
+Serverless entry point for the API's stateless routes
+
+A thin adapter over the same services the FastAPI app uses: each route is
+a function from the parsed request to a JSON-serializable response, and
+the handler class only matches routes and does the HTTP and JSON work,
+once, for all of them. FastAPI itself isn't imported, since importing it
+costs several times the rest of a cold start; the engines are the
+process-wide singletons from app.dependencies, built once per warm
+instance, and modules only some routes need are imported by those routes.
+"""
 from http.server import BaseHTTPRequestHandler
 import json
+import re
 import sys
 import os
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
 
 # Add the backend directory to the Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from app.services.formatter import LinkedInFormatter
-from app.services.validator import ContentValidator
-from app.services.templates import TemplateService
+from app.dependencies import (
+    get_formatter, get_profiler, get_request_limits, get_response_encoder, get_result_cache, get_template_service,
+    get_validator
+)
+from app.services.admission import RequestLimitError
+from app.services.batch import check_document, format_document, format_key
+from app.services.budget import BudgetExceeded, time_budget
+from app.services.cache import make_key
+from app.services.metrics import flag_enabled
+from app.services.profiling import profiled_or_cached
+from app.services.response import Payload, dumps
+
+CORS_HEADERS = (
+    ('Access-Control-Allow-Origin', '*'),
+    ('Access-Control-Allow-Methods', 'GET, POST, OPTIONS'),
+    ('Access-Control-Allow-Headers', 'Content-Type'),
+)
+
+# Built by the first batch request. Serverless functions run a single
+# process, so batches are always formatted inline.
+_batch_processor = None
+
+
+class HTTPError(Exception):
+    """A client error: the request is answered with this status and message"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    """What a route function gets: the JSON body, query parameters, headers and path parameters"""
+
+    def __init__(self, body: Any, query: Dict[str, List[str]], headers, path_params: Dict[str, str]):
+        self.body = body
+        self.query = query
+        self.headers = headers
+        self.path_params = path_params
+
+    def profiler(self):
+        """The profiler, for requests sent with X-Profile: 1 while profiling is enabled"""
+        return get_profiler() if flag_enabled(self.headers.get('X-Profile')) else None
+
+
+def _content_document(request: Request, *fields: str) -> Dict[str, Any]:
+    data = request.body
+    if not isinstance(data, dict) or 'content' not in data:
+        raise HTTPError(400, "Content is required")
+    defaults = {'preserve_formatting': True, 'parser': 'regex', 'normalization': None, 'ranges': [],
+                'fused': False, 'thread_limit': None}
+    document = {'content': data['content'], **{field: data.get(field, defaults[field]) for field in fields}}
+    try:
+        check_document(document)
+    except ValueError as e:
+        raise HTTPError(400, str(e))
+    return document
+
+
+def format_content(request: Request) -> Dict[str, Any]:
+    # Format and validate, or reuse the result for identical content and options
+    document = _content_document(request, 'preserve_formatting', 'parser', 'normalization', 'fused', 'thread_limit')
+    result, profile = profiled_or_cached(get_result_cache(), format_key(document), lambda: format_document(
+        get_formatter(), get_validator(), document, get_request_limits().time_budget
+    ), request.profiler())
+    return {
+        'formatted_content': result['formatted_content'],
+        'character_count': result['character_count'],
+        'warnings': result['warnings'],
+        'length': result['length'],
+        'thread': result['thread'],
+        'profile': profile
+    }
+
+
+def format_content_advanced(request: Request) -> Dict[str, Any]:
+    # Format with the ranges and validate, or reuse an identical earlier result
+    document = _content_document(request, 'ranges', 'fused', 'thread_limit')
+    get_request_limits().check_ranges([document])
+    result, profile = profiled_or_cached(get_result_cache(), format_key(document), lambda: format_document(
+        get_formatter(), get_validator(), document, get_request_limits().time_budget
+    ), request.profiler())
+    return {**result, 'profile': profile}
+
+
+def format_batch(request: Request) -> Dict[str, Any]:
+    global _batch_processor
+    documents = request.body.get('documents') if isinstance(request.body, dict) else None
+    if not isinstance(documents, list):
+        raise HTTPError(400, "Documents are required")
+    if _batch_processor is None:
+        from app.services.batch import BatchProcessor
+        _batch_processor = BatchProcessor()
+
+    # Format every document; failures are reported per item
+    limits = get_request_limits()
+    limits.check_ranges(documents)
+    batch = _batch_processor.run(get_formatter(), get_validator(), documents, limits.time_budget)
+    return {
+        'results': batch['results'],
+        'count': len(documents),
+        'error_count': batch['error_count'],
+        'elapsed_ms': batch['elapsed_ms'],
+        'items_per_second': batch['items_per_second']
+    }
+
+
+def validate_content(request: Request) -> Dict[str, Any]:
+    # Validate the content, or reuse the result for identical content
+    content = _content_document(request)['content']
+    validator = get_validator()
+    result, profile = profiled_or_cached(
+        get_result_cache(), make_key('validate', content), lambda: validator.validate_content(content),
+        request.profiler()
+    )
+    return {
+        'is_valid': result.get('is_valid', True),
+        'warnings': result.get('warnings', []),
+        'suggestions': result.get('suggestions', []),
+        'profile': profile
+    }
+
+
+def unformat_content(request: Request) -> Dict[str, Any]:
+    if not isinstance(request.body, dict) or not isinstance(request.body.get('content'), str):
+        raise HTTPError(400, "Content is required")
+    content = get_formatter().unformat(request.body['content'])
+    return {'content': content, 'character_count': len(content)}
+
+
+def unformat_batch(request: Request) -> Dict[str, Any]:
+    contents = request.body.get('contents') if isinstance(request.body, dict) else None
+    if not isinstance(contents, list) or not all(isinstance(content, str) for content in contents):
+        raise HTTPError(400, "Contents must be a list of strings")
+
+    started = time.perf_counter()
+    results = get_formatter().unformat_many(contents)
+    elapsed = time.perf_counter() - started
+    return {
+        'results': results,
+        'count': len(results),
+        'elapsed_ms': elapsed * 1000,
+        'items_per_second': len(results) / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def render_template(request: Request) -> Dict[str, Any]:
+    from app.services.template_render import TemplateRenderer
+
+    data = request.body if isinstance(request.body, dict) else {}
+    variables = data.get('variables', {})
+    parser = data.get('parser', 'regex')
+    if not isinstance(variables, dict):
+        raise HTTPError(400, "variables must be an object")
+    if parser not in ('regex', 'fast'):
+        raise HTTPError(400, "parser must be 'regex' or 'fast'")
+    template_id = request.path_params['template_id']
+    template = get_template_service().get_compiled_template(template_id)
+    if template is None:
+        raise HTTPError(404, "Template not found")
+
+    renderer = TemplateRenderer(get_formatter(), get_validator(), template,
+                                data.get('format_output', True), data.get('preserve_formatting', True), parser)
+    with time_budget(get_request_limits().time_budget):
+        result = renderer.render(variables)
+    return {'template_id': template_id, **result}
+
+
+def get_templates(request: Request) -> Payload:
+    # Serialized once until the templates change
+    return get_template_service().get_templates_payload(request.query.get('category', [None])[0])
+
+
+def search_templates(request: Request) -> Dict[str, Any]:
+    params = request.query
+    if 'q' not in params:
+        raise HTTPError(400, "q is required")
+    try:
+        limit = int(params.get('limit', ['20'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+    except ValueError:
+        raise HTTPError(400, "limit and offset must be integers")
+    if not 1 <= limit <= 100 or offset < 0:
+        raise HTTPError(400, "limit must be 1-100 and offset at least 0")
+    category = params.get('category', [None])[0]
+
+    hits, has_more = get_template_service().search_templates(params['q'][0], limit=limit, offset=offset, category=category)
+    return {
+        'results': [{**template, 'score': score} for template, score in hits],
+        'offset': offset,
+        'limit': limit,
+        'has_more': has_more
+    }
+
+
+def cache_stats(request: Request) -> Dict[str, Any]:
+    return get_result_cache().stats()
+
+
+# (method, path pattern, route function); {name} matches one path segment
+ROUTES = [
+    ('POST', '/api/format', format_content),
+    ('POST', '/api/format-advanced', format_content_advanced),
+    ('POST', '/api/format/batch', format_batch),
+    ('POST', '/api/validate', validate_content),
+    ('POST', '/api/unformat', unformat_content),
+    ('POST', '/api/unformat/batch', unformat_batch),
+    ('POST', '/api/templates/{template_id}/render', render_template),
+    ('GET', '/api/templates', get_templates),
+    ('GET', '/api/templates/search', search_templates),
+    ('GET', '/api/cache/stats', cache_stats),
+]
+
+
+def _compile_routes(routes) -> Dict[str, List[tuple]]:
+    compiled: Dict[str, List[tuple]] = {}
+    for method, path, function in routes:
+        pattern = re.compile(re.sub(r'\{(\w+)\}', r'(?P<\1>[^/]+)', path) + '$')
+        compiled.setdefault(method, []).append((pattern, function))
+    return compiled
+
+
+_ROUTE_TABLE = _compile_routes(ROUTES)
+
+
+def match_route(method: str, path: str) -> Optional[tuple]:
+    """The route function and path parameters for a request, or None"""
+    for pattern, function in _ROUTE_TABLE.get(method, ()):
+        match = pattern.match(path)
+        if match:
+            return function, match.groupdict()
+    return None
+
+
+def _content_length(value: Optional[str]) -> int:
+    """
+    The body size a POST declares
+
+    Raises:
+        HTTPError: 400 if Content-Length is missing, negative or not a number
+    """
+    # int() alone would take '-1', and rfile.read(-1) reads to EOF past any cap;
+    # isdigit alone takes non-ASCII digits int() can't parse
+    if value is None or not value.isascii() or not value.strip().isdigit():
+        raise HTTPError(400, "Content-Length must be given as a non-negative integer")
+    return int(value)
+
 
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
-        if self.path == '/api/format':
-            self.handle_format()
-        elif self.path == '/api/format-advanced':
-            self.handle_format_advanced()
-        elif self.path == '/api/validate':
-            self.handle_validate()
-        else:
-            self.send_error(404, "Not Found")
-    
+        self.dispatch('POST')
+
     def do_GET(self):
-        if self.path == '/api/templates':
-            self.handle_templates()
-        else:
+        self.dispatch('GET')
+
+    def dispatch(self, method: str):
+        url = urlsplit(self.path)
+        route = match_route(method, url.path)
+        if route is None:
             self.send_error(404, "Not Found")
-    
-    def handle_format(self):
-        try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            if 'content' not in data:
-                self.send_error(400, "Content is required")
-                return
-            
-            # Format the content
-            formatter = LinkedInFormatter()
-            formatted_content = formatter.format_for_linkedin(
-                data['content'], 
-                preserve_formatting=data.get('preserve_formatting', True)
-            )
-            
-            # Validate the formatted content
-            validator = ContentValidator()
-            validation_result = validator.validate_content(formatted_content)
-            
-            response = {
-                'formatted_content': formatted_content,
-                'character_count': len(formatted_content),
-                'warnings': validation_result.get('warnings', [])
-            }
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
-            
-        except Exception as e:
-            self.send_error(500, str(e))
-    
-    def handle_format_advanced(self):
-        try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            if 'content' not in data:
-                self.send_error(400, "Content is required")
-                return
-            
-            # Format the content with ranges
-            formatter = LinkedInFormatter()
-            formatted_content = formatter.format_with_ranges(
-                data['content'], 
-                data.get('ranges', [])
-            )
-            
-            # Validate the formatted content
-            validator = ContentValidator()
-            validation_result = validator.validate_content(formatted_content)
-            
-            response = {
-                'formatted_content': formatted_content,
-                'character_count': len(formatted_content),
-                'warnings': validation_result.get('warnings', [])
-            }
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
-            
-        except Exception as e:
-            self.send_error(500, str(e))
-    
-    def handle_validate(self):
+            return
+        function, path_params = route
         try:
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
-            
-            if 'content' not in data:
-                self.send_error(400, "Content is required")
-                return
-            
-            # Validate the content
-            validator = ContentValidator()
-            result = validator.validate_content(data['content'])
-            
-            response = {
-                'is_valid': result.get('is_valid', True),
-                'warnings': result.get('warnings', []),
-                'suggestions': result.get('suggestions', [])
-            }
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode())
-            
+            body = None
+            if method == 'POST':
+                content_length = _content_length(self.headers.get('Content-Length'))
+                get_request_limits().check_body_size(content_length)
+                body = json.loads(self.rfile.read(content_length).decode('utf-8')) if content_length else None
+            response = function(Request(body, parse_qs(url.query), self.headers, path_params))
+        except HTTPError as e:
+            self.send_error(e.status, str(e))
+            return
+        except RequestLimitError as e:
+            self.send_error(413, str(e))
+            return
+        except BudgetExceeded as e:
+            self.send_error(422, str(e))
+            return
+        except ValueError as e:
+            # Malformed JSON, and the engines' rejections of bad options
+            self.send_error(400, str(e))
+            return
         except Exception as e:
             self.send_error(500, str(e))
-    
-    def handle_templates(self):
-        try:
-            template_service = TemplateService()
-            templates = template_service.get_templates()
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.send_header('Access-Control-Allow-Origin', '*')
-            self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            self.send_header('Access-Control-Allow-Headers', 'Content-Type')
-            self.end_headers()
-            self.wfile.write(json.dumps(templates).encode())
-            
-        except Exception as e:
-            self.send_error(500, str(e))
-    
+            return
+        self.send_json(response)
+
+    def send_json(self, response: Any):
+        """Send a route's response or pre-serialized Payload, compressed if large and accepted"""
+        encoder = get_response_encoder()
+        accept_encoding = self.headers.get('Accept-Encoding')
+        if isinstance(response, Payload):
+            body, encoding = encoder.encode_payload(response, accept_encoding)
+        else:
+            body, encoding = encoder.encode(dumps(response), accept_encoding)
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Vary', 'Accept-Encoding')
+        if encoding is not None:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
     def do_OPTIONS(self):
         self.send_response(200)
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        for name, value in CORS_HEADERS:
+            self.send_header(name, value)
         self.end_headers()
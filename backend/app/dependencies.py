@@ -0,0 +1,166 @@
+"""Shared service instances injected into the API routes"""
+import os
+from typing import Optional
+
+from app.services.admission import ConcurrencyLimiter, RequestLimits
+from app.services.batch import BatchProcessor
+from app.services.cache import ResultCache
+from app.services.format_session import FormatSessions
+from app.services.formatter import LinkedInFormatter
+from app.services.metrics import FORMATTER_STAGES, VALIDATOR_STAGES, Metrics, flag_enabled, instrument
+from app.services.offload import Offloader
+from app.services.profiling import Profiler
+from app.services.response import ResponseEncoder
+from app.services.templates import TemplateService
+from app.services.validator import ContentValidator
+from app.services.workers import WorkerPool
+
+
+def _limit(name: str, default: str, convert):
+    """The setting from the environment, or None when it is set to off"""
+    value = os.environ.get(name, default)
+    return None if value.strip().lower() == "off" else convert(value)
+
+
+# The formatter and validator hold no per-request state, so one instance of
+# each is built at import time and shared by every request in the process.
+_formatter = LinkedInFormatter()
+_validator = ContentValidator()
+
+# Request and stage metrics, served at /metrics, only when METRICS_ENABLED
+# is set. Otherwise no middleware is installed and the formatter and
+# validator are left as they are, so they cost nothing.
+_metrics = Metrics() if flag_enabled(os.environ.get("METRICS_ENABLED")) else None
+instrument(_formatter, "formatter", FORMATTER_STAGES, _metrics)
+instrument(_validator, "validator", VALIDATOR_STAGES, _metrics)
+
+# Requests sending "X-Profile: 1" are profiled, only when PROFILING_ENABLED
+# is set. Profiles come back in the response and, with PROFILE_DIR set, are
+# also saved there.
+_profiler = Profiler(os.environ.get("PROFILE_DIR")) if flag_enabled(os.environ.get("PROFILING_ENABLED")) else None
+
+# One pool of WORKER_PROCESSES worker processes (default the CPU count),
+# shared by large batches and offloaded inputs. It is only started by the
+# first task, and replaced if one of its processes dies.
+_worker_processes = os.environ.get("WORKER_PROCESSES")
+_worker_pool = WorkerPool(None if _worker_processes is None else int(_worker_processes))
+
+_batch_processor = BatchProcessor(pool=_worker_pool)
+
+# Inputs of at least OFFLOAD_THRESHOLD characters (default 16384, "off" for
+# none) are formatted off the event loop, at most OFFLOAD_WORKERS (default 2)
+# at once, in the worker pool or in threads with OFFLOAD_MODE=thread.
+_offloader = Offloader(
+    _limit("OFFLOAD_THRESHOLD", "16384", int),
+    int(os.environ.get("OFFLOAD_WORKERS", "2")),
+    os.environ.get("OFFLOAD_MODE", "process"),
+    _worker_pool
+)
+
+# Caps on a single request, each "off" for none: bodies of at most
+# MAX_BODY_BYTES (default 4 MiB), at most MAX_RANGES formatting ranges
+# (default 50000, room for the tens of thousands range formatting is built
+# to handle, which take over 2 MiB of JSON), and FORMAT_TIME_BUDGET CPU
+# seconds (default 2) to format each document before it is abandoned. Streamed bodies may be any size,
+# but each paragraph or row of at most MAX_STREAM_UNIT characters (default
+# 262144).
+_request_limits = RequestLimits(
+    _limit("MAX_BODY_BYTES", "4194304", int),
+    _limit("MAX_RANGES", "50000", int),
+    _limit("FORMAT_TIME_BUDGET", "2", float),
+    _limit("MAX_STREAM_UNIT", "262144", int)
+)
+
+# At most MAX_CONCURRENT_REQUESTS /api requests (default 32, "off" for no
+# limit) are handled at once. Up to MAX_QUEUED_REQUESTS more (default 128)
+# wait for a slot, for at most QUEUE_TIMEOUT seconds (default 5); the rest
+# get 429 with a Retry-After of RETRY_AFTER seconds (default 1).
+_max_concurrent = _limit("MAX_CONCURRENT_REQUESTS", "32", int)
+_limiter = None if _max_concurrent is None else ConcurrencyLimiter(
+    _max_concurrent,
+    int(os.environ.get("MAX_QUEUED_REQUESTS", "128")),
+    float(os.environ.get("QUEUE_TIMEOUT", "5")),
+    int(os.environ.get("RETRY_AFTER", "1"))
+)
+
+# JSON responses of at least COMPRESS_MIN_SIZE bytes (default 1024, "off"
+# for none) are sent gzip compressed to clients that accept it, or brotli
+# compressed when the brotli package is installed.
+_response_encoder = ResponseEncoder(_limit("COMPRESS_MIN_SIZE", "1024", int))
+
+# Templates are loaded once and re-read only when another process changes
+# the store. TEMPLATES_STORE picks the backend by extension: .json (default),
+# .jsonl journal or .db SQLite; a new journal or database is seeded from
+# templates.json.
+_template_service = TemplateService(os.environ.get("TEMPLATES_STORE", "templates.json"))
+
+# Format and validate results, shared by every request in the process
+_result_cache = ResultCache()
+
+# Documents being edited through /format/sessions, held by this process
+_format_sessions = FormatSessions()
+
+
+def get_formatter() -> LinkedInFormatter:
+    """Return the process-wide formatter engine"""
+    return _formatter
+
+
+def get_validator() -> ContentValidator:
+    """Return the process-wide content validator"""
+    return _validator
+
+
+def get_metrics() -> Optional[Metrics]:
+    """Return the process-wide metrics, or None when they are disabled"""
+    return _metrics
+
+
+def get_profiler() -> Optional[Profiler]:
+    """Return the process-wide request profiler, or None when profiling is disabled"""
+    return _profiler
+
+
+def get_worker_pool() -> WorkerPool:
+    """Return the process-wide worker processes"""
+    return _worker_pool
+
+
+def get_batch_processor() -> BatchProcessor:
+    """Return the process-wide batch processor"""
+    return _batch_processor
+
+
+def get_offloader() -> Offloader:
+    """Return the process-wide offloader for large inputs"""
+    return _offloader
+
+
+def get_request_limits() -> RequestLimits:
+    """Return the process-wide caps on a single request"""
+    return _request_limits
+
+
+def get_limiter() -> Optional[ConcurrencyLimiter]:
+    """Return the process-wide concurrency limiter, or None when concurrency isn't limited"""
+    return _limiter
+
+
+def get_response_encoder() -> ResponseEncoder:
+    """Return the process-wide response compressor"""
+    return _response_encoder
+
+
+def get_result_cache() -> ResultCache:
+    """Return the process-wide format/validate result cache"""
+    return _result_cache
+
+
+def get_template_service() -> TemplateService:
+    """Return the process-wide template repository"""
+    return _template_service
+
+
+def get_format_sessions() -> FormatSessions:
+    """Return the process-wide incremental formatting sessions"""
+    return _format_sessions
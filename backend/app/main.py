@@ -1,11 +1,32 @@
-from fastapi import FastAPI
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import formatter, templates
+from fastapi.responses import JSONResponse
+from app.routes import admission, formatter, metrics, responses, templates
+from app.dependencies import (
+    get_limiter, get_metrics, get_offloader, get_request_limits, get_response_encoder, get_worker_pool
+)
+from app.services.admission import RequestLimitError
+from app.services.budget import BudgetExceeded
 
 app = FastAPI(
     title="Clipsy API",
     description="API for formatting content to be LinkedIn-compatible",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=responses.FastJSONResponse
+)
+
+# Compresses large JSON responses. Added first so it is innermost, and
+# metrics count the bytes actually sent.
+app.add_middleware(responses.CompressionMiddleware, encoder=get_response_encoder())
+
+# Body size caps and the concurrency limiter. Added before CORS so CORS
+# wraps it and 413 and 429 responses still reach the frontend.
+app.add_middleware(
+    admission.AdmissionMiddleware,
+    limits=get_request_limits(),
+    limiter=get_limiter(),
+    metrics=get_metrics()
 )
 
 # CORS middleware for frontend communication
@@ -21,6 +42,31 @@ app.add_middleware(
 app.include_router(formatter.router, prefix="/api", tags=["formatter"])
 app.include_router(templates.router, prefix="/api", tags=["templates"])
 
+# Request metrics and /metrics only exist when METRICS_ENABLED is set. The
+# middleware is added last so it is outermost and times everything below it.
+if get_metrics() is not None:
+    app.add_middleware(metrics.MetricsMiddleware, metrics=get_metrics(), routes=app.routes)
+    app.include_router(metrics.router, tags=["metrics"])
+
+@app.exception_handler(RequestLimitError)
+async def request_limit_exceeded(request: Request, exc: RequestLimitError):
+    if get_metrics() is not None:
+        get_metrics().observe_rejected(exc.reason)
+    return JSONResponse({"detail": str(exc)}, status_code=413)
+
+@app.exception_handler(BudgetExceeded)
+async def budget_exceeded(request: Request, exc: BudgetExceeded):
+    if get_metrics() is not None:
+        get_metrics().observe_shed("time_budget")
+    return JSONResponse({"detail": str(exc)}, status_code=422)
+
+@app.exception_handler(BrokenProcessPool)
+async def worker_died(request: Request, exc: BrokenProcessPool):
+    # The pool has been replaced and the task retried once, so the next
+    # request should succeed
+    return JSONResponse({"detail": "A worker process died; try again"}, status_code=503,
+                        headers={"Retry-After": "1"})
+
 @app.get("/")
 async def root():
     return {"message": "Clipsy API"}
@@ -28,3 +74,8 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    get_offloader().shutdown()
+    get_worker_pool().shutdown()
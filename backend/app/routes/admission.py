@@ -0,0 +1,85 @@
+from typing import Optional
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from app.services.admission import ConcurrencyLimiter, RequestLimitError, RequestLimits, Saturated
+from app.services.metrics import Metrics
+
+def _streams_body(path: str) -> bool:
+    """Routes that read their body as it arrives, holding at most one paragraph or row of it (max_stream_unit)"""
+    return path == "/api/format/stream" or path.endswith("/render/bulk")
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware deciding which /api requests are let in
+
+    Bodies over the size cap get 413: at once when Content-Length says so,
+    otherwise as soon as the body read so far passes it, so an oversized
+    upload is never buffered whole. Requests are then admitted through
+    the concurrency limiter; one it turns away or sheds gets 429 with
+    Retry-After. /health, / and /metrics are never limited.
+    """
+
+    def __init__(self, app, limits: RequestLimits, limiter: Optional[ConcurrencyLimiter] = None,
+                 metrics: Optional[Metrics] = None):
+        self.app = app
+        self.limits = limits
+        self.limiter = limiter
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        if self.limits.max_body_bytes is not None and not _streams_body(scope["path"]):
+            try:
+                for name, value in scope["headers"]:
+                    if name == b"content-length" and value.isdigit():
+                        self.limits.check_body_size(int(value))
+            except RequestLimitError as e:
+                self._observe_rejected(e.reason)
+                await JSONResponse({"detail": str(e)}, status_code=413)(scope, receive, send)
+                return
+            receive = self._capped_receive(receive)
+
+        if self.limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.limiter.acquire()
+        except Saturated as e:
+            (self._observe_rejected if e.reason == "queue_full" else self._observe_shed)(e.reason)
+            await JSONResponse(
+                {"detail": str(e)}, status_code=429, headers={"Retry-After": str(e.retry_after)}
+            )(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+    def _capped_receive(self, receive):
+        """receive, raising 413 once the body passes the cap (for bodies sent without Content-Length)"""
+        received = 0
+
+        async def capped_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                try:
+                    self.limits.check_body_size(received)
+                except RequestLimitError as e:
+                    self._observe_rejected(e.reason)
+                    raise HTTPException(status_code=413, detail=str(e))
+            return message
+        return capped_receive
+
+    def _observe_rejected(self, reason: str):
+        if self.metrics is not None:
+            self.metrics.observe_rejected(reason)
+
+    def _observe_shed(self, reason: str):
+        if self.metrics is not None:
+            self.metrics.observe_shed(reason)
@@ -1,22 +1,121 @@
-from fastapi import APIRouter
+import codecs
+import time
+from typing import AsyncIterator, Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from app.dependencies import (
+    get_batch_processor, get_format_sessions, get_formatter, get_offloader, get_profiler, get_request_limits,
+    get_result_cache, get_validator
+)
+from app.services.admission import RequestLimitError, RequestLimits
+from app.services.batch import BatchProcessor, format_key
+from app.services.budget import BudgetExceeded, time_budget
+from app.services.cache import ResultCache, make_key
+from app.services.format_session import FormatSession, FormatSessions, SessionLimitError
 from app.services.formatter import LinkedInFormatter
+from app.services.metrics import flag_enabled
+from app.services.offload import Offloader
+from app.services.pipeline import FormatStream
+from app.services.profiling import Profiler, profiled_or_cached
+from app.services.response import dumps
 from app.services.validator import ContentValidator
 
 router = APIRouter()
 
+class RequestStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator may still be reading the request
+
+    The stock response listens for a client disconnect by consuming
+    receive(), which would swallow request body messages the iterator is
+    waiting for, so this one only streams.
+
+    The response only starts with the first chunk, so a request rejected
+    before any output (a RequestLimitError or BudgetExceeded) gets its
+    error status. Once output has been sent, such an error ends the body
+    with a last NDJSON line {"error": ...} instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+    async def stream_response(self, send):
+        started = False
+        try:
+            async for chunk in self.body_iterator:
+                if not isinstance(chunk, bytes):
+                    chunk = chunk.encode(self.charset)
+                if not started:
+                    await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+                    started = True
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except (RequestLimitError, BudgetExceeded) as e:
+            if not started:
+                raise
+            await send({"type": "http.response.body", "body": dumps({"error": str(e)}) + b"\n", "more_body": True})
+        if not started:
+            await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
 class FormatRequest(BaseModel):
     content: str
     preserve_formatting: bool = True
+    parser: Literal["regex", "fast"] = "regex"  # "fast" = single-pass parser with nested styles
+    fused: bool = False  # Validate with stats recorded while formatting instead of rescanning
+    normalization: Optional[Literal["NFC", "NFKC"]] = None  # Unicode normalization applied to the input
+    thread_limit: Optional[int] = None  # When set, also split the output into numbered posts this long (UTF-16 units)
+
+class FormatRange(BaseModel):
+    start: int
+    end: int
+    styles: list[str] = []  # "bold", "italic" and/or "underline"
 
 class AdvancedFormatRequest(BaseModel):
     content: str
-    ranges: list[dict] = []  # List of formatting ranges with start, end, and styles
+    ranges: list[FormatRange] = []
+    fused: bool = False
+    thread_limit: Optional[int] = None
+
+class TextLengthInfo(BaseModel):
+    code_points: int
+    utf16_units: int  # What LinkedIn's character limit counts
+    graphemes: int  # User-perceived characters
 
 class FormatResponse(BaseModel):
     formatted_content: str
     character_count: int
     warnings: list[str] = []
+    # [input_start, output_start, width] runs mapping input to output offsets
+    offset_map: Optional[list[list[int]]] = None
+    length: Optional[TextLengthInfo] = None
+    thread: Optional[list[str]] = None  # The output split into numbered posts, when thread_limit is set
+    profile: Optional[dict] = None  # Top functions and stage times, for requests sent with X-Profile: 1
+
+class BatchFormatItem(BaseModel):
+    content: str
+    preserve_formatting: bool = True
+    parser: Literal["regex", "fast"] = "regex"
+    ranges: Optional[list[FormatRange]] = None  # When set, format these ranges as /format-advanced does
+    fused: bool = False
+    normalization: Optional[Literal["NFC", "NFKC"]] = None
+    thread_limit: Optional[int] = None
+
+class BatchFormatRequest(BaseModel):
+    documents: list[BatchFormatItem]
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[FormatResponse] = None
+    error: Optional[str] = None
+
+class BatchFormatResponse(BaseModel):
+    results: list[BatchItemResult]
+    count: int
+    error_count: int
+    elapsed_ms: float
+    items_per_second: float
 
 class ValidateRequest(BaseModel):
     content: str
@@ -25,54 +124,349 @@ class ValidateResponse(BaseModel):
     is_valid: bool
     warnings: list[str] = []
     suggestions: list[str] = []
+    profile: Optional[dict] = None
+
+class UnformatRequest(BaseModel):
+    content: str
+
+class UnformatResponse(BaseModel):
+    content: str
+    character_count: int
+
+class UnformatBatchRequest(BaseModel):
+    contents: list[str]
+
+class UnformatBatchResponse(BaseModel):
+    results: list[str]
+    count: int
+    elapsed_ms: float
+    items_per_second: float
+
+class CacheStatsResponse(BaseModel):
+    entries: int
+    bytes: int
+    max_entries: int
+    max_bytes: int
+    ttl_seconds: Optional[float] = None
+    hits: int
+    misses: int
+    coalesced: int  # Requests that waited for an identical in-flight computation
+    evictions: int
+    expirations: int
+    hit_rate: float
+
+class FormatSessionRequest(BaseModel):
+    content: str = ""
+    preserve_formatting: bool = True
+    parser: Literal["regex", "fast"] = "regex"
+
+class TextEdit(BaseModel):
+    start: int
+    end: Optional[int] = None  # Defaults to start (a pure insertion)
+    text: str = ""
+
+class FormatSessionEditRequest(BaseModel):
+    edits: list[TextEdit]
+    base_version: Optional[int] = None  # When set, must match the session's current version
+
+class FormatPatch(BaseModel):
+    start: int
+    end: int
+    text: str
+
+class FormatSessionResponse(BaseModel):
+    session_id: str
+    version: int
+    formatted_content: str
+    character_count: int
+    is_valid: bool
+    warnings: list[str] = []
+    suggestions: list[str] = []
+
+class FormatSessionEditResponse(BaseModel):
+    session_id: str
+    version: int
+    patches: list[FormatPatch]  # Apply in order to the previous formatted_content
+    character_count: int
+    is_valid: bool
+    warnings: list[str] = []
+    suggestions: list[str] = []
+
+def get_request_profiler(
+    x_profile: Optional[str] = Header(None),
+    profiler: Optional[Profiler] = Depends(get_profiler)
+) -> Optional[Profiler]:
+    """The profiler, for requests sent with X-Profile: 1 while profiling is enabled"""
+    return profiler if flag_enabled(x_profile) else None
 
 @router.post("/format", response_model=FormatResponse)
-async def format_content(request: FormatRequest):
+async def format_content(
+    request: FormatRequest,
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    validator: ContentValidator = Depends(get_validator),
+    cache: ResultCache = Depends(get_result_cache),
+    profiler: Optional[Profiler] = Depends(get_request_profiler),
+    offloader: Offloader = Depends(get_offloader),
+    limits: RequestLimits = Depends(get_request_limits)
+):
     """Format content for LinkedIn compatibility"""
-    formatter = LinkedInFormatter()
-    validator = ContentValidator()
+    # Format and validate, or reuse the result for identical content and
+    # options; large posts are formatted off the event loop
+    document = request.model_dump()
+    key = format_key(document)
+    try:
+        result, profile = await offloader.run(len(document["content"]), lambda: profiled_or_cached(
+            cache, key, lambda: offloader.format_document(
+                formatter, validator, document, limits.time_budget, profiler is not None
+            ),
+            profiler
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Format the content
-    formatted_content = formatter.format_for_linkedin(
-        request.content, 
-        preserve_formatting=request.preserve_formatting
-    )
+    return FormatResponse(**result, profile=profile)
+
+@router.post("/format-advanced", response_model=FormatResponse)
+async def format_content_advanced(
+    request: AdvancedFormatRequest,
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    validator: ContentValidator = Depends(get_validator),
+    cache: ResultCache = Depends(get_result_cache),
+    profiler: Optional[Profiler] = Depends(get_request_profiler),
+    offloader: Offloader = Depends(get_offloader),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """Format content with specific text ranges for LinkedIn compatibility"""
+    # Format with the ranges and validate, or reuse an identical earlier result
+    document = request.model_dump()
+    limits.check_ranges([document])
+    key = format_key(document)
+    try:
+        result, profile = await offloader.run(len(document["content"]), lambda: profiled_or_cached(
+            cache, key, lambda: offloader.format_document(
+                formatter, validator, document, limits.time_budget, profiler is not None
+            ),
+            profiler
+        ))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    # Validate the formatted content
-    validation_result = validator.validate_content(formatted_content)
+    return FormatResponse(**result, profile=profile)
+
+@router.post("/format/batch", response_model=BatchFormatResponse)
+def format_batch(
+    request: BatchFormatRequest,
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    validator: ContentValidator = Depends(get_validator),
+    processor: BatchProcessor = Depends(get_batch_processor),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """Format many documents in one request; failures are reported per item"""
+    # Declared with def (not async def) so FastAPI runs it in its threadpool
+    # and waiting on the worker pool never blocks the event loop
+    documents = [document.model_dump() for document in request.documents]
+    limits.check_ranges(documents)
+    batch = processor.run(formatter, validator, documents, limits.time_budget)
     
-    return FormatResponse(
-        formatted_content=formatted_content,
-        character_count=len(formatted_content),
-        warnings=validation_result.get("warnings", [])
+    return BatchFormatResponse(
+        results=[BatchItemResult(**item) for item in batch["results"]],
+        count=len(documents),
+        error_count=batch["error_count"],
+        elapsed_ms=batch["elapsed_ms"],
+        items_per_second=batch["items_per_second"]
     )
 
-@router.post("/format-advanced", response_model=FormatResponse)
-async def format_content_advanced(request: AdvancedFormatRequest):
-    """Format content with specific text ranges for LinkedIn compatibility"""
-    formatter = LinkedInFormatter()
-    validator = ContentValidator()
+@router.post("/format/stream")
+async def format_content_stream(
+    request: Request,
+    preserve_formatting: bool = True,
+    parser: Literal["regex", "fast"] = "regex",
+    normalization: Optional[Literal["NFC", "NFKC"]] = None,
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """
+    Format a raw text request body as it arrives, streaming NDJSON back
+
+    Each line is {"formatted_content": ...} for the paragraphs completed so
+    far; the last line is {"done": true, "character_count": ...}. The joined
+    pieces equal the formatted_content /format would return. A paragraph
+    longer than the max_stream_unit limit fails the request with 413, and
+    a body chunk that takes longer than the time budget to format with
+    422; either ends the stream with a last line {"error": ...} instead
+    once output has been sent.
+    """
+    stream = FormatStream(formatter, preserve_formatting, parser, normalization, limits.max_stream_unit)
+    return RequestStreamingResponse(
+        _format_ndjson(request, stream, limits.time_budget), media_type="application/x-ndjson"
+    )
+
+async def _format_ndjson(request: Request, stream: FormatStream, budget: Optional[float]) -> AsyncIterator[bytes]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    character_count = 0
     
-    # Format the content with specific ranges
-    formatted_content = formatter.format_with_ranges(request.content, request.ranges)
+    # Each chunk is formatted on the event loop, so the budget bounds how
+    # long one can hold it up
+    async for body in request.stream():
+        with time_budget(budget):
+            formatted = stream.feed(decoder.decode(body))
+        if formatted:
+            character_count += len(formatted)
+            yield dumps({"formatted_content": formatted}) + b"\n"
     
-    # Validate the formatted content
-    validation_result = validator.validate_content(formatted_content)
+    with time_budget(budget):
+        formatted = stream.feed(decoder.decode(b"", final=True)) + stream.close()
+    if formatted:
+        character_count += len(formatted)
+        yield dumps({"formatted_content": formatted}) + b"\n"
     
-    return FormatResponse(
-        formatted_content=formatted_content,
-        character_count=len(formatted_content),
-        warnings=validation_result.get("warnings", [])
-    )
+    yield dumps({"done": True, "character_count": character_count}) + b"\n"
 
 @router.post("/validate", response_model=ValidateResponse)
-async def validate_content(request: ValidateRequest):
+async def validate_content(
+    request: ValidateRequest,
+    validator: ContentValidator = Depends(get_validator),
+    cache: ResultCache = Depends(get_result_cache),
+    profiler: Optional[Profiler] = Depends(get_request_profiler),
+    offloader: Offloader = Depends(get_offloader)
+):
     """Validate content for LinkedIn compatibility"""
-    validator = ContentValidator()
-    result = validator.validate_content(request.content)
+    key = make_key("validate", request.content)
+    result, profile = await offloader.run(len(request.content), lambda: profiled_or_cached(
+        cache, key, lambda: offloader.validate_content(validator, request.content, profiler is not None), profiler
+    ))
     
     return ValidateResponse(
         is_valid=result.get("is_valid", True),
         warnings=result.get("warnings", []),
-        suggestions=result.get("suggestions", [])
+        suggestions=result.get("suggestions", []),
+        profile=profile
+    )
+
+@router.post("/unformat", response_model=UnformatResponse)
+async def unformat_content(
+    request: UnformatRequest,
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    offloader: Offloader = Depends(get_offloader)
+):
+    """Convert Unicode-styled text back to markdown for editing"""
+    content = await offloader.run(len(request.content), lambda: offloader.unformat(formatter, request.content))
+    
+    return UnformatResponse(content=content, character_count=len(content))
+
+@router.post("/unformat/batch", response_model=UnformatBatchResponse)
+def unformat_batch(request: UnformatBatchRequest, formatter: LinkedInFormatter = Depends(get_formatter)):
+    """Convert many Unicode-styled texts back to markdown, e.g. an archive of posts"""
+    # Runs inline in the threadpool: unformatting a post costs less than
+    # sending it to a worker process would
+    started = time.perf_counter()
+    results = formatter.unformat_many(request.contents)
+    elapsed = time.perf_counter() - started
+    
+    return UnformatBatchResponse(
+        results=results,
+        count=len(results),
+        elapsed_ms=elapsed * 1000,
+        items_per_second=len(results) / elapsed if elapsed > 0 else 0.0
+    )
+
+@router.get("/cache/stats", response_model=CacheStatsResponse)
+async def cache_stats(cache: ResultCache = Depends(get_result_cache)):
+    """Report format/validate result cache occupancy and hit counters"""
+    return CacheStatsResponse(**cache.stats())
+
+# The session routes are declared with def (not async def) so FastAPI runs
+# them in its threadpool: formatting a document, or waiting for another
+# request's edit to release the session lock, never blocks the event loop
+
+@router.post("/format/sessions", response_model=FormatSessionResponse)
+def create_format_session(
+    request: FormatSessionRequest,
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    validator: ContentValidator = Depends(get_validator),
+    sessions: FormatSessions = Depends(get_format_sessions),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """Start an incremental formatting session on a document"""
+    try:
+        with time_budget(limits.time_budget):
+            session = sessions.create(formatter, validator, request.content, request.preserve_formatting, request.parser)
+    except SessionLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    with session.lock:
+        return _session_response(session)
+
+@router.get("/format/sessions/{session_id}", response_model=FormatSessionResponse)
+def get_format_session(session_id: str, sessions: FormatSessions = Depends(get_format_sessions)):
+    """Current formatted document of a session, e.g. to resync after a version conflict"""
+    session = _get_session(sessions, session_id)
+    with session.lock:
+        return _session_response(session)
+
+@router.post("/format/sessions/{session_id}/edits", response_model=FormatSessionEditResponse)
+def edit_format_session(
+    session_id: str,
+    request: FormatSessionEditRequest,
+    sessions: FormatSessions = Depends(get_format_sessions),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """
+    Apply edits to a session's document and return patches to its formatted output
+
+    Edits replace [start, end) of the raw document with text, in code
+    points, each against the document the previous edit left. Only the
+    paragraphs they touch are formatted and validated again. Edits that
+    take longer than the time budget are abandoned with 422, leaving the
+    session as it was.
+    """
+    session = _get_session(sessions, session_id)
+    with session.lock, time_budget(limits.time_budget):
+        if request.base_version is not None and request.base_version != session.version:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Session is at version {session.version}, not {request.base_version}"
+            )
+        edits = [
+            {"start": edit.start, "end": edit.start if edit.end is None else edit.end, "text": edit.text}
+            for edit in request.edits
+        ]
+        try:
+            patches = session.apply(edits)
+        except SessionLimitError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        validation = session.validate()
+        return FormatSessionEditResponse(
+            session_id=session.session_id,
+            version=session.version,
+            patches=[FormatPatch(**patch) for patch in patches],
+            character_count=session.character_count,
+            is_valid=validation["is_valid"],
+            warnings=validation["warnings"],
+            suggestions=validation["suggestions"]
+        )
+
+@router.delete("/format/sessions/{session_id}", status_code=204)
+async def delete_format_session(session_id: str, sessions: FormatSessions = Depends(get_format_sessions)):
+    """End a session and free its document"""
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+
+def _get_session(sessions: FormatSessions, session_id: str) -> FormatSession:
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session
+
+def _session_response(session: FormatSession) -> FormatSessionResponse:
+    validation = session.validate()
+    return FormatSessionResponse(
+        session_id=session.session_id,
+        version=session.version,
+        formatted_content=session.formatted_content,
+        character_count=session.character_count,
+        is_valid=validation["is_valid"],
+        warnings=validation["warnings"],
+        suggestions=validation["suggestions"]
     )
@@ -0,0 +1,76 @@
+import time
+from typing import Dict, List
+from fastapi import APIRouter, Depends, Response
+from starlette.routing import BaseRoute, Match
+from app.dependencies import get_metrics
+from app.services.metrics import Metrics
+
+router = APIRouter()
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(metrics: Metrics = Depends(get_metrics)):
+    """Request and stage metrics in the Prometheus text format"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, body sizes and in-flight counts per route
+
+    Requests are labelled with their route's path template, such as
+    /api/templates/{template_id}, so ids don't multiply the series. Latency
+    runs until the last of the response is sent, streamed bodies included.
+    """
+
+    def __init__(self, app, metrics: Metrics, routes: List[BaseRoute]):
+        self.app = app
+        self.metrics = metrics
+        self.routes = routes
+        self._static_routes: Dict[str, str] = {}  # Paths of routes without parameters
+
+    def _route_template(self, scope) -> str:
+        path = scope["path"]
+        template = self._static_routes.get(path)
+        if template is None:
+            template = "unmatched"
+            for route in self.routes:
+                match, _ = route.matches(scope)
+                if match is not Match.NONE:
+                    template = route.path
+                    break
+            if template == path:
+                self._static_routes[path] = template
+        return template
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = self._route_template(scope)
+        status = 500  # Unless a response starts
+        request_bytes = response_bytes = 0
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        self.metrics.add_in_flight(method, route, 1)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            self.metrics.add_in_flight(method, route, -1)
+            self.metrics.observe_request(method, route, status, time.perf_counter() - start,
+                                         request_bytes, response_bytes)
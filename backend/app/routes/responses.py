@@ -0,0 +1,71 @@
+from typing import Any, Optional
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from starlette.datastructures import MutableHeaders
+from app.services.response import Payload, ResponseEncoder, dumps, negotiate
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse serialized with the shared encoder: orjson when installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def payload_response(payload: Payload, request: Request, encoder: ResponseEncoder) -> Response:
+    """A response sending a pre-serialized payload, compressed once for every request that accepts it"""
+    body, encoding = encoder.encode_payload(payload, request.headers.get("accept-encoding"))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(body, media_type="application/json", headers=headers)
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing JSON responses, as the response encoder decides
+
+    Only whole bodies are compressed: streamed responses such as NDJSON
+    pass through as they are sent, and so do responses a route already
+    encoded itself.
+    """
+
+    def __init__(self, app, encoder: ResponseEncoder):
+        self.app = app
+        self.encoder = encoder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.encoder.min_size is None:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding: Optional[str] = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        if negotiate(accept_encoding) is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None  # Held back until the body shows whether it is compressed
+
+        async def compressing_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if start is None:
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            if (message["type"] == "http.response.body" and not message.get("more_body", False)
+                    and "content-encoding" not in headers
+                    and headers.get("content-type", "").startswith("application/json")):
+                body, encoding = self.encoder.encode(message.get("body", b""), accept_encoding)
+                if encoding is not None:
+                    headers["Content-Encoding"] = encoding
+                    headers["Content-Length"] = str(len(body))
+                    headers.add_vary_header("Accept-Encoding")
+                    message = {**message, "body": body}
+            await send(start)
+            start = None
+            await send(message)
+
+        await self.app(scope, receive, compressing_send)
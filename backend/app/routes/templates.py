@@ -1,7 +1,20 @@
-from fastapi import APIRouter, HTTPException
+import codecs
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
+from app.dependencies import (
+    get_formatter, get_offloader, get_request_limits, get_response_encoder, get_template_service, get_validator
+)
+from app.routes.formatter import RequestStreamingResponse
+from app.routes.responses import payload_response
+from app.services.admission import RequestLimits
+from app.services.budget import time_budget
+from app.services.formatter import LinkedInFormatter
+from app.services.offload import Offloader
+from app.services.response import ResponseEncoder, dumps
+from app.services.template_render import CsvRowReader, JsonlRowReader, RowReader, TemplateRenderer
 from app.services.templates import TemplateService
+from app.services.validator import ContentValidator
 
 router = APIRouter()
 
@@ -25,17 +38,50 @@ class TemplateResponse(BaseModel):
     category: str
     description: Optional[str] = None
 
+class TemplateSearchResult(TemplateResponse):
+    score: float
+
+class TemplateSearchResponse(BaseModel):
+    results: List[TemplateSearchResult]
+    offset: int
+    limit: int
+    has_more: bool
+
+class RenderTemplateRequest(BaseModel):
+    variables: Dict[str, Any] = {}  # Placeholder name without brackets -> value
+    format_output: bool = True  # Run the rendered post through the LinkedIn formatter
+    preserve_formatting: bool = True
+    parser: Literal["regex", "fast"] = "regex"
+
+class RenderTemplateResponse(BaseModel):
+    template_id: str
+    content: str
+    character_count: int
+    missing_placeholders: List[str] = []  # Left in the content as written
+    is_valid: bool
+    warnings: List[str] = []
+    suggestions: List[str] = []
+
 @router.get("/templates", response_model=List[TemplateResponse])
-async def get_templates(category: Optional[str] = None):
+async def get_templates(
+    request: Request,
+    category: Optional[str] = None,
+    template_service: TemplateService = Depends(get_template_service),
+    encoder: ResponseEncoder = Depends(get_response_encoder)
+) -> Response:
     """Get available templates, optionally filtered by category"""
-    template_service = TemplateService()
-    templates = template_service.get_templates(category=category)
-    return [TemplateResponse(**template) for template in templates]
+    # Sent as serialized (and compressed) when the templates last changed,
+    # rather than validated and encoded again for every request
+    return payload_response(template_service.get_templates_payload(category), request, encoder)
 
 @router.post("/templates", response_model=TemplateResponse)
-async def create_template(request: CreateTemplateRequest):
+def create_template(
+    request: CreateTemplateRequest,
+    template_service: TemplateService = Depends(get_template_service)
+):
     """Create a new custom template"""
-    template_service = TemplateService()
+    # Declared with def (not async def) so the file write runs in the
+    # threadpool instead of blocking the event loop
     template = template_service.create_template(
         name=request.name,
         content=request.content,
@@ -44,11 +90,126 @@ async def create_template(request: CreateTemplateRequest):
     )
     return TemplateResponse(**template)
 
+# Registered before /templates/{template_id}, which would otherwise match it
+@router.get("/templates/search", response_model=TemplateSearchResponse)
+async def search_templates(
+    q: str,
+    category: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    template_service: TemplateService = Depends(get_template_service)
+):
+    """Full-text search over templates, best matches first; the last word matches as a prefix"""
+    hits, has_more = template_service.search_templates(q, limit=limit, offset=offset, category=category)
+    return TemplateSearchResponse(
+        results=[TemplateSearchResult(**template, score=score) for template, score in hits],
+        offset=offset,
+        limit=limit,
+        has_more=has_more
+    )
+
 @router.get("/templates/{template_id}", response_model=TemplateResponse)
-async def get_template(template_id: str):
+async def get_template(
+    template_id: str,
+    template_service: TemplateService = Depends(get_template_service)
+):
     """Get a specific template by ID"""
-    template_service = TemplateService()
     template = template_service.get_template(template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     return TemplateResponse(**template)
+
+@router.post("/templates/{template_id}/render", response_model=RenderTemplateResponse)
+async def render_template(
+    template_id: str,
+    request: RenderTemplateRequest,
+    template_service: TemplateService = Depends(get_template_service),
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    validator: ContentValidator = Depends(get_validator),
+    offloader: Offloader = Depends(get_offloader),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """Fill in a template's placeholders, then format and validate the post"""
+    template = template_service.get_compiled_template(template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    renderer = TemplateRenderer(formatter, validator, template, request.format_output,
+                                request.preserve_formatting, request.parser)
+    # Large posts are rendered off the event loop, as /format formats them
+    result = await offloader.run(template.size(request.variables), lambda: offloader.render_template(
+        renderer, request.variables, limits.time_budget
+    ))
+    return RenderTemplateResponse(template_id=template_id, **result)
+
+@router.post("/templates/{template_id}/render/bulk")
+async def render_template_bulk(
+    template_id: str,
+    request: Request,
+    format_output: bool = True,
+    preserve_formatting: bool = True,
+    parser: Literal["regex", "fast"] = "regex",
+    template_service: TemplateService = Depends(get_template_service),
+    formatter: LinkedInFormatter = Depends(get_formatter),
+    validator: ContentValidator = Depends(get_validator),
+    limits: RequestLimits = Depends(get_request_limits)
+):
+    """
+    Mail merge: render a template once per row of a streamed body, streaming NDJSON back
+
+    The body is CSV with a header row of placeholder names when sent as
+    text/csv, otherwise JSONL with one object of placeholder values per
+    line. Each output line is {"index": n, "result": {...}} with the
+    /render fields, or {"index": n, "error": ...} for a row that couldn't
+    be read or took longer than the time budget to render; the last line
+    is {"done": true, "count": ..., "error_count": ...}. Rows are rendered
+    as they arrive, so memory stays flat however many there are. A row
+    longer than the max_stream_unit limit fails the request with 413, or
+    with a last line {"error": ...} once output has been sent.
+    """
+    template = template_service.get_compiled_template(template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    renderer = TemplateRenderer(formatter, validator, template, format_output, preserve_formatting, parser)
+    content_type = request.headers.get("content-type", "")
+    reader_class = CsvRowReader if content_type.startswith("text/csv") else JsonlRowReader
+    reader = reader_class(limits.max_stream_unit)
+    return RequestStreamingResponse(
+        _render_ndjson(request, reader, renderer, limits.time_budget), media_type="application/x-ndjson"
+    )
+
+async def _render_ndjson(request: Request, reader: RowReader, renderer: TemplateRenderer,
+                         budget: Optional[float]) -> AsyncIterator[bytes]:
+    # utf-8-sig drops the byte order mark spreadsheet exports often start with
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    count = 0
+    error_count = 0
+    
+    def render_rows(rows) -> bytes:
+        nonlocal count, error_count
+        lines = []
+        for variables, error in rows:
+            if error is None:
+                try:
+                    # Rows render on the event loop, so the budget bounds
+                    # how long one can hold it up; past it, the row fails
+                    with time_budget(budget):
+                        line = {"index": count, "result": renderer.render(variables)}
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+            if error is not None:
+                line = {"index": count, "error": error}
+                error_count += 1
+            lines.append(dumps(line) + b"\n")
+            count += 1
+        return b"".join(lines)
+    
+    async for body in request.stream():
+        output = render_rows(reader.feed(decoder.decode(body)))
+        if output:
+            yield output
+    
+    output = render_rows(reader.feed(decoder.decode(b"", final=True)) + reader.close())
+    if output:
+        yield output
+    
+    yield dumps({"done": True, "count": count, "error_count": error_count}) + b"\n"
@@ -0,0 +1,171 @@
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, Iterable, Optional
+
+if TYPE_CHECKING:
+    from asyncio import Future
+
+
+class RequestLimitError(ValueError):
+    """A request is larger than the server accepts"""
+
+    def __init__(self, reason: str, message: str):
+        """
+        Args:
+            reason: Short label for metrics, e.g. 'body_too_large'
+            message: Error detail returned to the client
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+class Saturated(Exception):
+    """The server is busy: a request was turned away, or waited too long to start"""
+
+    def __init__(self, reason: str, retry_after: int):
+        """
+        Args:
+            reason: 'queue_full' when there was no room to wait, 'queue_timeout'
+                    when the request waited its longest and was shed
+            retry_after: Seconds the client should wait before retrying
+        """
+        super().__init__("Server is busy, retry later")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class RequestLimits:
+    """Size caps on what a single request may ask for, and the CPU time it may use"""
+
+    def __init__(self, max_body_bytes: Optional[int] = 4_194_304, max_ranges: Optional[int] = 50_000,
+                 time_budget: Optional[float] = 2.0, max_stream_unit: Optional[int] = 262_144):
+        """
+        Args:
+            max_body_bytes: Largest request body accepted (None = any)
+            max_ranges: Most formatting ranges in one request, over all its
+                        documents (None = any)
+            time_budget: CPU seconds formatting one document may take (None = no limit)
+            max_stream_unit: Longest paragraph of a streamed format body, or row
+                             of a bulk render, in characters (None = any). Those
+                             bodies have no overall cap, so this bounds what
+                             they hold in memory.
+        """
+        self.max_body_bytes = max_body_bytes
+        self.max_ranges = max_ranges
+        self.time_budget = time_budget
+        self.max_stream_unit = max_stream_unit
+
+    def check_body_size(self, size: int):
+        """
+        Raises:
+            RequestLimitError: If a body of this many bytes is too large
+        """
+        if self.max_body_bytes is not None and size > self.max_body_bytes:
+            raise RequestLimitError(
+                'body_too_large', f"Request body is larger than {self.max_body_bytes} bytes"
+            )
+
+    def check_ranges(self, documents: Iterable[Dict[str, Any]]):
+        """
+        Raises:
+            RequestLimitError: If the documents have too many formatting ranges between them
+        """
+        if self.max_ranges is None:
+            return
+        count = sum(
+            len(document['ranges']) for document in documents
+            if isinstance(document, dict) and isinstance(document.get('ranges'), list)
+        )
+        if count > self.max_ranges:
+            raise RequestLimitError(
+                'too_many_ranges', f"Request has {count} formatting ranges, more than the {self.max_ranges} allowed"
+            )
+
+
+class ConcurrencyLimiter:
+    """
+    Admits at most max_concurrent requests at a time, with a bounded queue
+
+    A request arriving while every slot is taken waits its turn, first in
+    first out, unless max_queued requests are already waiting: then it is
+    turned away at once. One that waits longer than max_wait is shed, as
+    by then its client has likely given up. Either way the caller answers
+    429 with Retry-After, which costs far less than letting every request
+    in and making all of them slow.
+
+    Counts are kept on the event loop: acquire and release must only be
+    called from coroutines running on it.
+    """
+
+    def __init__(self, max_concurrent: int = 32, max_queued: int = 128, max_wait: float = 5.0,
+                 retry_after: int = 1):
+        """
+        Args:
+            max_concurrent: Requests handled at once
+            max_queued: Requests that may wait for a slot (0 = none wait)
+            max_wait: Seconds a request may wait before it is shed
+            retry_after: Seconds a turned away client is told to wait
+
+        Raises:
+            ValueError: If max_concurrent isn't positive or max_queued is negative
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        if max_queued < 0:
+            raise ValueError("max_queued can't be negative")
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: Deque['Future'] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a slot"""
+        return len(self._waiters)
+
+    async def acquire(self):
+        """
+        Take a slot, waiting for one if the queue has room
+
+        Raises:
+            Saturated: If the queue is full, or no slot came free within max_wait
+        """
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.max_queued:
+            raise Saturated('queue_full', self.retry_after)
+
+        # Imported here, as in offload: the serverless function never queues
+        import asyncio
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot straight to the waiter, so active stays as it is
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            raise Saturated('queue_timeout', self.retry_after) from None
+        except asyncio.CancelledError:
+            # The client went away while waiting; pass on a slot it was just handed
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+
+    def release(self):
+        """Give up a slot taken by acquire, to the longest waiting request if any"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _remove(self, waiter: 'Future'):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
@@ -0,0 +1,213 @@
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from app.services.budget import checkpoint, time_budget
+from app.services.cache import make_key
+from app.services.formatter import FormatStats, LinkedInFormatter
+from app.services.length import measure_text, split_thread
+from app.services.validator import ContentValidator
+
+if TYPE_CHECKING:
+    from app.services.workers import WorkerPool
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def check_document(document: Any):
+    """
+    Check the shape of a document for format_document
+
+    Raises:
+        ValueError: Content that isn't a string, a thread limit that isn't
+                    an integer, or ranges that aren't a list of objects with
+                    integer 'start' and 'end' and a list of 'styles'
+    """
+    if not isinstance(document, dict) or not isinstance(document.get('content'), str):
+        raise ValueError("Content is required")
+    thread_limit = document.get('thread_limit')
+    if thread_limit is not None and not _is_int(thread_limit):
+        raise ValueError("thread_limit must be an integer")
+    ranges = document.get('ranges')
+    if ranges is not None and not (isinstance(ranges, list) and all(
+        isinstance(item, dict) and _is_int(item.get('start')) and _is_int(item.get('end'))
+        and isinstance(item.get('styles', []), list)
+        for item in ranges
+    )):
+        raise ValueError("Each range needs integer 'start' and 'end' and a list of 'styles'")
+
+
+def format_document(formatter: LinkedInFormatter, validator: ContentValidator, document: Dict[str, Any],
+                    budget: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Format and validate a single batch document
+
+    Args:
+        formatter: Formatter used for the document
+        validator: Validator used for the formatted output
+        document: Dictionary with 'content' and optional 'preserve_formatting',
+                  'parser', 'normalization', 'ranges', 'fused' and
+                  'thread_limit' keys; 'ranges' selects range formatting,
+                  'fused' validates with the formatter's stats instead of
+                  rescanning the output (same result), 'thread_limit' also
+                  splits the output into numbered posts of at most that many
+                  UTF-16 units
+        budget: CPU seconds the work may take (None = no limit; see time_budget)
+
+    Returns:
+        Dictionary with the FormatResponse fields
+
+    Raises:
+        ValueError: A document check_document rejects, an unknown parser or
+                    normalization form, or a thread limit too small to split to
+        BudgetExceeded: If the work ran past its budget
+    """
+    with time_budget(budget):
+        check_document(document)
+
+        offset_map = None
+        stats = None
+        ranges = document.get('ranges')
+        if ranges is not None:
+            formatted_content, offset_map = formatter.format_with_ranges_mapped(document['content'], ranges)
+            if document.get('fused'):
+                stats = FormatStats(cleaned=False)
+                stats.character_count = len(formatted_content)
+        elif document.get('fused'):
+            formatted_content, stats = formatter.format_with_stats(
+                document['content'],
+                preserve_formatting=document.get('preserve_formatting', True),
+                parser=document.get('parser', 'regex'),
+                normalization=document.get('normalization')
+            )
+        else:
+            formatted_content = formatter.format_for_linkedin(
+                document['content'],
+                preserve_formatting=document.get('preserve_formatting', True),
+                parser=document.get('parser', 'regex'),
+                normalization=document.get('normalization')
+            )
+
+        checkpoint()
+        if stats is not None:
+            validation_result = validator.validate_formatted(formatted_content, stats)
+        else:
+            validation_result = validator.validate_content(formatted_content)
+
+        checkpoint()
+        thread_limit = document.get('thread_limit')
+        return {
+            "formatted_content": formatted_content,
+            "character_count": len(formatted_content),
+            "warnings": validation_result.get("warnings", []),
+            "offset_map": offset_map,
+            "length": measure_text(formatted_content).as_dict(),
+            "thread": split_thread(formatted_content, thread_limit) if thread_limit is not None else None
+        }
+
+
+def format_key(document: Dict[str, Any]) -> str:
+    """
+    Result cache key of format_document(document)
+
+    'fused' is left out: it gives the same result.
+    """
+    if document.get('ranges') is not None:
+        return make_key('format-advanced', document['content'], document['ranges'], document.get('thread_limit'))
+    return make_key(
+        'format', document['content'], document.get('preserve_formatting', True), document.get('parser', 'regex'),
+        document.get('normalization'), document.get('thread_limit')
+    )
+
+
+def _format_documents(formatter: LinkedInFormatter, validator: ContentValidator, documents: List[Any],
+                      first_index: int = 0, budget: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Format a list of documents, capturing failures per item"""
+    results = []
+    for index, document in enumerate(documents, first_index):
+        try:
+            result = format_document(formatter, validator, document, budget)
+            error = None
+        except ValueError as e:
+            result = None
+            error = str(e)
+        except Exception as e:
+            result = None
+            error = f"{type(e).__name__}: {e}"
+        results.append({"index": index, "result": result, "error": error})
+    return results
+
+
+class BatchProcessor:
+    """Formats batches of documents inline or fanned out over a process pool"""
+
+    def __init__(self, inline_threshold: int = 32, chunk_size: int = 64, pool: Optional['WorkerPool'] = None):
+        """
+        Args:
+            inline_threshold: Batches with at most this many documents run in
+                              the calling process
+            chunk_size: Number of documents sent to a worker per task
+            pool: Worker processes for larger batches (None = always inline)
+        """
+        self.inline_threshold = inline_threshold
+        self.chunk_size = chunk_size
+        self.pool = pool
+
+    def run(self, formatter: LinkedInFormatter, validator: ContentValidator, documents: List[Any],
+            budget: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Format and validate a batch of documents
+
+        Args:
+            formatter: Formatter used for inline batches
+            validator: Validator used for inline batches
+            documents: Documents accepted by format_document
+            budget: CPU seconds each document may take; one that runs past it
+                    fails on its own (None = no limit)
+
+        Returns:
+            Dictionary with per-item 'results' (each with 'index', 'result'
+            and 'error'), 'error_count', 'elapsed_ms' and 'items_per_second';
+            the documents of a chunk whose worker died again when it was
+            retried fail with a BrokenProcessPool error
+        """
+        started = time.perf_counter()
+
+        if self.pool is None or len(documents) <= self.inline_threshold:
+            results = _format_documents(formatter, validator, documents, budget=budget)
+        else:
+            # Imported here: the serverless function only formats inline, and
+            # multiprocessing would slow its cold start
+            from concurrent.futures.process import BrokenProcessPool
+            offsets = range(0, len(documents), self.chunk_size)
+            chunks = [documents[i:i + self.chunk_size] for i in offsets]
+            futures = [self.pool.submit(_format_documents, chunk, i, budget) for i, chunk in zip(offsets, chunks)]
+            results = []
+            for first_index, chunk, future in zip(offsets, chunks, futures):
+                try:
+                    results.extend(future.result())
+                    continue
+                except BrokenProcessPool:
+                    pass
+                # A dead worker breaks every task still pending on its pool,
+                # not only its own: run each of them again, one at a time, in
+                # the replacement pool, so only a chunk that kills that one
+                # too fails
+                try:
+                    results.extend(self.pool.submit(_format_documents, chunk, first_index, budget).result())
+                except BrokenProcessPool as e:
+                    error = f"{type(e).__name__}: {e}"
+                    results.extend(
+                        {"index": index, "result": None, "error": error}
+                        for index in range(first_index, first_index + len(chunk))
+                    )
+
+        elapsed = time.perf_counter() - started
+
+        return {
+            "results": results,
+            "error_count": sum(1 for item in results if item["error"] is not None),
+            "elapsed_ms": elapsed * 1000,
+            "items_per_second": len(documents) / elapsed if elapsed > 0 else 0.0
+        }
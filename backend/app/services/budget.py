@@ -0,0 +1,54 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# CPU time of the thread doing the current work (time.thread_time) it must
+# finish by, or None without a budget
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+
+class BudgetExceeded(Exception):
+    """Work ran past its time budget and was abandoned"""
+
+
+@contextmanager
+def time_budget(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Give the work run inside a budget of CPU time
+
+    The formatter calls checkpoint() between its stages and every so often
+    in its loops; once the budget is spent, the next checkpoint raises
+    BudgetExceeded, so a pathological input is abandoned instead of
+    holding a worker for as long as it takes. The budget counts the CPU
+    time of the calling thread, so time spent waiting for the interpreter
+    lock or a busy CPU isn't charged to the work. Checks are cooperative:
+    a single regex pass is never interrupted, so work can overrun its
+    budget by the longest stage it is in. Budgets nest; an inner budget
+    never extends an outer one. The work must stay on the calling thread.
+
+    Args:
+        seconds: CPU seconds the work may take (None = no limit)
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.thread_time() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def checkpoint():
+    """
+    Abandon the current work if its budget is spent
+
+    Raises:
+        BudgetExceeded: If the deadline of the enclosing time_budget has passed
+    """
+    deadline = _deadline.get()
+    if deadline is not None and time.thread_time() > deadline:
+        raise BudgetExceeded("Formatting took longer than its time budget")
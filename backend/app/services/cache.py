@@ -0,0 +1,194 @@
+import hashlib
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# Part of every cache key. Bump it whenever formatter or validator output
+# changes so results computed by an older engine are never served. 4: the
+# regex parser follows CommonMark flanking for emphasis and pairs misnested
+# HTML tags nearest first.
+ENGINE_VERSION = "4"
+
+
+def make_key(*parts: Any) -> str:
+    """
+    Build a content-addressed cache key
+
+    Args:
+        parts: JSON-serializable values that fully determine the result,
+               e.g. the operation name, content and options
+
+    Returns:
+        Hex digest of the engine version and the parts
+    """
+    payload = json.dumps([ENGINE_VERSION, *parts], ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+def _estimate_size(value: Any) -> int:
+    """Approximate memory held by a cached value (strings, numbers, lists and dicts)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(_estimate_size(item) for item in value)
+    return size
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires')
+
+    def __init__(self, value: Any, size: int, expires: Optional[float]):
+        self.value = value
+        self.size = size
+        self.expires = expires
+
+
+class _Flight:
+    """A computation in progress that identical requests wait on"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class ResultCache:
+    """
+    Bounded LRU cache of computed results with singleflight coalescing
+
+    Entries are evicted least recently used first once either the entry or
+    the byte limit is exceeded, and optionally expire after a TTL. While a
+    key is being computed, other callers asking for the same key wait for
+    that result instead of computing it again. Cached values are shared
+    between callers and must not be mutated.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 32 * 1024 * 1024,
+                 ttl: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_entries: Maximum number of cached results
+            max_bytes: Maximum estimated memory of all cached results
+            ttl: Seconds a result stays valid (None = until evicted)
+            clock: Monotonic time source, in seconds
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, _Entry]' = OrderedDict()
+        self._flights: Dict[str, _Flight] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for a key, computing it at most once
+
+        Args:
+            key: Key from make_key
+            compute: Called without arguments on a miss; exceptions are
+                     raised to every caller waiting on it and never cached
+
+        Returns:
+            The cached or freshly computed result
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires is None or entry.expires > self._clock():
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry.value
+                self._remove(key)
+                self._expirations += 1
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._misses += 1
+            else:
+                self._coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            # Store before releasing the waiters, so a caller arriving after
+            # the flight is gone finds the entry
+            with self._lock:
+                if flight.error is None:
+                    self._store(key, flight.value)
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def clear(self):
+        """Drop every cached result; counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache occupancy and counters
+
+        Returns:
+            Dictionary with entries, bytes, limits, hits, misses, coalesced,
+            evictions, expirations and hit_rate
+        """
+        with self._lock:
+            lookups = self._hits + self._misses + self._coalesced
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "coalesced": self._coalesced,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hit_rate": (self._hits + self._coalesced) / lookups if lookups else 0.0
+            }
+
+    def _store(self, key: str, value: Any):
+        """Insert a result and evict down to the limits; caller holds the lock"""
+        size = _estimate_size(value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        expires = self._clock() + self.ttl if self.ttl is not None else None
+        self._entries[key] = _Entry(value, size, expires)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
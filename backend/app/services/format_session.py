@@ -0,0 +1,289 @@
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from collections import OrderedDict
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from app.services.budget import BudgetExceeded
+from app.services.pipeline import LineAssembler, ParagraphConverter, ParagraphSplitter
+from app.services.validator import ContentSignals, JoinedSignals
+
+if TYPE_CHECKING:
+    from app.services.formatter import LinkedInFormatter
+    from app.services.validator import ContentValidator
+
+
+class SessionLimitError(ValueError):
+    """An edit would grow a session's document past its size limit"""
+
+
+class FormatSession:
+    """
+    A document held server-side and formatted paragraph by paragraph
+
+    The document is kept as the units ParagraphSplitter cuts it into
+    (paragraphs, merged while an HTML tag is open), each with its raw text,
+    its formatted text and its validation scan. The formatted document is
+    the non-empty formatted units joined by blank lines, which is exactly
+    format_for_linkedin's output. An edit re-splits and reformats only the
+    units it touches, extended until the split lines up with the old one
+    again; the rest are reused as they are.
+
+    Offsets are in code points, as Python string indices. Callers must
+    hold `lock` while using a session.
+    """
+
+    def __init__(self, session_id: str, formatter: 'LinkedInFormatter', validator: 'ContentValidator',
+                 content: str = '', preserve_formatting: bool = True, parser: str = 'regex',
+                 max_characters: int = 100_000):
+        """
+        Args:
+            session_id: Identifier handed to the client
+            formatter: Formatter whose stages are applied per unit
+            validator: Validator used to scan each formatted unit
+            content: Initial document
+            preserve_formatting: Passed to the formatter
+            parser: Markup parser ("regex" or "fast")
+            max_characters: Largest document the session will hold
+        """
+        self.session_id = session_id
+        self.validator = validator
+        self.max_characters = max_characters
+        self.version = 0
+        self.lock = threading.Lock()
+        self.last_used = 0.0
+        self._converter = ParagraphConverter(formatter, preserve_formatting, parser)
+        self._raws: List[str] = []
+        self._formatted: List[str] = []
+        self._scans: List[ContentSignals] = []
+        self._joined = JoinedSignals()
+        if len(content) > max_characters:
+            raise SessionLimitError(f"Document exceeds {max_characters} characters")
+        self._replace_units(0, 0, content, at_end=True)
+
+    @property
+    def content(self) -> str:
+        """The raw document"""
+        return ''.join(self._raws)
+
+    @property
+    def formatted_content(self) -> str:
+        """The formatted document"""
+        return '\n\n'.join(filter(None, self._formatted))
+
+    @property
+    def character_count(self) -> int:
+        return self._joined.signals(()).character_count
+
+    def validate(self) -> Dict[str, Any]:
+        """Validation result for the formatted document, from the per-unit scans"""
+        return self.validator.validate_joined(self._joined, (scan for scan, text in zip(self._scans, self._formatted) if text))
+
+    def apply(self, edits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Apply edits in order, each against the document the previous one left
+
+        Args:
+            edits: Dictionaries with 'start' and 'end' (the range to
+                   replace, end defaulting to start) and 'text' (what to
+                   put there, default empty)
+
+        Returns:
+            One patch per edit: {'start', 'end', 'text'} replacing that
+            range of the formatted document as it was before the edit
+            (patches, too, apply in order)
+
+        Raises:
+            ValueError: An edit is malformed or out of range; the session
+                        is left as it was before the call
+            BudgetExceeded: Formatting ran past its time budget; the session
+                            is left as it was before the call too
+        """
+        saved = (self._raws.copy(), self._formatted.copy(), self._scans.copy())
+        patches = []
+        try:
+            for edit in edits:
+                patches.append(self._apply_edit(edit))
+        except (ValueError, BudgetExceeded):
+            self._raws, self._formatted, self._scans = saved
+            self._joined = JoinedSignals()
+            for scan, text in zip(self._scans, self._formatted):
+                if text:
+                    self._joined.add(scan)
+            raise
+        self.version += 1
+        return patches
+
+    def _apply_edit(self, edit: Dict[str, Any]) -> Dict[str, Any]:
+        start = edit.get('start')
+        end = edit.get('end', start)
+        text = edit.get('text', '')
+        if not isinstance(start, int) or not isinstance(end, int) or not isinstance(text, str):
+            raise ValueError("Each edit needs integer 'start'/'end' and string 'text'")
+        starts = [0, *accumulate(map(len, self._raws))]
+        length = starts.pop()
+        if not 0 <= start <= end <= length:
+            raise ValueError(f"Edit range {start}-{end} is outside the document (0-{length})")
+        if length - (end - start) + len(text) > self.max_characters:
+            raise SessionLimitError(f"Document would exceed {self.max_characters} characters")
+
+        # Units overlapping the edit; an insertion belongs to the unit it lands in
+        first = bisect_right(starts, start) - 1
+        last = bisect_right(starts, end - 1) - 1 if end > start else first
+        region_start = starts[first]
+        region = ''.join(self._raws[first:last + 1])
+        region = region[:start - region_start] + text + region[end - region_start:]
+        return self._replace_units(first, last + 1, region, at_end=last + 1 == len(self._raws))
+
+    def _replace_units(self, first: int, stop: int, region: str, at_end: bool) -> Dict[str, Any]:
+        """
+        Re-split and reformat units[first:stop] with new raw text
+
+        The region starts at a unit boundary, where no tag is open. If the
+        new text doesn't end on a boundary, following units are taken in
+        until it does or the document ends.
+        """
+        splitter = ParagraphSplitter(self._converter.prepare_line, track_tags=self._converter.preserve_formatting)
+        prepared = splitter.feed(region)
+        while splitter.pending and stop < len(self._raws):
+            region += self._raws[stop]
+            prepared += splitter.feed(self._raws[stop])
+            stop += 1
+            at_end = stop == len(self._raws)
+        if at_end:
+            prepared.append(splitter.close())
+
+        old = {raw: (text, scan) for raw, text, scan in zip(self._raws[first:stop], self._formatted[first:stop], self._scans[first:stop])}
+        lines = region.split('\n')
+        line = 0
+        raws, formatted, scans = [], [], []
+        for index, unit in enumerate(prepared):
+            if at_end and index == len(prepared) - 1:
+                raw = '\n'.join(lines[line:])
+            else:
+                count = unit.count('\n')
+                raw = '\n'.join(lines[line:line + count]) + '\n'
+                line += count
+            reused = old.get(raw)
+            if reused is None:
+                assembler = LineAssembler()
+                text = assembler.feed(self._converter.convert(unit)) + assembler.close()
+                reused = (text, self.validator.scan(text) if text else ContentSignals())
+            raws.append(raw)
+            formatted.append(reused[0])
+            scans.append(reused[1])
+
+        patch = self._patch(first, stop, formatted)
+        for scan, text in zip(self._scans[first:stop], self._formatted[first:stop]):
+            if text:
+                self._joined.remove(scan)
+        for scan, text in zip(scans, formatted):
+            if text:
+                self._joined.add(scan)
+        self._raws[first:stop] = raws
+        self._formatted[first:stop] = formatted
+        self._scans[first:stop] = scans
+        return patch
+
+    def _patch(self, first: int, stop: int, formatted: List[str]) -> Dict[str, Any]:
+        """The change to the formatted document from replacing units[first:stop]"""
+        before = self._formatted[:first]
+        shown_before = len(before) - before.count('')
+        offset = sum(map(len, before)) + 2 * max(shown_before - 1, 0)
+
+        # Each shown unit is preceded by a blank line unless it is the
+        # first; the first shown unit after the region may change that
+        old_text = self._segment(self._formatted[first:stop], shown_before > 0)
+        new_text = self._segment(formatted, shown_before > 0)
+        if any(self._formatted[stop:]):
+            old_text += '\n\n' if shown_before or any(self._formatted[first:stop]) else ''
+            new_text += '\n\n' if shown_before or any(formatted) else ''
+
+        # Trim what both sides share, so the patch covers only the change
+        prefix = 0
+        limit = min(len(old_text), len(new_text))
+        while prefix < limit and old_text[prefix] == new_text[prefix]:
+            prefix += 1
+        suffix = 0
+        limit -= prefix
+        while suffix < limit and old_text[-1 - suffix] == new_text[-1 - suffix]:
+            suffix += 1
+        return {
+            'start': offset + prefix,
+            'end': offset + len(old_text) - suffix,
+            'text': new_text[prefix:len(new_text) - suffix]
+        }
+
+    @staticmethod
+    def _segment(formatted: List[str], preceded: bool) -> str:
+        """Shown units joined as they appear in the document, after `preceded` shown units"""
+        text = '\n\n'.join(filter(None, formatted))
+        if text and preceded:
+            text = '\n\n' + text
+        return text
+
+
+class FormatSessions:
+    """
+    Live formatting sessions, evicted when idle or least recently used
+
+    Every lookup refreshes a session's idle timer. Sessions idle for longer
+    than the timeout are dropped on the next create or lookup, and the
+    least recently used one goes when max_sessions would be exceeded, so
+    memory is bounded by max_sessions times each session's size limit.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_timeout: float = 900.0,
+                 max_characters: int = 100_000, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_sessions: Most sessions held at once
+            idle_timeout: Seconds without use after which a session is dropped
+            max_characters: Largest document a session may hold
+            clock: Monotonic time source, in seconds
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_characters = max_characters
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sessions: 'OrderedDict[str, FormatSession]' = OrderedDict()
+
+    def create(self, formatter: 'LinkedInFormatter', validator: 'ContentValidator', content: str = '',
+               preserve_formatting: bool = True, parser: str = 'regex') -> FormatSession:
+        """Start a session on a document (formatted in full, once)"""
+        session = FormatSession(uuid.uuid4().hex, formatter, validator, content, preserve_formatting, parser, self.max_characters)
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session.last_used = now
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[FormatSession]:
+        """Look a session up and mark it used; None if unknown or expired"""
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """End a session"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self, now: float):
+        """Drop idle sessions; least recently used come first; caller holds the lock"""
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
@@ -1,81 +1,328 @@
 import re
-import unicodedata
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Iterator, List, Optional
+from app.services.budget import checkpoint
+from app.services.markup_parser import BOLD, ITALIC, LINE, StyleSpan, parse_markup
+from app.services.pipeline import FormatStream
+from app.services.sanitize import check_normalization, clean_text
+
+# Unicode character mappings for bold, italic, and bold-italic. These are
+# built once per process and shared (read-only) by every formatter instance.
+BOLD_CHARS = MappingProxyType({
+    'A': '𝗔', 'B': '𝗕', 'C': '𝗖', 'D': '𝗗', 'E': '𝗘', 'F': '𝗙', 'G': '𝗚', 'H': '𝗛',
+    'I': '𝗜', 'J': '𝗝', 'K': '𝗞', 'L': '𝗟', 'M': '𝗠', 'N': '𝗡', 'O': '𝗢', 'P': '𝗣',
+    'Q': '𝗤', 'R': '𝗥', 'S': '𝗦', 'T': '𝗧', 'U': '𝗨', 'V': '𝗩', 'W': '𝗪', 'X': '𝗫',
+    'Y': '𝗬', 'Z': '𝗭',
+    'a': '𝗮', 'b': '𝗯', 'c': '𝗰', 'd': '𝗱', 'e': '𝗲', 'f': '𝗳', 'g': '𝗴', 'h': '𝗵',
+    'i': '𝗶', 'j': '𝗷', 'k': '𝗸', 'l': '𝗹', 'm': '𝗺', 'n': '𝗻', 'o': '𝗼', 'p': '𝗽',
+    'q': '𝗾', 'r': '𝗿', 's': '𝘀', 't': '𝘁', 'u': '𝘂', 'v': '𝘃', 'w': '𝘄', 'x': '𝘅',
+    'y': '𝘆', 'z': '𝘇',
+    '0': '𝟬', '1': '𝟭', '2': '𝟮', '3': '𝟯', '4': '𝟰', '5': '𝟱', '6': '𝟲', '7': '𝟳', '8': '𝟴', '9': '𝟵'
+})
+
+ITALIC_CHARS = MappingProxyType({
+    'A': '𝘈', 'B': '𝘉', 'C': '𝘊', 'D': '𝘋', 'E': '𝘌', 'F': '𝘍', 'G': '𝘎', 'H': '𝘏',
+    'I': '𝘐', 'J': '𝘑', 'K': '𝘒', 'L': '𝘓', 'M': '𝘔', 'N': '𝘕', 'O': '𝘖', 'P': '𝘗',
+    'Q': '𝘘', 'R': '𝘙', 'S': '𝘚', 'T': '𝘛', 'U': '𝘜', 'V': '𝘝', 'W': '𝘞', 'X': '𝘟',
+    'Y': '𝘠', 'Z': '𝘡',
+    'a': '𝘢', 'b': '𝘣', 'c': '𝘤', 'd': '𝘥', 'e': '𝘦', 'f': '𝘧', 'g': '𝘨', 'h': '𝘩',
+    'i': '𝘪', 'j': '𝘫', 'k': '𝘬', 'l': '𝘭', 'm': '𝘮', 'n': '𝘯', 'o': '𝘰', 'p': '𝘱',
+    'q': '𝘲', 'r': '𝘳', 's': '𝘴', 't': '𝘵', 'u': '𝘶', 'v': '𝘷', 'w': '𝘸', 'x': '𝘹',
+    'y': '𝘺', 'z': '𝘻'
+})
+
+BOLD_ITALIC_CHARS = MappingProxyType({
+    'A': '𝘼', 'B': '𝘽', 'C': '𝘾', 'D': '𝘿', 'E': '𝙀', 'F': '𝙁', 'G': '𝙂', 'H': '𝙃',
+    'I': '𝙄', 'J': '𝙅', 'K': '𝙆', 'L': '𝙇', 'M': '𝙈', 'N': '𝙉', 'O': '𝙊', 'P': '𝙋',
+    'Q': '𝙌', 'R': '𝙍', 'S': '𝙎', 'T': '𝙏', 'U': '𝙐', 'V': '𝙑', 'W': '𝙒', 'X': '𝙓',
+    'Y': '𝙔', 'Z': '𝙕',
+    'a': '𝙖', 'b': '𝙗', 'c': '𝙘', 'd': '𝙙', 'e': '𝙚', 'f': '𝙛', 'g': '𝙜', 'h': '𝙝',
+    'i': '𝙞', 'j': '𝙟', 'k': '𝙠', 'l': '𝙡', 'm': '𝙢', 'n': '𝙣', 'o': '𝙤', 'p': '𝙥',
+    'q': '𝙦', 'r': '𝙧', 's': '𝙨', 't': '𝙩', 'u': '𝙪', 'v': '𝙫', 'w': '𝙬', 'x': '𝙭',
+    'y': '𝙮', 'z': '𝙯'
+})
+
+# Underline combining character
+UNDERLINE_COMBINING = '\u0332'
+
+# Markup parsers accepted by format_for_linkedin
+PARSERS = ('regex', 'fast')
+
+# Packed per-style coverage counters used by format_with_ranges_mapped
+_COUNTER_BITS = 32
+_COUNTER_MASK = (1 << _COUNTER_BITS) - 1
+_BOLD_UNIT = 1
+_ITALIC_UNIT = 1 << _COUNTER_BITS
+_UNDERLINE_UNIT = 1 << (2 * _COUNTER_BITS)
+
+def _build_translate_table(mapping) -> list:
+    """Build a str.translate table indexed by ASCII code point
+
+    Unmapped ASCII characters map to themselves so the common case never
+    takes str.translate's (slow) missing-key path; anything beyond ASCII
+    raises IndexError, which str.translate treats as "leave unchanged".
+    """
+    table = [chr(code) for code in range(128)]
+    for char, styled in mapping.items():
+        table[ord(char)] = styled
+    return table
+
+
+# Precompiled str.translate tables
+_BOLD_TABLE = _build_translate_table(BOLD_CHARS)
+_ITALIC_TABLE = _build_translate_table(ITALIC_CHARS)
+_BOLD_ITALIC_TABLE = _build_translate_table(BOLD_ITALIC_CHARS)
+
+
+def _build_inverse_table(*mappings) -> dict:
+    """Build a str.translate table mapping styled characters back to ASCII
+
+    ASCII maps to itself so the spaces and punctuation inside a run don't
+    take str.translate's (slow) missing-key path.
+    """
+    table = {code: chr(code) for code in range(128)}
+    for mapping in mappings:
+        for char, styled in mapping.items():
+            table[ord(styled)] = char
+    return table
+
+
+def _char_class(chars: Iterable[str]) -> str:
+    """Regex character class for chars, as ranges of consecutive code points
+
+    The regex engine tests a range in one step but a list of literals one by
+    one, which matters for these astral characters.
+    """
+    codes = sorted(map(ord, chars))
+    parts = []
+    start = previous = codes[0]
+    for code in codes[1:] + [None]:
+        if code != previous + 1:
+            parts.append(chr(start) if start == previous else f'{chr(start)}-{chr(previous)}')
+            start = code
+        previous = code
+    return '[' + ''.join(parts) + ']'
+
+
+def _build_run_pattern() -> re.Pattern:
+    """Match a run of one style: styled characters, possibly with style-neutral
+    characters between them (spaces, punctuation), within one line
+
+    Characters that carry or interfere with markup (word characters, '*',
+    '<', '>', newlines and the batch separator) break a run.
+    """
+    neutral = r'[^\w\n*<>\x00]*'
+    mappings = (('bold', BOLD_CHARS), ('italic', ITALIC_CHARS), ('bold_italic', BOLD_ITALIC_CHARS))
+    alternatives = []
+    for name, mapping in mappings:
+        chars = _char_class(mapping.values())
+        alternatives.append(f'(?P<{name}>{chars}(?:{neutral}{chars})*)')
+    # The lookahead lets plain text be skipped with one class test per character
+    styled = _char_class(styled for _, mapping in mappings for styled in mapping.values())
+    return re.compile(f'(?={styled})(?:' + '|'.join(alternatives) + ')')
+
+
+# Inverse tables for unformat: every styled character back to ASCII
+_PLAIN_TABLE = _build_inverse_table(BOLD_CHARS, ITALIC_CHARS, BOLD_ITALIC_CHARS)
+STYLED_RUN_RE = _build_run_pattern()
+_STYLED_CHAR_RE = re.compile(_char_class(chr(code) for code in _PLAIN_TABLE if code > 127))
+_RUN_DELIMITERS = {'bold': '**', 'italic': '*', 'bold_italic': '***'}
+
+# Joins posts for unformat_many; it never occurs in a run, so one scan over
+# the joined posts finds the same runs as one scan per post
+_BATCH_SEPARATOR = '\x00'
+
+# Precompiled patterns
+# A tag can't contain '<', so a run of '<' is scanned once rather than once per '<'
+_HTML_TAG_RE = re.compile(r'<[^<>]+>')
+# Three or more newlines with only whitespace between them. The whitespace
+# between newlines excludes them, so there is one way to match a run.
+_EXTRA_BLANK_LINES_RE = re.compile(r'\n(?:[^\S\n]*\n){2,}')
+_LEADING_NEWLINES_RE = re.compile(r'^\n+')
+_TRAILING_NEWLINES_RE = re.compile(r'\n+$')
+
+
+class FormatStats:
+    """
+    Facts about formatted output, recorded while the formatter produces it
+
+    For output of format_for_linkedin (cleaned=True) the formatter also
+    guarantees no invisible characters, no control characters but newlines
+    and never more than one blank line in a row, so ContentValidator.validate_formatted can skip
+    those checks and the line-structure ones. Range formatting leaves the
+    text as-is and only records the character count (cleaned=False).
+    """
+
+    __slots__ = ('character_count', 'line_count', 'longest_line', 'paragraph_count', 'cleaned')
+
+    def __init__(self, cleaned: bool = True):
+        self.character_count = 0
+        self.line_count = 0
+        self.longest_line = 0
+        self.paragraph_count = 0
+        self.cleaned = cleaned
+
+
+def _unstyle_match(match: re.Match) -> str:
+    delimiter = _RUN_DELIMITERS[match.lastgroup]
+    return delimiter + match.group().translate(_PLAIN_TABLE) + delimiter
+
 
 class LinkedInFormatter:
-    """Handles formatting content specifically for LinkedIn compatibility"""
+    """Handles formatting content specifically for LinkedIn compatibility
+
+    Instances hold no per-request state, so a single formatter can be shared
+    by every request in the process (see ``app.dependencies``).
+    """
     
     def __init__(self):
-        # Complete Unicode character mappings for bold, italic, and bold-italic
-        self.bold_chars = {
-            'A': '𝗔', 'B': '𝗕', 'C': '𝗖', 'D': '𝗗', 'E': '𝗘', 'F': '𝗙', 'G': '𝗚', 'H': '𝗛',
-            'I': '𝗜', 'J': '𝗝', 'K': '𝗞', 'L': '𝗟', 'M': '𝗠', 'N': '𝗡', 'O': '𝗢', 'P': '𝗣',
-            'Q': '𝗤', 'R': '𝗥', 'S': '𝗦', 'T': '𝗧', 'U': '𝗨', 'V': '𝗩', 'W': '𝗪', 'X': '𝗫',
-            'Y': '𝗬', 'Z': '𝗭',
-            'a': '𝗮', 'b': '𝗯', 'c': '𝗰', 'd': '𝗱', 'e': '𝗲', 'f': '𝗳', 'g': '𝗴', 'h': '𝗵',
-            'i': '𝗶', 'j': '𝗷', 'k': '𝗸', 'l': '𝗹', 'm': '𝗺', 'n': '𝗻', 'o': '𝗼', 'p': '𝗽',
-            'q': '𝗾', 'r': '𝗿', 's': '𝘀', 't': '𝘁', 'u': '𝘂', 'v': '𝘃', 'w': '𝘄', 'x': '𝘅',
-            'y': '𝘆', 'z': '𝘇',
-            '0': '𝟬', '1': '𝟭', '2': '𝟮', '3': '𝟯', '4': '𝟰', '5': '𝟱', '6': '𝟲', '7': '𝟳', '8': '𝟴', '9': '𝟵'
-        }
-        
-        self.italic_chars = {
-            'A': '𝘈', 'B': '𝘉', 'C': '𝘊', 'D': '𝘋', 'E': '𝘌', 'F': '𝘍', 'G': '𝘎', 'H': '𝘏',
-            'I': '𝘐', 'J': '𝘑', 'K': '𝘒', 'L': '𝘓', 'M': '𝘔', 'N': '𝘕', 'O': '𝘖', 'P': '𝘗',
-            'Q': '𝘘', 'R': '𝘙', 'S': '𝘚', 'T': '𝘛', 'U': '𝘜', 'V': '𝘝', 'W': '𝘞', 'X': '𝘟',
-            'Y': '𝘠', 'Z': '𝘡',
-            'a': '𝘢', 'b': '𝘣', 'c': '𝘤', 'd': '𝘥', 'e': '𝘦', 'f': '𝘧', 'g': '𝘨', 'h': '𝘩',
-            'i': '𝘪', 'j': '𝘫', 'k': '𝘬', 'l': '𝘭', 'm': '𝘮', 'n': '𝘯', 'o': '𝘰', 'p': '𝘱',
-            'q': '𝘲', 'r': '𝘳', 's': '𝘴', 't': '𝘵', 'u': '𝘶', 'v': '𝘷', 'w': '𝘸', 'x': '𝘹',
-            'y': '𝘺', 'z': '𝘻'
-        }
-        
-        self.bold_italic_chars = {
-            'A': '𝘼', 'B': '𝘽', 'C': '𝘾', 'D': '𝘿', 'E': '𝙀', 'F': '𝙁', 'G': '𝙂', 'H': '𝙃',
-            'I': '𝙄', 'J': '𝙅', 'K': '𝙆', 'L': '𝙇', 'M': '𝙈', 'N': '𝙉', 'O': '𝙊', 'P': '𝙋',
-            'Q': '𝙌', 'R': '𝙍', 'S': '𝙎', 'T': '𝙏', 'U': '𝙐', 'V': '𝙑', 'W': '𝙒', 'X': '𝙓',
-            'Y': '𝙔', 'Z': '𝙕',
-            'a': '𝙖', 'b': '𝙗', 'c': '𝙘', 'd': '𝙙', 'e': '𝙚', 'f': '𝙛', 'g': '𝙜', 'h': '𝙝',
-            'i': '𝙞', 'j': '𝙟', 'k': '𝙠', 'l': '𝙡', 'm': '𝙢', 'n': '𝙣', 'o': '𝙤', 'p': '𝙥',
-            'q': '𝙦', 'r': '𝙧', 's': '𝙨', 't': '𝙩', 'u': '𝙪', 'v': '𝙫', 'w': '𝙬', 'x': '𝙭',
-            'y': '𝙮', 'z': '𝙯'
-        }
-        
-        # Underline combining character
-        self.underline_combining = '\u0332'
-    
-    def format_for_linkedin(self, content: str, preserve_formatting: bool = True) -> str:
+        self.bold_chars = BOLD_CHARS
+        self.italic_chars = ITALIC_CHARS
+        self.bold_italic_chars = BOLD_ITALIC_CHARS
+        self.underline_combining = UNDERLINE_COMBINING
+    
+    def format_for_linkedin(self, content: str, preserve_formatting: bool = True, parser: str = 'regex',
+                            normalization: Optional[str] = None) -> str:
         """
         Convert content to LinkedIn-compatible format
         
         Args:
             content: Raw content with HTML or markdown formatting
             preserve_formatting: Whether to convert formatting to Unicode
+            parser: 'regex' for an HTML pass then a markdown pass, each
+                    styling within one line, or 'fast' for the single-pass
+                    parser whose styles span lines and mix HTML with markdown
+            normalization: Optional Unicode normalization form ('NFC' or
+                           'NFKC') applied to the input
             
         Returns:
             LinkedIn-formatted content
         """
+        return self._format(content, preserve_formatting, parser, None, normalization)
+    
+    def format_with_stats(self, content: str, preserve_formatting: bool = True, parser: str = 'regex',
+                          normalization: Optional[str] = None) -> tuple[str, FormatStats]:
+        """
+        Convert content like format_for_linkedin, recording FormatStats on the way
+        
+        The stats come from the line-break pass, which already visits every
+        output line, and let ContentValidator.validate_formatted check the
+        result without rescanning it for line structure.
+        
+        Args:
+            content: Raw content with HTML or markdown formatting
+            preserve_formatting: Whether to convert formatting to Unicode
+            parser: Markup parser, as for format_for_linkedin
+            normalization: Normalization form, as for format_for_linkedin
+            
+        Returns:
+            Tuple of LinkedIn-formatted content and its FormatStats
+        """
+        stats = FormatStats()
+        formatted = self._format(content, preserve_formatting, parser, stats, normalization)
+        stats.character_count = len(formatted)
+        return formatted, stats
+    
+    def _format(self, content: str, preserve_formatting: bool, parser: str, stats: Optional[FormatStats],
+                normalization: Optional[str] = None) -> str:
+        self._check_parser(parser)
+        check_normalization(normalization)
+        
         if not content:
             return ""
         
         # Clean the content first
-        formatted = self._clean_content(content)
+        formatted = self._clean_content(content, normalization)
         
         if preserve_formatting:
-            # Convert HTML formatting to Unicode
-            formatted = self._convert_html_to_unicode(formatted)
-            
-            # Convert markdown formatting to Unicode
-            formatted = self._convert_markdown_to_unicode(formatted)
+            # Convert HTML and markdown formatting to Unicode
+            checkpoint()
+            formatted = self._convert_formatting(formatted, parser)
         
         # Handle line breaks properly for LinkedIn
-        formatted = self._handle_line_breaks(formatted)
+        checkpoint()
+        formatted = self._handle_line_breaks(formatted, stats)
         
         # Clean up any remaining issues
+        checkpoint()
         formatted = self._final_cleanup(formatted)
         
         return formatted
     
+    def format_stream(self, chunks: Iterable[str], preserve_formatting: bool = True, parser: str = 'regex',
+                      normalization: Optional[str] = None) -> Iterator[str]:
+        """
+        Convert content to LinkedIn-compatible format as a stream
+        
+        Input is processed paragraph by paragraph, so output starts before
+        the whole input has been read and memory stays bounded by the
+        largest paragraph. The concatenated output is identical to
+        format_for_linkedin on the concatenated input.
+        
+        Args:
+            chunks: Iterable of raw content pieces, split anywhere
+            preserve_formatting: Whether to convert formatting to Unicode
+            parser: Markup parser, as for format_for_linkedin
+            normalization: Normalization form, as for format_for_linkedin
+            
+        Yields:
+            Pieces of LinkedIn-formatted content
+        """
+        stream = FormatStream(self, preserve_formatting, parser, normalization)
+        for chunk in chunks:
+            formatted = stream.feed(chunk)
+            if formatted:
+                yield formatted
+        formatted = stream.close()
+        if formatted:
+            yield formatted
+    
+    def unformat(self, content: str) -> str:
+        """
+        Convert styled Unicode back to markdown
+        
+        Runs of bold, italic and bold-italic characters become **bold**,
+        *italic* and ***bold italic***, found in one scan; spaces and
+        punctuation between characters of the same style stay inside the
+        run. Underline combining characters are dropped, as markdown has
+        no underline.
+        
+        For output of format_for_linkedin, formatting the result again with
+        either parser gives back the same text, provided the text has no
+        literal '*' or '_' of its own.
+        
+        Args:
+            content: Text containing Unicode-styled characters
+            
+        Returns:
+            The text with markdown emphasis instead of styled characters
+        """
+        if UNDERLINE_COMBINING in content:
+            content = content.replace(UNDERLINE_COMBINING, '')
+        if not _STYLED_CHAR_RE.search(content):
+            return content
+        return STYLED_RUN_RE.sub(_unstyle_match, content)
+    
+    def unformat_many(self, contents: List[str]) -> List[str]:
+        """
+        Unformat many texts at once, e.g. to normalize an archive of posts
+        
+        The texts are joined and scanned together, which saves the
+        per-call overhead of unformat on short posts.
+        
+        Args:
+            contents: Texts containing Unicode-styled characters
+            
+        Returns:
+            The unformatted texts, in the same order
+        """
+        joined = _BATCH_SEPARATOR.join(contents)
+        if joined.count(_BATCH_SEPARATOR) != max(len(contents) - 1, 0):
+            # A text contains the separator itself
+            return [self.unformat(content) for content in contents]
+        unformatted = self.unformat(joined).split(_BATCH_SEPARATOR)
+        return unformatted if contents else []
+    
     def format_with_ranges(self, content: str, ranges: list[dict]) -> str:
         """
         Format content with specific text ranges
@@ -88,98 +335,202 @@ class LinkedInFormatter:
         Returns:
             Formatted content with Unicode characters
         """
-        if not ranges:
-            return content
+        return self.format_with_ranges_mapped(content, ranges)[0]
+    
+    def format_with_ranges_mapped(self, content: str, ranges: list[dict]) -> tuple[str, list[list[int]]]:
+        """
+        Format content with specific text ranges and map input to output offsets
         
-        result = list(content)
+        Ranges may overlap: every segment gets the union of the styles
+        covering it, so bold and italic combine into bold-italic and
+        underline is applied on top of either. Boundaries are sorted once
+        and the output is emitted in a single sweep.
         
-        # Sort ranges by start position (process from end to beginning to maintain indices)
-        sorted_ranges = sorted(ranges, key=lambda x: x['start'], reverse=True)
+        Args:
+            content: The original content
+            ranges: List of dictionaries with 'start', 'end', and 'styles' keys
+        
+        Returns:
+            Tuple of (formatted content, offset map). The offset map is a list
+            of [input_start, output_start, width] entries sorted by
+            input_start; input index i maps to
+            output_start + (i - input_start) * width using the last entry
+            whose input_start <= i (the content length maps to the output length).
+        """
+        length = len(content)
         
-        for range_format in sorted_ranges:
+        # Coverage deltas at every range boundary. The bold, italic and
+        # underline counters are packed into one integer so each boundary is
+        # a single dict update; a running sum of the deltas is never negative.
+        events: Dict[int, int] = {}
+        for range_format in ranges:
             start = range_format['start']
             end = range_format['end']
             styles = range_format.get('styles', [])
             
-            if start >= len(result) or end > len(result) or start >= end:
+            if start < 0 or start >= length or end > length or start >= end:
                 continue
-                
-            text = ''.join(result[start:end])
             
-            # Apply formatting based on styles
-            if 'bold' in styles and 'italic' in styles:
-                formatted = self._to_bold_italic(text)
-            elif 'bold' in styles:
-                formatted = self._to_bold(text)
-            elif 'italic' in styles:
-                formatted = self._to_italic(text)
-            elif 'underline' in styles:
-                formatted = self._to_underline(text)
-            else:
-                formatted = text
-                
-            result[start:end] = list(formatted)
+            weight = 0
+            if 'bold' in styles:
+                weight += _BOLD_UNIT
+            if 'italic' in styles:
+                weight += _ITALIC_UNIT
+            if 'underline' in styles:
+                weight += _UNDERLINE_UNIT
+            if not weight:
+                continue
+            
+            events[start] = events.get(start, 0) + weight
+            events[end] = events.get(end, 0) - weight
+        
+        parts = []
+        offset_map = []
+        active = 0
+        style = (False, False, False)
+        position = output_length = 0
+        
+        for boundary in sorted(events):
+            active += events[boundary]
+            next_style = (
+                bool(active & _COUNTER_MASK),
+                bool((active >> _COUNTER_BITS) & _COUNTER_MASK),
+                bool(active >> (2 * _COUNTER_BITS))
+            )
+            if next_style == style:
+                continue
+            
+            # Emit the segment that ends here with the style it had
+            if boundary > position:
+                text = self._style_segment(content[position:boundary], *style)
+                width = 2 if style[2] else 1
+                if not offset_map or offset_map[-1][2] != width:
+                    offset_map.append([position, output_length, width])
+                parts.append(text)
+                output_length += len(text)
+                position = boundary
+            style = next_style
+        
+        if position < length or not offset_map:
+            parts.append(content[position:])
+            if not offset_map or offset_map[-1][2] != 1:
+                offset_map.append([position, output_length, 1])
         
-        return ''.join(result)
+        return ''.join(parts), offset_map
     
-    def _clean_content(self, content: str) -> str:
+    def _style_segment(self, text: str, bold: bool, italic: bool, underline: bool) -> str:
+        """Apply a combination of styles to a run of text"""
+        if bold and italic:
+            text = self._to_bold_italic(text)
+        elif bold:
+            text = self._to_bold(text)
+        elif italic:
+            text = self._to_italic(text)
+        if underline:
+            text = self._to_underline(text)
+        return text
+    
+    def _clean_content(self, content: str, normalization: Optional[str] = None) -> str:
         """Remove problematic characters and normalize content"""
-        # Remove invisible characters that can break LinkedIn
-        content = ''.join(char for char in content if unicodedata.category(char) != 'Cf')
-        
-        # Remove zero-width characters
-        content = re.sub(r'[\u200b-\u200d\ufeff]', '', content)
+        return self._remove_problem_characters(content, normalization).strip()
+    
+    def _remove_problem_characters(self, content: str, normalization: Optional[str] = None) -> str:
+        """Drop invisible and control characters and collapse runs of whitespace (see sanitize.clean_text)"""
+        return clean_text(content, normalization)
+    
+    def _check_parser(self, parser: str):
+        """Reject unknown parser names"""
+        if parser not in PARSERS:
+            raise ValueError(f"Unknown parser '{parser}', expected one of: {', '.join(PARSERS)}")
+    
+    def _convert_formatting(self, content: str, parser: str) -> str:
+        """Convert HTML and markdown formatting with the chosen parser"""
+        if parser == 'fast':
+            # Convert HTML and markdown formatting in a single pass
+            return self._convert_markup_to_unicode(content)
         
-        # Normalize whitespace
-        content = re.sub(r'[ \t]+', ' ', content)
+        # Convert HTML formatting to Unicode
+        content = self._convert_html_to_unicode(content)
         
-        return content.strip()
+        # Convert markdown formatting to Unicode
+        checkpoint()
+        return self._convert_markdown_to_unicode(content)
     
     def _convert_html_to_unicode(self, content: str) -> str:
         """Convert HTML formatting tags to Unicode characters"""
-        # Handle bold tags
-        content = re.sub(r'<b>(.*?)</b>', lambda m: self._to_bold(m.group(1)), content, flags=re.IGNORECASE)
-        content = re.sub(r'<strong>(.*?)</strong>', lambda m: self._to_bold(m.group(1)), content, flags=re.IGNORECASE)
-        
-        # Handle italic tags
-        content = re.sub(r'<i>(.*?)</i>', lambda m: self._to_italic(m.group(1)), content, flags=re.IGNORECASE)
-        content = re.sub(r'<em>(.*?)</em>', lambda m: self._to_italic(m.group(1)), content, flags=re.IGNORECASE)
+        content = self._convert_html_tags(content)
         
         # Remove any remaining HTML tags
-        content = re.sub(r'<[^>]+>', '', content)
-        
-        return content
+        return self._strip_html_tags(content)
+    
+    def _convert_html_tags(self, content: str) -> str:
+        """Convert bold and italic tag pairs (each within one line) to Unicode, dropping other one-line tags"""
+        if '<' not in content:
+            return content
+        return self._render_spans(parse_markup(content, emphasis=False, scope=LINE))
+    
+    def _strip_html_tags(self, content: str) -> str:
+        """Remove every remaining HTML tag"""
+        return _HTML_TAG_RE.sub('', content)
     
     def _convert_markdown_to_unicode(self, content: str) -> str:
-        """Convert markdown formatting to Unicode characters"""
-        # Handle bold markdown
-        content = re.sub(r'\*\*(.*?)\*\*', lambda m: self._to_bold(m.group(1)), content)
-        content = re.sub(r'__(.*?)__', lambda m: self._to_bold(m.group(1)), content)
-        
-        # Handle italic markdown
-        content = re.sub(r'\*(.*?)\*', lambda m: self._to_italic(m.group(1)), content)
-        content = re.sub(r'_(.*?)_', lambda m: self._to_italic(m.group(1)), content)
-        
-        return content
+        """Convert markdown emphasis (each within one line) to Unicode characters"""
+        if '*' not in content and '_' not in content:
+            return content
+        return self._render_spans(parse_markup(content, tags=False, scope=LINE))
+    
+    def _convert_markup_to_unicode(self, content: str) -> str:
+        """Convert HTML and markdown formatting to Unicode in one pass"""
+        if '*' not in content and '_' not in content and '<' not in content:
+            return content
+        return self._render_spans(parse_markup(content))
+    
+    def _render_spans(self, root: StyleSpan) -> str:
+        """Emit the text of a style-span tree, styling each run by its enclosing spans"""
+        parts = []
+        stack = [(iter(root.children), False, False)]
+        while stack:
+            children, bold, italic = stack[-1]
+            for child in children:
+                if isinstance(child, str):
+                    if bold and italic:
+                        child = self._to_bold_italic(child)
+                    elif bold:
+                        child = self._to_bold(child)
+                    elif italic:
+                        child = self._to_italic(child)
+                    parts.append(child)
+                else:
+                    stack.append((
+                        iter(child.children),
+                        bold or child.style == BOLD,
+                        italic or child.style == ITALIC
+                    ))
+                    break
+            else:
+                stack.pop()
+        return ''.join(parts)
     
     def _to_bold(self, text: str) -> str:
         """Convert text to Unicode bold characters"""
-        return ''.join(self.bold_chars.get(char, char) for char in text)
+        return text.translate(_BOLD_TABLE)
     
     def _to_italic(self, text: str) -> str:
         """Convert text to Unicode italic characters"""
-        return ''.join(self.italic_chars.get(char, char) for char in text)
+        return text.translate(_ITALIC_TABLE)
     
     def _to_bold_italic(self, text: str) -> str:
         """Convert text to Unicode bold italic characters"""
-        return ''.join(self.bold_italic_chars.get(char, char) for char in text)
+        return text.translate(_BOLD_ITALIC_TABLE)
     
     def _to_underline(self, text: str) -> str:
         """Convert text to underlined using combining characters"""
-        return ''.join(char + self.underline_combining for char in text)
+        if not text:
+            return ''
+        return UNDERLINE_COMBINING.join(text) + UNDERLINE_COMBINING
     
-    def _handle_line_breaks(self, content: str) -> str:
-        """Handle line breaks properly for LinkedIn"""
+    def _handle_line_breaks(self, content: str, stats: Optional[FormatStats] = None) -> str:
+        """Handle line breaks properly for LinkedIn, filling in line stats if given"""
         # Convert single line breaks to double line breaks for paragraph separation
         # But preserve intentional single breaks within paragraphs
         lines = content.split('\n')
@@ -193,11 +544,19 @@ class LinkedInFormatter:
             else:
                 processed_lines.append(line)
         
+        if stats is not None:
+            # _final_cleanup only drops a trailing paragraph break, so these
+            # lines are exactly the lines of the final output
+            output_lines = processed_lines[:-1] if processed_lines and not processed_lines[-1] else processed_lines
+            stats.line_count = len(output_lines)
+            stats.longest_line = max(map(len, output_lines), default=0)
+            stats.paragraph_count = output_lines.count('') + 1 if output_lines else 0
+        
         # Join lines and ensure proper paragraph spacing
         result = '\n'.join(processed_lines)
         
         # Clean up multiple consecutive empty lines
-        result = re.sub(r'\n\s*\n\s*\n+', '\n\n', result)
+        result = _EXTRA_BLANK_LINES_RE.sub('\n\n', result)
         
         return result
     
@@ -207,7 +566,7 @@ class LinkedInFormatter:
         content = content.strip()
         
         # Ensure content doesn't start or end with empty lines
-        content = re.sub(r'^\n+', '', content)
-        content = re.sub(r'\n+$', '', content)
+        content = _LEADING_NEWLINES_RE.sub('', content)
+        content = _TRAILING_NEWLINES_RE.sub('', content)
         
         return content
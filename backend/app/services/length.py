@@ -0,0 +1,327 @@
+import re
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from app.services.formatter import STYLED_RUN_RE
+from app.services.unicode_tables import table_chars
+
+# Units a text can be measured in. LinkedIn counts UTF-16 code units, as
+# JavaScript string lengths do, so a styled (astral) letter counts twice.
+LENGTH_UNITS = ('code_points', 'utf16_units', 'graphemes')
+
+_CONTROL_CHARS = frozenset(map(chr, chain(range(0x20), range(0x7f, 0xa0))))
+_ZWJ = '\u200d'
+_REGIONAL_INDICATORS = frozenset(map(chr, range(0x1f1e6, 0x1f200)))
+# Extended_Pictographic, approximated by the blocks emoji live in
+_PICTOGRAPHIC_RE = re.compile(
+    r'[\u00a9\u00ae\u203c\u2049\u2122\u2139\u2194-\u21aa\u231a-\u23ff\u24c2\u25aa-\u27bf'
+    r'\u2934\u2935\u2b05-\u2b55\u3030\u303d\u3297\u3299\U0001f000-\U0001faff]'
+)
+
+# Characters that never start a grapheme cluster unless they come first or
+# after a control character: combining and spacing marks, joiners,
+# variation selectors, emoji modifiers and tag characters (UAX #29 Extend,
+# ZWJ and SpacingMark)
+_EXTEND_CHARS = frozenset(chain(
+    table_chars('marks'),
+    '\u200c\u200d',
+    map(chr, range(0x1f3fb, 0x1f400)),
+    map(chr, range(0xe0020, 0xe0080))
+))
+
+
+def _hangul_type(char: str) -> Optional[str]:
+    """Hangul syllable type of a character: L, V, T, LV, LVT or None"""
+    code = ord(char)
+    if 0x1100 <= code <= 0x115f or 0xa960 <= code <= 0xa97c:
+        return 'L'
+    if 0x1160 <= code <= 0x11a7 or 0xd7b0 <= code <= 0xd7c6:
+        return 'V'
+    if 0x11a8 <= code <= 0x11ff or 0xd7cb <= code <= 0xd7fb:
+        return 'T'
+    if 0xac00 <= code <= 0xd7a3:
+        return 'LV' if (code - 0xac00) % 28 == 0 else 'LVT'
+    return None
+
+
+# Hangul types a jamo of each type joins after
+_HANGUL_JOINS = {'L': ('L',), 'V': ('L', 'V', 'LV'), 'T': ('V', 'T', 'LV', 'LVT')}
+
+
+def _candidate_pattern() -> 're.Pattern[str]':
+    """
+    Match one character that may join the cluster before it
+
+    The BMP Extend characters and conjoining jamo are matched exactly; the
+    astral ones by a few wide ranges around them that leave out the styled
+    letters and emoji (but not skin tone modifiers or flags). The regex
+    engine tests a BMP class with one bitmap lookup but astral characters
+    range by range, and as separate alternatives each kind of class keeps
+    its fast test.
+    """
+    codes = sorted(chain(
+        (ord(char) for char in _EXTEND_CHARS if char <= '\uffff'),
+        range(0x1100, 0x1200), range(0xa960, 0xa97d), range(0xd7b0, 0xd7fc)
+    ))
+    parts = []
+    start = previous = codes[0]
+    for code in codes[1:] + [None]:
+        if code != previous + 1:
+            parts.append(f'\\u{start:04x}' if start == previous else f'\\u{start:04x}-\\u{previous:04x}')
+            start = code
+        previous = code
+    astral = (
+        r'\U00010000-\U0001d3ff\U0001da00-\U0001efff\U0001f1e6-\U0001f1ff'
+        r'\U0001f3fb-\U0001f3ff\U000e0000-\U000e0fff'
+    )
+    return re.compile('[' + ''.join(parts) + ']|[' + astral + ']')
+
+
+_CANDIDATE_RE = _candidate_pattern()
+
+_ASTRAL_RE = re.compile(r'[\U00010000-\U0010ffff]')
+
+# Where a post may end, best first: paragraph breaks, line breaks, the space
+# after a sentence and any space. Each pattern matched from a position
+# finds the last such break before endpos: the greedy prefix runs to
+# endpos and backs off one character at a time.
+_BREAK_PATTERNS = tuple(re.compile(pattern, re.DOTALL) for pattern in (
+    r'.*(\n)[^\S\n]*\n',
+    r'.*(\n)',
+    r'.*[.!?]([^\S\n])',
+    r'.*([^\S\n])',
+))
+
+
+class TextLength:
+    """A text's length in code points, UTF-16 code units and grapheme clusters"""
+
+    __slots__ = ('code_points', 'utf16_units', 'graphemes')
+
+    def __init__(self, code_points: int = 0, utf16_units: int = 0, graphemes: int = 0):
+        self.code_points = code_points
+        self.utf16_units = utf16_units
+        self.graphemes = graphemes
+
+    def as_dict(self) -> Dict[str, int]:
+        return {unit: getattr(self, unit) for unit in LENGTH_UNITS}
+
+
+def utf16_length(text: str) -> int:
+    """Length of a text in UTF-16 code units (astral characters count twice)"""
+    return len(text.encode('utf-16-le', 'surrogatepass')) >> 1
+
+
+def grapheme_count(text: str) -> int:
+    """
+    Number of user-perceived characters (extended grapheme clusters)
+
+    Follows UAX #29 for marks, joiners, emoji sequences, flags and Hangul
+    jamo; prepended concatenation marks (GB9b) are rare enough to ignore.
+    """
+    if text.isascii():
+        return len(text) - text.count('\r\n')
+    return len(text) - sum(1 for _ in _joined_positions(text))
+
+
+def _joined_positions(text: str) -> Iterator[int]:
+    """
+    Positions of the characters joined to the grapheme cluster before them
+
+    Only candidate characters are looked at in Python, so other text costs
+    one or two class tests per character in the regex engine.
+    """
+    crlf = text.find('\r\n')
+    flag_start = -2  # Regional indicator that began an unfinished flag
+    for match in _CANDIDATE_RE.finditer(text):
+        index = match.start()
+        while 0 <= crlf < index:
+            yield crlf + 1
+            crlf = text.find('\r\n', crlf + 2)
+        char = text[index]
+        previous = text[index - 1] if index else None
+        if char in _EXTEND_CHARS:
+            # A mark at the start or after a control character is a cluster of its own
+            if previous is not None and previous not in _CONTROL_CHARS:
+                yield index
+            if char == _ZWJ and index + 1 < len(text):
+                following = text[index + 1]
+                if (following not in _EXTEND_CHARS and following not in _REGIONAL_INDICATORS
+                        and _PICTOGRAPHIC_RE.match(following)):
+                    yield index + 1
+        elif char in _REGIONAL_INDICATORS:
+            if flag_start == index - 1:
+                yield index
+                flag_start = -2
+            else:
+                flag_start = index
+        else:
+            kind = _hangul_type(char)
+            if kind is not None and previous is not None and _hangul_type(previous) in _HANGUL_JOINS[kind]:
+                yield index
+    while crlf >= 0:
+        yield crlf + 1
+        crlf = text.find('\r\n', crlf + 2)
+
+
+def measure_text(text: str) -> TextLength:
+    """Measure a text in every unit of LENGTH_UNITS"""
+    return TextLength(len(text), utf16_length(text), grapheme_count(text))
+
+
+def split_thread(text: str, limit: int, unit: str = 'utf16_units', numbered: bool = True) -> List[str]:
+    """
+    Break text that is over a length limit into a series of posts
+
+    Posts end at paragraph breaks where possible, then at line breaks,
+    sentence ends and spaces, preferring the best kind of break in the
+    second half of the post so posts don't come out tiny. Spaces inside a
+    styled run are only used when nothing else fits; a post is cut inside a
+    word only when it has no space at all, and then between grapheme
+    clusters. Each post costs a few binary searches and a backward scan
+    of its own text, so splitting is linear in the length of the text.
+
+    Args:
+        text: Text to split, typically formatter output
+        limit: Largest length of a post, numbering included
+        unit: Unit of the limit, one of LENGTH_UNITS
+        numbered: Append " (i/n)" to each post when there is more than one
+
+    Returns:
+        The posts in order; [text] if it is within the limit
+
+    Raises:
+        ValueError: Unknown unit, or a limit too small to hold a post
+    """
+    if unit not in LENGTH_UNITS:
+        raise ValueError(f"Unknown length unit '{unit}', expected one of: {', '.join(LENGTH_UNITS)}")
+    text = text.strip()
+    adjustments, sign = _adjustments(text, unit)
+    total = len(text) + sign * len(adjustments)
+    if total <= limit:
+        return [text]
+    if not numbered:
+        if limit < 1:
+            raise ValueError(f"Limit {limit} leaves no room for post text")
+        return _split(text, limit, adjustments, sign)
+
+    # The numbering takes more room once there are 10, 100, ... posts;
+    # start from the fewest posts the total length allows
+    digits = len(str(-(-total // max(limit - len(" (9/9)"), 1))))
+    while True:
+        budget = limit - len(f" ({'9' * digits}/{'9' * digits})")
+        if budget < 1:
+            raise ValueError(f"Limit {limit} leaves no room for post text")
+        posts = _split(text, budget, adjustments, sign)
+        if len(posts) < 10 ** digits:
+            return [f"{post} ({index}/{len(posts)})" for index, post in enumerate(posts, 1)]
+        digits += 1
+
+
+def _adjustments(text: str, unit: str) -> Tuple[List[int], int]:
+    """
+    Where a unit's length differs from the code point count
+
+    Returns the sorted positions of the characters that count differently
+    and how each counts: +1 for astral characters in UTF-16, -1 for
+    characters joined to the grapheme cluster before them. The length of
+    text[a:b] is then b - a + sign * (adjustments in [a, b)).
+    """
+    if unit == 'utf16_units':
+        return [match.start() for match in _ASTRAL_RE.finditer(text)], 1
+    if unit == 'graphemes':
+        return list(_joined_positions(text)), -1
+    return [], 0
+
+
+def _reach(adjustments: List[int], sign: int, start: int, budget: int, length: int) -> int:
+    """Furthest end for which text[start:end] is at most budget long"""
+    start_count = bisect_left(adjustments, start)
+    low, high = start, length if sign < 0 else min(length, start + budget)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if middle - start + sign * (bisect_left(adjustments, middle) - start_count) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _split(text: str, budget: int, adjustments: List[int], sign: int) -> List[str]:
+    """
+    Greedily split stripped text into posts of at most budget
+
+    Each post is measured with binary searches over the adjustments and
+    its break found by matching the break patterns back from its end, so
+    the text is scanned about once per pattern overall.
+    """
+    length = len(text)
+    runs = [match.span() for match in STYLED_RUN_RE.finditer(text)]
+    run_starts = [run[0] for run in runs]
+    joined: Optional[Set[int]] = None  # Grapheme-joined positions, for cutting inside a word
+
+    posts = []
+    start = 0
+    while start < length:
+        end = _reach(adjustments, sign, start, budget, length)
+        if end >= length:
+            posts.append(text[start:])
+            break
+        # A break in the second half of the post, then anywhere, then one
+        # inside a styled run, then a cut between grapheme clusters
+        half = _reach(adjustments, sign, start, budget // 2, length)
+        cut = (_find_break(text, runs, run_starts, half, end)
+               or _find_break(text, runs, run_starts, start + 1, end)
+               or _find_break(text, (), (), start + 1, end))
+        if cut is None:
+            if joined is None:
+                joined = set(_joined_positions(text))
+            cut = end
+            while cut > start and cut in joined:
+                cut -= 1
+            if cut == start:
+                # A single cluster is over the budget: it has to go somewhere
+                cut = start + 1
+                while cut < length and cut in joined:
+                    cut += 1
+        posts.append(text[start:cut].rstrip())
+        start = cut
+        while start < length and text[start].isspace() and not _joins_next(text, start):
+            start += 1
+    return posts
+
+
+def _joins_next(text: str, position: int) -> bool:
+    return position + 1 < len(text) and text[position + 1] in _EXTEND_CHARS
+
+
+def _find_break(text: str, runs: Sequence[Tuple[int, int]], run_starts: Sequence[int],
+                low: int, end: int) -> Optional[int]:
+    """
+    Position of the best break starting in text[low:end], or None
+
+    Spaces inside a styled run in runs don't count; a space carrying
+    combining marks (as in underlined text) breaks after its marks.
+    """
+    for pattern in _BREAK_PATTERNS:
+        endpos = end + 1
+        while endpos > low:
+            match = pattern.match(text, low, endpos)
+            if match is None:
+                break
+            position = match.start(1)
+            run = bisect_right(run_starts, position) - 1
+            if run >= 0 and position < runs[run][1]:
+                endpos = runs[run][0]
+            elif _joins_next(text, position):
+                # An underlined space: break after its marks instead
+                after = position + 1
+                while after < len(text) and text[after] in _EXTEND_CHARS:
+                    after += 1
+                if after <= end:
+                    return after
+                endpos = position
+            else:
+                return position
+    return None
@@ -0,0 +1,271 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple, Union
+
+from app.services.budget import checkpoint
+
+BOLD = 'bold'
+ITALIC = 'italic'
+
+# Where styles end: at a paragraph break (a blank line), or at every newline
+PARAGRAPH = 'paragraph'
+LINE = 'line'
+
+
+def _token_pattern(tags: bool, emphasis: bool, scope: str) -> re.Pattern:
+    """
+    The pattern finding every token: HTML tags, runs of emphasis markers
+    and style breaks. Everything between two tokens is literal text.
+
+    It starts with a bare character set so the regex engine can skip plain
+    text quickly; the lookbehinds then pick the kind of token. Every
+    alternative is linear: a tag can't contain '<', so a failed attempt
+    stops at the next one instead of rescanning the rest of the input
+    from every '<' in a run of them.
+    """
+    starts = ''
+    kinds = []
+    if tags:
+        starts += '<'
+        # A tag may span lines, except where styles end at every line
+        kinds.append(r'(?<=<)[^<>]+>' if scope == PARAGRAPH else r'(?<=<)[^<>\n]+>')
+    if emphasis:
+        starts += '*_'
+        kinds += [r'(?<=\*)\**', r'(?<=_)_*']
+    # Line ends aren't tokens: in LINE scope parse_markup looks for them
+    # between markers, so lines without markup cost nothing
+    if scope == PARAGRAPH:
+        starts += '\\n'
+        kinds.append(r'(?<=\n)(?:[^\S\n]*\n)+')
+    return re.compile(f"[{starts}](?:{'|'.join(kinds)})")
+
+
+_TOKEN_RES = {
+    (tags, emphasis, scope): _token_pattern(tags, emphasis, scope)
+    for tags in (True, False) for emphasis in (True, False) for scope in (PARAGRAPH, LINE)
+    if tags or emphasis
+}
+_TAG_STYLES = {'b': BOLD, 'strong': BOLD, 'i': ITALIC, 'em': ITALIC}
+# Lowercased style tag -> (name, whether it closes)
+_STYLE_TAGS = {f'<{slash}{name}>': (name, bool(slash)) for name in _TAG_STYLES for slash in ('', '/')}
+# Tokens parsed between time budget checkpoints
+_CHECKPOINT_EVERY = 4096
+
+
+class StyleSpan:
+    """A node of the style-span tree: a style plus its text and nested spans"""
+
+    __slots__ = ('style', 'children')
+
+    def __init__(self, style: Optional[str] = None):
+        self.style = style
+        self.children: List[Union[str, 'StyleSpan']] = []
+
+
+class _Marker:
+    """A tag or emphasis delimiter run waiting to be matched"""
+
+    __slots__ = ('kind', 'char', 'count', 'index', 'opens', 'closes')
+
+    def __init__(self, kind: str, char: str, count: int, index: int):
+        self.kind = kind
+        self.char = char
+        self.count = count
+        self.index = index
+        self.opens: List[str] = []
+        self.closes: List[str] = []
+
+
+def parse_markup(content: str, tags: bool = True, emphasis: bool = True, scope: str = PARAGRAPH) -> StyleSpan:
+    """
+    Parse HTML and markdown emphasis into a style-span tree in one pass
+
+    Supports <b>/<strong>, <i>/<em>, **bold**, __bold__, *italic*, _italic_
+    and any nesting or combination of them (e.g. ***bold italic*** or
+    <b><i>x</i></b>). Other HTML tags are dropped. Styles never extend past
+    the end of their scope; unmatched markers are kept as literal text.
+
+    Emphasis follows CommonMark's flanking rules: a run of markers opens
+    only where it is followed by text, closes only where it is preceded by
+    text, and next to punctuation only where that is on its outer side.
+    An underscore run inside a word neither opens nor closes, so
+    snake_case_names and "2 * 3 * 4" stay as they are. Runs are matched on
+    a stack, so parsing takes time linear in the length of the content
+    however its markers are (un)balanced.
+
+    Tags are matched the same way: a closing tag closes the nearest open
+    tag of its name, and a span closing drops the tags opened inside it,
+    as misnested HTML can't be represented in the tree. So in
+    <i>a<i></i>b the inner pair is empty and the outer <i> is never
+    closed, leaving "ab" plain. The regex parser's earlier lazy patterns
+    paired the first <i> with the first </i> instead (italic "a"); output
+    for such HTML changed with ENGINE_VERSION 4.
+
+    Args:
+        content: Cleaned content containing markup
+        tags: Parse HTML tags
+        emphasis: Parse markdown emphasis
+        scope: PARAGRAPH, or LINE to end every style at the end of its line
+
+    Returns:
+        Root StyleSpan (style None) of the parsed tree
+    """
+    root = StyleSpan()
+    items: List[Union[str, _Marker]] = []
+    openers: Dict[str, List[_Marker]] = {}
+    has_markers = False
+    position = 0
+    length = len(content)
+    lines = scope == LINE
+
+    for index, match in enumerate(_TOKEN_RES[(tags, emphasis, scope)].finditer(content)):
+        if not index % _CHECKPOINT_EVERY:
+            checkpoint()
+        start, end = match.span()
+        if lines and has_markers and content.find('\n', position, start) >= 0:
+            # A new line: the markers before it are resolved on their own
+            _build_paragraph(root, items)
+            items = []
+            openers = {}
+            has_markers = False
+        if start > position:
+            items.append(content[position:start])
+        position = end
+        first = content[start]
+
+        if first == '\n':
+            if has_markers:
+                _build_paragraph(root, items)
+            else:
+                root.children.extend(items)
+            root.children.append(match.group())
+            items = []
+            openers = {}
+            has_markers = False
+            continue
+
+        if first == '<':
+            tag = _STYLE_TAGS.get(match.group().lower())
+            if tag:
+                name, closes = tag
+                marker = _Marker(name, '', 1, len(items))
+                if closes:
+                    _close_tag(marker, openers)
+                else:
+                    openers.setdefault(name, []).append(marker)
+                items.append(marker)
+                has_markers = True
+            continue
+
+        # The start and end of the content count as whitespace
+        before = content[start - 1] if start else ' '
+        after = content[end] if end < length else ' '
+        can_open, can_close = _FLANKING[(
+            first,
+            _ASCII_KINDS.get(before) if before < '\x80' else _char_kind(before),
+            _ASCII_KINDS.get(after) if after < '\x80' else _char_kind(after)
+        )]
+        stack = openers.get(first)
+        if not can_open and not (can_close and stack):
+            # A run that can't take part in emphasis is just text
+            items.append(match.group())
+            continue
+
+        marker = _Marker(first, first, end - start, len(items))
+        if can_close and stack:
+            _close_delimiters(marker, stack, openers)
+        if marker.count and can_open:
+            if stack is None:
+                openers[first] = [marker]
+            else:
+                stack.append(marker)
+        items.append(marker)
+        has_markers = True
+
+    if position < length:
+        items.append(content[position:])
+    if has_markers:
+        _build_paragraph(root, items)
+    else:
+        root.children.extend(items)
+    return root
+
+
+# What a delimiter run's neighbours can be, as far as flanking goes
+_SPACE, _PUNCTUATION, _OTHER = range(3)
+
+
+def _char_kind(char: str) -> int:
+    """Whitespace, punctuation (Unicode punctuation or symbol, as CommonMark counts it) or other"""
+    if char.isspace():
+        return _SPACE
+    return _PUNCTUATION if unicodedata.category(char)[0] in 'PS' else _OTHER
+
+
+def _flanking(char: str, before: int, after: int) -> Tuple[bool, bool]:
+    """Whether a run of char between neighbours of these kinds can open and can close emphasis"""
+    # Left-flanking: followed by text, and by punctuation only after
+    # whitespace or punctuation; right-flanking is its mirror image
+    left = after != _SPACE and (after != _PUNCTUATION or before != _OTHER)
+    right = before != _SPACE and (before != _PUNCTUATION or after != _OTHER)
+    if char == '*':
+        return left, right
+    # An underscore run also can't open or close inside a word
+    return left and (not right or before == _PUNCTUATION), right and (not left or after == _PUNCTUATION)
+
+
+_ASCII_KINDS = {chr(code): _char_kind(chr(code)) for code in range(128)}
+# (marker, kind before, kind after) -> (can open, can close)
+_FLANKING = {
+    (char, before, after): _flanking(char, before, after)
+    for char in '*_' for before in range(3) for after in range(3)
+}
+
+
+def _close_tag(closer: _Marker, openers: Dict[str, List[_Marker]]):
+    """Match a closing style tag with the nearest open tag of the same name"""
+    stack = openers.get(closer.kind)
+    if stack:
+        opener = stack.pop()
+        _pair(opener, closer, _TAG_STYLES[closer.kind], openers)
+
+
+def _close_delimiters(closer: _Marker, stack: List[_Marker], openers: Dict[str, List[_Marker]]):
+    """Match a delimiter run against open runs of the same character"""
+    while closer.count and stack:
+        opener = stack[-1]
+        used = 2 if opener.count >= 2 and closer.count >= 2 else 1
+        opener.count -= used
+        closer.count -= used
+        if not opener.count:
+            stack.pop()
+        _pair(opener, closer, BOLD if used == 2 else ITALIC, openers)
+
+
+def _pair(opener: _Marker, closer: _Marker, style: str, openers: Dict[str, List[_Marker]]):
+    """Record a matched span and drop every opener inside it"""
+    opener.opens.append(style)
+    closer.closes.append(style)
+    # Markers opened between the pair can no longer be closed without
+    # crossing it, which keeps every span in the tree properly nested
+    for stack in openers.values():
+        while stack and stack[-1].index > opener.index:
+            stack.pop()
+
+
+def _build_paragraph(root: StyleSpan, items: List[Union[str, _Marker]]):
+    """Turn one paragraph's resolved items into spans under the root"""
+    stack = [root]
+    for item in items:
+        if isinstance(item, str):
+            stack[-1].children.append(item)
+            continue
+        for _ in item.closes:
+            stack.pop()
+        if item.count and item.char:
+            stack[-1].children.append(item.char * item.count)
+        # Opens are recorded innermost first
+        for style in reversed(item.opens):
+            span = StyleSpan(style)
+            stack[-1].children.append(span)
+            stack.append(span)
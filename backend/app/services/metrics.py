@@ -0,0 +1,197 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Histogram bucket upper bounds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+STAGE_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)
+
+# Pipeline stages timed by instrument(): stage name -> the method running it.
+# The regex parser converts HTML then markdown; the fast parser does both
+# in one 'markup' pass.
+FORMATTER_STAGES = {
+    'clean': '_clean_content',
+    'html': '_convert_html_to_unicode',
+    'markdown': '_convert_markdown_to_unicode',
+    'markup': '_convert_markup_to_unicode',
+    'line_breaks': '_handle_line_breaks',
+    'cleanup': '_final_cleanup',
+}
+# The validator collects every signal in one scan, then runs each check on them
+VALIDATOR_STAGES = {
+    'scan': 'scan',
+    'scan_formatted': 'scan_formatted',
+    'problematic_characters': '_find_problematic_characters',
+    'formatting_issues': '_check_formatting_issues',
+    'suggestions': '_generate_suggestions',
+}
+
+
+class Histogram:
+    """Observation counts per bucket, with their sum, as Prometheus histograms keep them"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(names: Sequence[str], values: Sequence[Any]) -> str:
+    return ','.join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """
+    Request and pipeline stage metrics for one process, rendered in the
+    Prometheus text format
+
+    Every update takes one lock, so the threadpool routes and the event
+    loop can record into the same instance.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._request_latency: Dict[Tuple[str, str, int], Histogram] = {}
+        self._request_size: Dict[Tuple[str, str], Histogram] = {}
+        self._response_size: Dict[Tuple[str, str], Histogram] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._stages: Dict[Tuple[str, str], Histogram] = {}
+        self._rejected: Dict[str, int] = {}
+        self._shed: Dict[str, int] = {}
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float,
+                        request_bytes: int, response_bytes: int):
+        """Record a finished request under its route template, e.g. /api/templates/{template_id}"""
+        with self._lock:
+            histogram = self._request_latency.get((method, route, status))
+            if histogram is None:
+                histogram = self._request_latency[(method, route, status)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+            for sizes, size in ((self._request_size, request_bytes), (self._response_size, response_bytes)):
+                histogram = sizes.get((method, route))
+                if histogram is None:
+                    histogram = sizes[(method, route)] = Histogram(SIZE_BUCKETS)
+                histogram.observe(size)
+
+    def add_in_flight(self, method: str, route: str, delta: int):
+        """Count requests to a route as they start (+1) and finish (-1)"""
+        with self._lock:
+            self._in_flight[(method, route)] = self._in_flight.get((method, route), 0) + delta
+
+    def observe_rejected(self, reason: str):
+        """Count a request turned away before any work, e.g. for 'queue_full' or 'body_too_large'"""
+        with self._lock:
+            self._rejected[reason] = self._rejected.get(reason, 0) + 1
+
+    def observe_shed(self, reason: str):
+        """Count a request abandoned after it was admitted, e.g. for 'queue_timeout' or 'time_budget'"""
+        with self._lock:
+            self._shed[reason] = self._shed.get(reason, 0) + 1
+
+    def observe_stage(self, component: str, stage: str, seconds: float):
+        """Record the time one pipeline stage took"""
+        with self._lock:
+            histogram = self._stages.get((component, stage))
+            if histogram is None:
+                histogram = self._stages[(component, stage)] = Histogram(STAGE_BUCKETS)
+            histogram.observe(seconds)
+
+    def timed(self, component: str, stage: str, func: Callable) -> Callable:
+        """Wrap func so every call is recorded as a stage"""
+        observe = self.observe_stage
+        perf_counter = time.perf_counter
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(component, stage, perf_counter() - start)
+        return wrapper
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            lines: List[str] = []
+            self._render_histograms(lines, 'clipsy_http_request_duration_seconds',
+                                    'Time from receiving a request to sending the last of its response',
+                                    ('method', 'route', 'status'), self._request_latency)
+            self._render_histograms(lines, 'clipsy_http_request_size_bytes', 'Size of request bodies',
+                                    ('method', 'route'), self._request_size)
+            self._render_histograms(lines, 'clipsy_http_response_size_bytes', 'Size of response bodies',
+                                    ('method', 'route'), self._response_size)
+            lines.append('# HELP clipsy_http_requests_in_flight Requests being handled')
+            lines.append('# TYPE clipsy_http_requests_in_flight gauge')
+            for key, value in sorted(self._in_flight.items()):
+                lines.append(f'clipsy_http_requests_in_flight{{{_labels(("method", "route"), key)}}} {value}')
+            self._render_counters(lines, 'clipsy_requests_rejected_total',
+                                  'Requests turned away before any work was done on them', self._rejected)
+            self._render_counters(lines, 'clipsy_requests_shed_total',
+                                  'Requests abandoned after they were admitted', self._shed)
+            self._render_histograms(lines, 'clipsy_stage_duration_seconds',
+                                    'Time spent in each formatter and validator stage',
+                                    ('component', 'stage'), self._stages)
+        return '\n'.join(lines) + '\n'
+
+    def _render_counters(self, lines: List[str], name: str, description: str, counts: Dict[str, int]):
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for reason, count in sorted(counts.items()):
+            lines.append(f'{name}{{{_labels(("reason",), (reason,))}}} {count}')
+
+    def _render_histograms(self, lines: List[str], name: str, description: str,
+                           label_names: Sequence[str], histograms: Dict[tuple, Histogram]):
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} histogram')
+        for key, histogram in sorted(histograms.items()):
+            labels = _labels(label_names, key)
+            cumulative = 0
+            for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{_format_number(bound)}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {_format_number(histogram.sum)}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+def instrument(obj: Any, component: str, stages: Dict[str, str], metrics: Optional[Metrics]):
+    """
+    Time the given stages of a formatter or validator instance
+
+    The stage methods are replaced on the instance by timed wrappers, so
+    an instance that isn't instrumented runs exactly the code it always did.
+
+    Args:
+        obj: LinkedInFormatter or ContentValidator instance
+        component: Label for its stages, e.g. 'formatter'
+        stages: Stage name -> method name, e.g. FORMATTER_STAGES
+        metrics: Where to record; None leaves the instance untouched
+    """
+    if metrics is None:
+        return
+    for stage, method in stages.items():
+        setattr(obj, method, metrics.timed(component, stage, getattr(obj, method)))
+
+
+def flag_enabled(value: Optional[str]) -> bool:
+    """Whether an on/off setting such as METRICS_ENABLED is on"""
+    return (value or '').strip().lower() in ('1', 'true', 'yes', 'on')
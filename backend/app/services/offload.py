@@ -0,0 +1,175 @@
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, TypeVar
+
+from app.services.batch import format_document
+from app.services.budget import time_budget
+from app.services.formatter import LinkedInFormatter
+from app.services.template_render import CompiledTemplate, TemplateRenderer
+from app.services.validator import ContentValidator
+from app.services.workers import WorkerPool
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+T = TypeVar('T')
+
+# Where offloaded work runs: threads of this process, or worker processes
+OFFLOAD_MODES = ('thread', 'process')
+
+
+def _validate(formatter: LinkedInFormatter, validator: ContentValidator, content: str) -> Dict[str, Any]:
+    """Worker task: validate with the worker's warm validator"""
+    return validator.validate_content(content)
+
+
+def _unformat(formatter: LinkedInFormatter, validator: ContentValidator, content: str) -> str:
+    """Worker task: unformat with the worker's warm formatter"""
+    return formatter.unformat(content)
+
+
+def _render_template(formatter: LinkedInFormatter, validator: ContentValidator, template: CompiledTemplate,
+                     variables: Dict[str, Any], format_output: bool, preserve_formatting: bool, parser: str,
+                     budget: Optional[float]) -> Dict[str, Any]:
+    """Worker task: render a template with the worker's warm engines"""
+    renderer = TemplateRenderer(formatter, validator, template, format_output, preserve_formatting, parser)
+    with time_budget(budget):
+        return renderer.render(variables)
+
+
+class Offloader:
+    """
+    Runs the formatting of large inputs off the event loop, in a bounded pool
+
+    Inputs under the threshold run inline: for a typical post, handing it to
+    a pool costs more than formatting it. Larger ones run on one of at most
+    max_workers threads, so a big post holds up only the requests queued
+    behind it for the pool, not every request the event loop is serving.
+
+    In process mode (the default) those threads only wait while the
+    engines run in the worker pool's processes. In thread mode they
+    format themselves, which saves sending the text to another process but
+    shares the interpreter lock with the event loop: a regex pass over a
+    long post holds it to the end, so the loop is still stalled, only in
+    shorter stretches.
+    """
+
+    def __init__(self, threshold: Optional[int] = 16_384, max_workers: int = 2, mode: str = 'process',
+                 pool: Optional[WorkerPool] = None):
+        """
+        Args:
+            threshold: Inputs of at least this many characters are offloaded
+                       (0 = all of them, None = none)
+            max_workers: Threads in the pool, i.e. inputs offloaded at once
+            mode: 'thread' or 'process'
+            pool: Worker processes used in process mode, e.g. shared with the
+                  batch processor (None = a pool of max_workers of its own)
+
+        Raises:
+            ValueError: If the mode is unknown or max_workers isn't positive
+        """
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"Unknown offload mode {mode!r}, expected one of: {', '.join(OFFLOAD_MODES)}")
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self.mode = mode
+        self._own_pool = pool is None
+        self.pool = WorkerPool(max_workers) if pool is None else pool
+        self._threads: Optional['Executor'] = None
+        self._pool_lock = threading.Lock()
+
+    def offloads(self, size: int) -> bool:
+        """Whether an input of this many characters is offloaded"""
+        return self.threshold is not None and size >= self.threshold
+
+    async def run(self, size: int, func: Callable[[], T]) -> T:
+        """
+        Call func, in the thread pool when the input is large enough
+
+        Args:
+            size: Size of the input func works on, in characters
+            func: The request's work, e.g. a profiled_or_cached call
+
+        Returns:
+            What func returns; what it raises is raised here
+        """
+        if not self.offloads(size):
+            return func()
+        # Imported here: the serverless function has no event loop, and
+        # asyncio would be a large part of its cold start
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(self._get_threads(), func)
+
+    def format_document(self, formatter: LinkedInFormatter, validator: ContentValidator,
+                        document: Dict[str, Any], budget: Optional[float] = None,
+                        profiled: bool = False) -> Dict[str, Any]:
+        """
+        format_document, in a worker process when this offloader sends the document there
+
+        Args:
+            formatter: Formatter used when formatting here
+            validator: Validator used when formatting here
+            document: Document accepted by format_document
+            budget: Seconds the work may take, as for format_document
+            profiled: Format here even so, for a profile of the work rather than of the wait
+
+        Returns:
+            format_document's result
+
+        Raises:
+            BrokenProcessPool: If the worker process died, and died again on a retry
+        """
+        if self._in_process(len(document['content']), profiled):
+            return self.pool.run(format_document, document, budget)
+        return format_document(formatter, validator, document, budget)
+
+    def validate_content(self, validator: ContentValidator, content: str, profiled: bool = False) -> Dict[str, Any]:
+        """validator.validate_content, in a worker process when this offloader sends the content there"""
+        if self._in_process(len(content), profiled):
+            return self.pool.run(_validate, content)
+        return validator.validate_content(content)
+
+    def unformat(self, formatter: LinkedInFormatter, content: str) -> str:
+        """formatter.unformat, in a worker process when this offloader sends the content there"""
+        if self._in_process(len(content), False):
+            return self.pool.run(_unformat, content)
+        return formatter.unformat(content)
+
+    def render_template(self, renderer: TemplateRenderer, variables: Dict[str, Any],
+                        budget: Optional[float] = None) -> Dict[str, Any]:
+        """
+        renderer.render(variables) within the budget, in a worker process when
+        this offloader sends the rendered post there
+
+        Raises:
+            BudgetExceeded: If rendering ran past its budget
+            BrokenProcessPool: If the worker process died, and died again on a retry
+        """
+        if self._in_process(renderer.template.size(variables), False):
+            return self.pool.run(
+                _render_template, renderer.template, variables, renderer.format_output,
+                renderer.preserve_formatting, renderer.parser, budget
+            )
+        with time_budget(budget):
+            return renderer.render(variables)
+
+    def shutdown(self):
+        """Stop the thread pool, and the worker pool if it is this offloader's own"""
+        with self._pool_lock:
+            if self._threads is not None:
+                self._threads.shutdown()
+                self._threads = None
+        if self._own_pool:
+            self.pool.shutdown()
+
+    def _in_process(self, size: int, profiled: bool) -> bool:
+        return self.mode == 'process' and not profiled and self.offloads(size)
+
+    def _get_threads(self) -> 'Executor':
+        """Start the thread pool on first use"""
+        from concurrent.futures import ThreadPoolExecutor
+        with self._pool_lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='offload')
+            return self._threads
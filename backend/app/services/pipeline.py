@@ -0,0 +1,206 @@
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from app.services.admission import RequestLimitError
+from app.services.budget import checkpoint
+from app.services.sanitize import check_normalization
+
+if TYPE_CHECKING:
+    from app.services.formatter import LinkedInFormatter
+
+
+class ParagraphSplitter:
+    """Regroups arbitrary input chunks into whole paragraphs
+
+    Complete lines are passed through `prepare_line` as soon as they are
+    seen. A paragraph is released after a blank line, but with `track_tags`
+    never while an HTML tag is still open in the prepared lines (a '<' with
+    no '>' after it), so a tag can't straddle two units. Each unit ends with
+    a newline except the one returned by close().
+
+    Input is held back until its paragraph is released, so with max_paragraph
+    set a paragraph longer than that, or a '<' never closed, ends the stream
+    with RequestLimitError instead of growing memory with the input.
+    """
+
+    def __init__(self, prepare_line: Optional[Callable[[str], str]] = None, track_tags: bool = True,
+                 max_paragraph: Optional[int] = None):
+        self.prepare_line = prepare_line
+        self.track_tags = track_tags
+        self.max_paragraph = max_paragraph
+        self._carry: List[str] = []
+        self._carry_size = 0
+        self._lines: List[str] = []
+        self._lines_size = 0  # Input characters of _lines, before prepare_line
+        self._open_tag = False
+
+    def feed(self, chunk: str) -> List[str]:
+        """
+        Add a chunk of input and return the paragraphs it completed
+
+        Raises:
+            RequestLimitError: If more than max_paragraph characters are held back
+        """
+        if '\n' not in chunk:
+            if chunk:
+                self._carry.append(chunk)
+                self._carry_size += len(chunk)
+                self._check_held()
+            return []
+
+        self._carry.append(chunk)
+        lines = ''.join(self._carry).split('\n')
+        self._carry = [lines.pop()]
+        self._carry_size = len(self._carry[0])
+
+        units = []
+        for line in lines:
+            self._lines_size += len(line) + 1
+            if self.prepare_line:
+                line = self.prepare_line(line)
+            self._lines.append(line)
+            if self.track_tags:
+                lt = line.rfind('<')
+                gt = line.rfind('>')
+                if lt != gt:
+                    self._open_tag = lt > gt
+            if not self._open_tag and (not line or line.isspace()):
+                self._lines.append('')
+                units.append('\n'.join(self._lines))
+                self._lines = []
+                self._lines_size = 0
+        self._check_held()
+        return units
+
+    def _check_held(self):
+        if self.max_paragraph is not None and self._lines_size + self._carry_size > self.max_paragraph:
+            raise RequestLimitError(
+                'paragraph_too_large',
+                f"Paragraph is longer than {self.max_paragraph} characters"
+                + (" (an HTML tag is never closed)" if self._open_tag else "")
+            )
+
+    @property
+    def pending(self) -> bool:
+        """Whether input has been fed that no returned unit covers yet"""
+        return bool(self._lines) or any(self._carry)
+
+    def close(self) -> str:
+        """Return whatever input is left once the stream ends"""
+        line = ''.join(self._carry)
+        if self.prepare_line:
+            line = self.prepare_line(line)
+        self._lines.append(line)
+        unit = '\n'.join(self._lines)
+        self._lines = []
+        self._lines_size = 0
+        self._carry = []
+        self._carry_size = 0
+        return unit
+
+
+class LineAssembler:
+    """Streaming equivalent of _handle_line_breaks followed by _final_cleanup
+
+    Lines are stripped, runs of blank lines collapse into one paragraph
+    break, and leading or trailing blank lines are never emitted. The blank
+    line separating two paragraphs is only written once the next non-empty
+    line arrives.
+    """
+
+    def __init__(self):
+        self._carry = ''
+        self._started = False
+        self._pending_break = False
+
+    def feed(self, text: str) -> str:
+        """Add converted text and return the output lines it completed"""
+        lines = (self._carry + text).split('\n')
+        self._carry = lines.pop()
+        return self._emit(lines)
+
+    def close(self) -> str:
+        """Return the output for the final, unterminated line"""
+        lines = [self._carry]
+        self._carry = ''
+        return self._emit(lines)
+
+    def _emit(self, lines: List[str]) -> str:
+        parts = []
+        for line in lines:
+            line = line.strip()
+            if not line:
+                if self._started:
+                    self._pending_break = True
+                continue
+            if self._started:
+                parts.append('\n\n' if self._pending_break else '\n')
+            parts.append(line)
+            self._started = True
+            self._pending_break = False
+        return ''.join(parts)
+
+
+class ParagraphConverter:
+    """The formatter's stages that stay within a line or a paragraph
+
+    prepare_line runs the line-local work (problem characters, HTML tag
+    pairs) and is meant as ParagraphSplitter's prepare_line; convert runs
+    the markup conversion on one unit the splitter released.
+    """
+
+    def __init__(self, formatter: 'LinkedInFormatter', preserve_formatting: bool = True, parser: str = 'regex',
+                 normalization: Optional[str] = None):
+        formatter._check_parser(parser)
+        check_normalization(normalization)
+
+        self.formatter = formatter
+        self.preserve_formatting = preserve_formatting
+        self.parser = parser
+        self.normalization = normalization
+
+    def prepare_line(self, line: str) -> str:
+        line = self.formatter._remove_problem_characters(line, self.normalization)
+        if self.preserve_formatting and self.parser == 'regex' and '<' in line:
+            line = self.formatter._convert_html_tags(line)
+        return line
+
+    def convert(self, unit: str) -> str:
+        # Between units, as format_for_linkedin checks between its stages
+        checkpoint()
+        if self.preserve_formatting and self.parser == 'fast':
+            unit = self.formatter._convert_markup_to_unicode(unit)
+        elif self.preserve_formatting:
+            unit = self.formatter._strip_html_tags(unit)
+            unit = self.formatter._convert_markdown_to_unicode(unit)
+        return unit
+
+
+class FormatStream:
+    """Incremental LinkedIn formatting: feed raw chunks, receive output pieces
+
+    The formatter's stages are split by reach. Line-local work (problem
+    characters, HTML tag pairs) runs on each complete line, markup that can
+    span lines runs on each paragraph, and line breaks are assembled last.
+    Joining every piece returned by feed() and close() gives exactly the
+    output of LinkedInFormatter.format_for_linkedin for the joined input.
+    With max_paragraph set, feed() raises RequestLimitError once a
+    paragraph grows longer than that, as ParagraphSplitter does.
+    """
+
+    def __init__(self, formatter: 'LinkedInFormatter', preserve_formatting: bool = True, parser: str = 'regex',
+                 normalization: Optional[str] = None, max_paragraph: Optional[int] = None):
+        self.formatter = formatter
+        self.preserve_formatting = preserve_formatting
+        self.parser = parser
+        self._converter = ParagraphConverter(formatter, preserve_formatting, parser, normalization)
+        self._paragraphs = ParagraphSplitter(self._converter.prepare_line, track_tags=preserve_formatting,
+                                             max_paragraph=max_paragraph)
+        self._lines = LineAssembler()
+
+    def feed(self, chunk: str) -> str:
+        """Format the paragraphs completed by this chunk"""
+        return ''.join(self._lines.feed(self._converter.convert(unit)) for unit in self._paragraphs.feed(chunk))
+
+    def close(self) -> str:
+        """Format the remaining input and flush the last line"""
+        return self._lines.feed(self._converter.convert(self._paragraphs.close())) + self._lines.close()
@@ -0,0 +1,111 @@
+import json
+import os
+import time
+import uuid
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.metrics import FORMATTER_STAGES, VALIDATOR_STAGES
+
+if TYPE_CHECKING:
+    import cProfile
+
+# Stage methods found in a profile: (module file, method) -> stage label
+_STAGE_FUNCTIONS = {
+    **{('formatter.py', method): f'formatter.{stage}' for stage, method in FORMATTER_STAGES.items()},
+    **{('validator.py', method): f'validator.{stage}' for stage, method in VALIDATOR_STAGES.items()},
+}
+
+
+class Profiler:
+    """
+    Runs one request's formatting and validation under cProfile
+
+    Each profile is summarized as the top functions by own time and the
+    cumulative time of every formatter stage and validator check, and,
+    with an output directory, also saved there under its request id: the
+    raw profile as <id>.prof (for pstats or snakeviz) and the summary as
+    <id>.json.
+    """
+
+    def __init__(self, output_dir: Optional[str] = None, top: int = 20):
+        self.output_dir = output_dir
+        self.top = top
+
+    def run(self, func: Callable[[], Any]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Call func under the profiler
+
+        Args:
+            func: The request's work, e.g. a format_document call
+
+        Returns:
+            Tuple of func's result and the profile summary
+
+        Raises:
+            Whatever func raises; nothing is saved then
+        """
+        # Imported here so processes that never profile don't load the profiler
+        import cProfile
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        result = profile.runcall(func)
+        elapsed = time.perf_counter() - start
+
+        request_id = uuid.uuid4().hex
+        summary = self.summarize(profile, elapsed)
+        summary['request_id'] = request_id
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            path = os.path.join(self.output_dir, request_id)
+            profile.dump_stats(path + '.prof')
+            with open(path + '.json', 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            summary['saved_to'] = path + '.prof'
+        return result, summary
+
+    def summarize(self, profile: 'cProfile.Profile', elapsed: float) -> Dict[str, Any]:
+        """Top functions by own time and cumulative stage times, in milliseconds"""
+        import pstats
+        stats = pstats.Stats(profile).stats
+        stages: Dict[str, float] = {}
+        functions: List[Tuple[float, Dict[str, Any]]] = []
+        for (filename, line, name), (_, calls, own, cumulative, _) in stats.items():
+            stage = _STAGE_FUNCTIONS.get((os.path.basename(filename), name))
+            if stage is not None:
+                stages[stage] = stages.get(stage, 0.0) + cumulative * 1e3
+            label = name if filename == '~' else f'{os.path.basename(filename)}:{line}({name})'
+            functions.append((own, {
+                'function': label,
+                'calls': calls,
+                'own_ms': round(own * 1e3, 3),
+                'cumulative_ms': round(cumulative * 1e3, 3),
+            }))
+        functions.sort(key=lambda item: item[0], reverse=True)
+        return {
+            'total_ms': round(elapsed * 1e3, 3),
+            'stages_ms': {stage: round(ms, 3) for stage, ms in sorted(stages.items())},
+            'functions': [function for _, function in functions[:self.top]],
+        }
+
+
+def profiled_or_cached(cache: Any, key: str, compute: Callable[[], Any],
+                       profiler: Optional[Profiler]) -> Tuple[Any, Optional[Dict[str, Any]]]:
+    """
+    Compute a result through the result cache, or under the profiler
+
+    A profiled request always computes: a cache hit would profile nothing.
+    Its result isn't cached either, so profiling never changes what later
+    requests get.
+
+    Args:
+        cache: ResultCache to go through when not profiling
+        key: Cache key of the result
+        compute: Builds the result
+        profiler: Profiler for this request, or None
+
+    Returns:
+        Tuple of the result and the profile summary (None when not profiled)
+    """
+    if profiler is None:
+        return cache.get_or_compute(key, compute), None
+    return profiler.run(compute)
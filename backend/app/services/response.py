@@ -0,0 +1,174 @@
+import gzip
+import json
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # Slower standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Content encodings this server can produce, most preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Serialize a response to compact UTF-8 JSON
+
+    Uses orjson when it is installed, which is several times faster than
+    json.dumps on formatter results and writes non-ASCII text as UTF-8
+    rather than \\u escapes.
+
+    Args:
+        value: dicts, lists, strings, numbers, booleans and None
+
+    Returns:
+        The JSON document
+
+    Raises:
+        TypeError: If the value holds something JSON can't represent
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(value)
+        except TypeError:
+            # Lone surrogates, integers over 64 bits and non-string keys,
+            # which json below writes as it always has
+            pass
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+@lru_cache(maxsize=64)
+def negotiate(accept_encoding: Optional[str], encodings: Tuple[str, ...] = ENCODINGS) -> Optional[str]:
+    """
+    The encoding to send a response in, from the request's Accept-Encoding
+
+    Clients send the same few header values over and over, so answers are cached.
+
+    Args:
+        accept_encoding: The Accept-Encoding header, if any
+        encodings: Encodings on offer, most preferred first
+
+    Returns:
+        The accepted encoding with the highest q-value, ties going to the
+        first in encodings, or None to send the body as it is
+    """
+    if not accept_encoding:
+        return None
+    qualities: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """
+    Args:
+        body: Response body
+        encoding: 'br' or 'gzip'
+        level: Brotli quality (0-11) or gzip level (1-9); None for one fast
+               enough to run on every response
+
+    Raises:
+        ValueError: If the encoding isn't available
+    """
+    if encoding == 'gzip':
+        # mtime=0 so the same body always compresses to the same bytes
+        return gzip.compress(body, compresslevel=5 if level is None else level, mtime=0)
+    if encoding == 'br' and brotli is not None:
+        return brotli.compress(body, quality=4 if level is None else level)
+    raise ValueError(f"Unsupported content encoding {encoding!r}")
+
+
+class Payload:
+    """
+    A response body serialized once, for data that doesn't change between requests
+
+    Compressed copies are made at the highest level on first use and kept,
+    since their cost is paid once rather than on every request.
+    """
+
+    __slots__ = ('body', '_encoded')
+
+    def __init__(self, value: Any):
+        """
+        Args:
+            value: What the response returns; it must not change afterwards
+        """
+        self.body = dumps(value)
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """The body compressed with this encoding"""
+        body = self._encoded.get(encoding)
+        if body is None:
+            # Two requests racing here both compress and store the same bytes
+            body = self._encoded[encoding] = compress(self.body, encoding, 11 if encoding == 'br' else 9)
+        return body
+
+
+class ResponseEncoder:
+    """
+    Compresses JSON responses the client accepts compressed, when they are large enough
+
+    Template listings and batch results shrink to a fraction of their size,
+    while the response for a short post is a few hundred bytes, which is
+    cheaper to send as it is than to compress.
+    """
+
+    def __init__(self, min_size: Optional[int] = 1024):
+        """
+        Args:
+            min_size: Bodies of at least this many bytes are compressed (None = none)
+        """
+        self.min_size = min_size
+
+    def compresses(self, size: int) -> bool:
+        """Whether a body of this many bytes is compressed, when the client accepts it"""
+        return self.min_size is not None and size >= self.min_size
+
+    def encode(self, body: bytes, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """
+        Args:
+            body: Serialized response
+            accept_encoding: The request's Accept-Encoding header, if any
+
+        Returns:
+            The body to send and its Content-Encoding, None when sent as it is
+        """
+        if not self.compresses(len(body)):
+            return body, None
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return body, None
+        return compress(body, encoding), encoding
+
+    def encode_payload(self, payload: Payload, accept_encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+        """encode, reusing the payload's serialized and compressed bytes"""
+        if not self.compresses(len(payload.body)):
+            return payload.body, None
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            return payload.body, None
+        return payload.encoded(encoding), encoding
@@ -0,0 +1,149 @@
+import re
+import unicodedata
+from itertools import chain
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.services.unicode_tables import table_chars
+
+# Unicode normalization forms the cleanup can apply first. NFKC also folds
+# compatibility characters, such as full-width and pre-styled letters, to
+# their plain forms.
+NORMALIZATION_FORMS = ('NFC', 'NFKC')
+
+# Format characters (category Cf): zero-width spaces and joiners, bidi
+# controls, soft hyphens, the byte order mark, tag characters. They are
+# invisible and break LinkedIn's rendering, so they are always removed.
+INVISIBLE_CHARS = table_chars('format')
+
+# Control characters (category Cc). Newlines are kept, whitespace controls
+# become spaces and the rest are removed.
+CONTROL_CHARS = frozenset(map(chr, chain(range(0x20), range(0x7f, 0xa0))))
+
+# Whitespace that becomes a plain space: tabs, carriage returns and other
+# whitespace controls, and the Unicode space separators (category Zs)
+SPACE_CHARS = frozenset(
+    char for char in chain(CONTROL_CHARS, map(chr, (0xa0, 0x1680, *range(0x2000, 0x200b), 0x202f, 0x205f, 0x3000)))
+    if char.isspace() and char != '\n'
+)
+
+
+def _build_clean_table() -> Dict[int, Optional[str]]:
+    """str.translate table: removed characters map to None, spaces to ' '"""
+    table: Dict[int, Optional[str]] = {ord(char): None for char in INVISIBLE_CHARS | CONTROL_CHARS}
+    del table[ord('\n')]
+    table.update((ord(char), ' ') for char in SPACE_CHARS)
+    return table
+
+
+def char_class(chars: Iterable[str]) -> str:
+    """
+    Body of a regex character class matching exactly the given characters
+
+    Consecutive code points are merged into ranges and every character is
+    written as an escape, so the class can be spliced into other patterns.
+    """
+    codes = sorted(map(ord, chars))
+    parts = []
+    start = previous = codes[0]
+    for code in codes[1:] + [None]:
+        if code != previous + 1:
+            first = f'\\u{start:04x}' if start <= 0xffff else f'\\U{start:08x}'
+            last = f'\\u{previous:04x}' if previous <= 0xffff else f'\\U{previous:08x}'
+            parts.append(first if start == previous else f'{first}-{last}')
+            start = code
+        previous = code
+    return ''.join(parts)
+
+
+_CLEAN_TABLE = _build_clean_table()
+# The same table as patterns. str.translate looks every non-ASCII character
+# up in the table one by one, which is slower than the regex engine's class
+# test, so non-ASCII text is cleaned by deleting and then replacing with
+# these. Astral ranges are tested one at a time, so text without astral
+# characters gets a deletion pattern without them.
+_DELETED = [chr(code) for code, replacement in _CLEAN_TABLE.items() if replacement is None]
+_DELETE_RE = re.compile('[' + char_class(_DELETED) + ']+')
+_BMP_DELETE_RE = re.compile('[' + char_class(char for char in _DELETED if char <= '\uffff') + ']+')
+_WHITESPACE_RE = re.compile('[' + char_class(SPACE_CHARS) + ']+')
+_SPACE_RUN_RE = re.compile(r'  +')
+_CLEAN_RE = re.compile('[' + char_class(map(chr, _CLEAN_TABLE)) + ']+')
+
+
+class SanitizeReport:
+    """What clean_with_report took out of a text, by character"""
+
+    __slots__ = ('removed', 'replaced')
+
+    def __init__(self):
+        self.removed: Dict[str, int] = {}  # Deleted characters and their counts
+        self.replaced: Dict[str, int] = {}  # Whitespace turned into spaces
+
+    def __bool__(self) -> bool:
+        return bool(self.removed or self.replaced)
+
+    def as_dict(self) -> Dict[str, Dict[str, int]]:
+        """Counts keyed by code point label, e.g. {'removed': {'U+200B': 2}}"""
+        return {
+            name: {f'U+{ord(char):04X}': count for char, count in sorted(counts.items())}
+            for name, counts in (('removed', self.removed), ('replaced', self.replaced))
+        }
+
+
+def check_normalization(normalization: Optional[str]):
+    """Reject unknown normalization forms"""
+    if normalization is not None and normalization not in NORMALIZATION_FORMS:
+        raise ValueError(f"Unknown normalization '{normalization}', expected one of: {', '.join(NORMALIZATION_FORMS)}")
+
+
+def clean_text(text: str, normalization: Optional[str] = None) -> str:
+    """
+    Remove invisible and control characters and normalize whitespace
+
+    Newlines are kept, other whitespace becomes a space and runs of spaces
+    collapse to one.
+
+    Args:
+        text: Text to clean
+        normalization: Optional Unicode normalization form applied first,
+                       one of NORMALIZATION_FORMS
+
+    Returns:
+        The cleaned text
+    """
+    check_normalization(normalization)
+    if normalization is not None:
+        text = unicodedata.normalize(normalization, text)
+    if text.isascii():
+        # ASCII input takes str.translate's cached fast path
+        text = text.translate(_CLEAN_TABLE)
+    else:
+        has_astral = len(text.encode('utf-16-le', 'surrogatepass')) > 2 * len(text)
+        text = (_DELETE_RE if has_astral else _BMP_DELETE_RE).sub('', text)
+        text = _WHITESPACE_RE.sub(' ', text)
+    if '  ' in text:
+        text = _SPACE_RUN_RE.sub(' ', text)
+    return text
+
+
+def clean_with_report(text: str, normalization: Optional[str] = None) -> Tuple[str, SanitizeReport]:
+    """
+    Clean text like clean_text, recording what was removed in the same pass
+
+    Returns:
+        Tuple of the cleaned text and a SanitizeReport
+    """
+    check_normalization(normalization)
+    if normalization is not None:
+        text = unicodedata.normalize(normalization, text)
+    report = SanitizeReport()
+
+    def substitute(match: re.Match) -> str:
+        for char in match.group():
+            counts = report.removed if _CLEAN_TABLE[ord(char)] is None else report.replaced
+            counts[char] = counts.get(char, 0) + 1
+        return match.group().translate(_CLEAN_TABLE)
+
+    text = _CLEAN_RE.sub(substitute, text)
+    if '  ' in text:
+        text = _SPACE_RUN_RE.sub(' ', text)
+    return text, report
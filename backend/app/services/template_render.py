@@ -0,0 +1,250 @@
+import csv
+import json
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from app.services.admission import RequestLimitError
+
+if TYPE_CHECKING:
+    from app.services.formatter import LinkedInFormatter
+    from app.services.validator import ContentValidator
+
+# [PLACEHOLDER NAME]: anything but brackets and newlines between brackets
+PLACEHOLDER_RE = re.compile(r'\[([^\[\]\n]+)\]')
+
+# A parsed input row: (variables, None) or (None, error message)
+Row = Tuple[Optional[Dict[str, str]], Optional[str]]
+
+
+class CompiledTemplate:
+    """Template content split once into literal text and placeholder slots
+
+    Rendering copies the prepared piece list, drops each variable into its
+    slot offsets and joins, so no per-render scanning or replacing is done.
+    A placeholder without a value is kept as written, brackets included.
+    """
+
+    __slots__ = ('pieces', 'slots', 'placeholders')
+
+    def __init__(self, content: str):
+        self.pieces: List[str] = []
+        slots: Dict[str, List[int]] = {}
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(content):
+            if match.start() > position:
+                self.pieces.append(content[position:match.start()])
+            slots.setdefault(match.group(1), []).append(len(self.pieces))
+            self.pieces.append(match.group())
+            position = match.end()
+        if position < len(content):
+            self.pieces.append(content[position:])
+        # Placeholder name -> offsets in pieces, in order of first use
+        self.slots: Dict[str, Tuple[int, ...]] = {name: tuple(offsets) for name, offsets in slots.items()}
+        self.placeholders: Tuple[str, ...] = tuple(self.slots)
+
+    def render(self, variables: Dict[str, Any]) -> Tuple[str, List[str]]:
+        """
+        Fill in the placeholders
+
+        Args:
+            variables: Placeholder name (without brackets) -> value; None or
+                       absent leaves the placeholder in place
+
+        Returns:
+            (rendered text, names of placeholders that had no value)
+        """
+        pieces = self.pieces.copy()
+        missing = []
+        for name, offsets in self.slots.items():
+            value = variables.get(name)
+            if value is None:
+                missing.append(name)
+                continue
+            value = str(value)
+            for offset in offsets:
+                pieces[offset] = value
+        return ''.join(pieces), missing
+
+    def size(self, variables: Dict[str, Any]) -> int:
+        """Length of the text render(variables) gives, without building it"""
+        size = sum(map(len, self.pieces))
+        for name, offsets in self.slots.items():
+            value = variables.get(name)
+            if value is not None:
+                size += (len(str(value)) - len(self.pieces[offsets[0]])) * len(offsets)
+        return size
+
+
+class TemplateRenderer:
+    """Renders a compiled template per set of variables, then formats and validates the post"""
+
+    def __init__(self, formatter: 'LinkedInFormatter', validator: 'ContentValidator', template: CompiledTemplate,
+                 format_output: bool = True, preserve_formatting: bool = True, parser: str = 'regex'):
+        """
+        Args:
+            formatter: Formatter for the rendered post
+            validator: Validator for the final post
+            template: Compiled template to render
+            format_output: Run the LinkedIn formatter over the rendered text
+            preserve_formatting: Passed to the formatter
+            parser: Markup parser for the formatter ("regex" or "fast")
+        """
+        formatter._check_parser(parser)
+
+        self.formatter = formatter
+        self.validator = validator
+        self.template = template
+        self.format_output = format_output
+        self.preserve_formatting = preserve_formatting
+        self.parser = parser
+
+    def render(self, variables: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Produce one post
+
+        Args:
+            variables: Placeholder values
+
+        Returns:
+            Dictionary with content, character_count, missing_placeholders,
+            is_valid, warnings and suggestions
+        """
+        content, missing = self.template.render(variables)
+        if self.format_output:
+            content, stats = self.formatter.format_with_stats(content, self.preserve_formatting, self.parser)
+            validation = self.validator.validate_formatted(content, stats)
+        else:
+            validation = self.validator.validate_content(content)
+
+        return {
+            "content": content,
+            "character_count": len(content),
+            "missing_placeholders": missing,
+            "is_valid": validation.get("is_valid", True),
+            "warnings": validation.get("warnings", []),
+            "suggestions": validation.get("suggestions", [])
+        }
+
+
+class RowReader(ABC):
+    """Turns text fed in arbitrary chunks into variable rows, one line at a time
+
+    Only the unfinished line (and, for CSV, the unfinished record) is held,
+    and with max_row set neither may grow past it, so memory does not grow
+    with the input.
+    """
+
+    def __init__(self, max_row: Optional[int] = None):
+        """
+        Args:
+            max_row: Longest row accepted, in characters (None = any)
+        """
+        self.max_row = max_row
+        self._carry = ''
+
+    def feed(self, text: str) -> List[Row]:
+        """
+        Add a chunk of input and return the rows it completed
+
+        Raises:
+            RequestLimitError: If a row is longer than max_row
+        """
+        if '\n' not in text:
+            self._carry += text
+            self._check_row(len(self._carry))
+            return []
+        lines = (self._carry + text).split('\n')
+        self._carry = lines.pop()
+        rows = []
+        for line in lines:
+            self._check_row(len(line))
+            row = self._line(line)
+            if row is not None:
+                rows.append(row)
+        self._check_row(len(self._carry))
+        return rows
+
+    def close(self) -> List[Row]:
+        """Return the rows left once the input ends"""
+        line = self._carry
+        self._carry = ''
+        row = self._line(line)
+        return [row] if row is not None else []
+
+    def _check_row(self, size: int):
+        if self.max_row is not None and size > self.max_row:
+            raise RequestLimitError('row_too_large', f"Row is longer than {self.max_row} characters")
+
+    @abstractmethod
+    def _line(self, line: str) -> Optional[Row]:
+        """The row a complete line finishes, or None if it finishes none"""
+
+
+class JsonlRowReader(RowReader):
+    """One JSON object of placeholder values per line; blank lines are skipped"""
+
+    def _line(self, line: str) -> Optional[Row]:
+        if not line.strip():
+            return None
+        try:
+            variables = json.loads(line)
+        except ValueError as e:
+            return None, f"Invalid JSON: {e}"
+        if not isinstance(variables, dict):
+            return None, "Each line must be a JSON object"
+        return variables, None
+
+
+class CsvRowReader(RowReader):
+    """CSV with a header row naming the placeholders; blank lines are skipped
+
+    Quoted fields may span lines: a record ends at the first newline
+    outside quotes, i.e. once it holds an even number of quote characters.
+    """
+
+    def __init__(self, max_row: Optional[int] = None):
+        super().__init__(max_row)
+        self._header: Optional[List[str]] = None
+        self._record: List[str] = []
+        self._record_size = 0
+        self._quotes = 0
+
+    def close(self) -> List[Row]:
+        rows = super().close()
+        if self._record:
+            # Unterminated quoted field: let csv make what it can of it
+            rows.append(self._parse('\n'.join(self._record)))
+            self._record = []
+            self._record_size = 0
+        return [row for row in rows if row is not None]
+
+    def _line(self, line: str) -> Optional[Row]:
+        self._record.append(line)
+        self._record_size += len(line) + 1
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None
+        record = '\n'.join(self._record)
+        self._record = []
+        self._record_size = 0
+        self._quotes = 0
+        return self._parse(record)
+
+    def _check_row(self, size: int):
+        # A record spanning lines is a single row
+        super()._check_row(self._record_size + size)
+
+    def _parse(self, record: str) -> Optional[Row]:
+        if not record.strip():
+            return None
+        try:
+            fields = next(csv.reader([record]))
+        except csv.Error as e:
+            return None, f"Invalid CSV: {e}"
+        if self._header is None:
+            self._header = [name.strip() for name in fields]
+            return None
+        if len(fields) > len(self._header):
+            return None, f"Row has {len(fields)} fields but the header has {len(self._header)}"
+        return dict(zip(self._header, fields)), None
@@ -0,0 +1,280 @@
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_TOKEN_RE = re.compile(r'\w+')
+
+# Weight of one occurrence in each indexed field (BM25F-style: weighted term
+# frequencies and a weighted document length)
+FIELD_WEIGHTS = (
+    ("name", 3.0),
+    ("category", 2.0),
+    ("description", 1.5),
+    ("content", 1.0),
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+class TemplateIndex:
+    """
+    In-memory inverted index over template text with BM25 ranking
+
+    Every query word must match. The last word also matches as a prefix
+    unless the query ends in a non-word character, so results follow the
+    user while they type. Templates are added and removed one at a time;
+    nothing is ever rebuilt as a whole.
+
+    Each posting stores its BM25 term-frequency component, normalized with
+    the average template length at the time it was indexed, so postings
+    never need rescoring as the collection grows; idf is applied at query
+    time. Per term the postings are also kept sorted best first, built on
+    the first query that needs them and updated in place afterwards. A
+    query walks those lists from the top and stops as soon as no template
+    further down can reach the page (Fagin's threshold algorithm), so its
+    cost depends on the page size rather than on how many templates match.
+
+    Not thread-safe: callers serialize updates and searches.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, max_expansions: int = 16,
+                 exhaustive_limit: int = 1000):
+        """
+        Args:
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+            max_expansions: Most terms a prefix expands to (most frequent first)
+            exhaustive_limit: Multi-word queries whose rarest word has at most
+                              this many postings score them all directly
+        """
+        self.k1 = k1
+        self.b = b
+        self.max_expansions = max_expansions
+        self.exhaustive_limit = exhaustive_limit
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_length: Dict[str, float] = {}
+        self._doc_category: Dict[str, Any] = {}
+        self._total_length = 0.0
+        self._ranked: Dict[str, List[Tuple[float, str]]] = {}  # term -> [(-weight, id)]
+        self._vocabulary: List[str] = []  # Sorted, for prefix lookups
+        # Prefix -> expansions, picked by frequency when cached and dropped
+        # whenever a term enters or leaves the vocabulary
+        self._expansions: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, template_id: str) -> bool:
+        return template_id in self._doc_terms
+
+    def add(self, template: Dict[str, Any]):
+        """Index a template, replacing any earlier version with the same id"""
+        template_id = template.get("id")
+        if template_id in self._doc_terms:
+            self.remove(template_id)
+
+        frequencies: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in FIELD_WEIGHTS:
+            value = template.get(field)
+            if not value:
+                continue
+            tokens = tokenize(str(value))
+            length += weight * len(tokens)
+            for token, count in Counter(tokens).items():
+                frequencies[token] = frequencies.get(token, 0.0) + weight * count
+
+        self._total_length += length
+        avgdl = self._total_length / (len(self._doc_terms) + 1) or 1.0
+        norm = self.k1 * (1.0 - self.b + self.b * length / avgdl)
+        saturation = self.k1 + 1.0
+
+        terms = {term: frequency * saturation / (frequency + norm) for term, frequency in frequencies.items()}
+        all_postings = self._postings
+        all_ranked = self._ranked
+        for term, weight in terms.items():
+            postings = all_postings.get(term)
+            if postings is None:
+                postings = all_postings[term] = {}
+                insort(self._vocabulary, term)
+                self._expansions.clear()
+            postings[template_id] = weight
+            if all_ranked:
+                ranked = all_ranked.get(term)
+                if ranked is not None:
+                    insort(ranked, (-weight, template_id))
+        self._doc_terms[template_id] = terms
+        self._doc_length[template_id] = length
+        self._doc_category[template_id] = template.get("category")
+
+    def remove(self, template_id: str) -> bool:
+        """Drop a template from the index; returns False if it wasn't indexed"""
+        terms = self._doc_terms.pop(template_id, None)
+        if terms is None:
+            return False
+        for term, weight in terms.items():
+            postings = self._postings[term]
+            del postings[template_id]
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                del ranked[bisect_left(ranked, (-weight, template_id))]
+            if not postings:
+                del self._postings[term]
+                self._ranked.pop(term, None)
+                del self._vocabulary[bisect_left(self._vocabulary, term)]
+                self._expansions.clear()
+        self._total_length -= self._doc_length.pop(template_id)
+        del self._doc_category[template_id]
+        return True
+
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               category: Optional[str] = None) -> Tuple[List[Tuple[str, float]], bool]:
+        """
+        Rank the templates matching a query
+
+        Args:
+            query: Words to search for; the last one may be incomplete
+            limit: Page size
+            offset: Number of ranked results to skip
+            category: Only return templates of this category
+
+        Returns:
+            (page of (template id, score) pairs, whether more results follow)
+        """
+        clauses = self._parse(query)
+        if not clauses or limit <= 0:
+            return [], False
+        wanted = offset + limit
+        top = self._top(clauses, wanted + 1, category)
+        return [(template_id, score) for score, template_id in top[offset:wanted]], len(top) > wanted
+
+    def _parse(self, query: str) -> List[List[str]]:
+        """Turn a query into clauses: lists of indexed terms, one of which must match"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        clauses = [[token] for token in tokens]
+        if _TOKEN_RE.match(query[-1]):
+            clauses[-1] = self._expand(tokens[-1])
+        for clause in clauses:
+            clause[:] = [term for term in clause if term in self._postings]
+            if not clause:
+                return []
+        return clauses
+
+    def _expand(self, prefix: str) -> List[str]:
+        """Indexed terms starting with prefix, capped to the most frequent ones"""
+        terms = self._expansions.get(prefix)
+        if terms is None:
+            vocabulary = self._vocabulary
+            start = bisect_left(vocabulary, prefix)
+            end = bisect_left(vocabulary, prefix + '\U0010ffff', start)
+            terms = vocabulary[start:end]
+            if len(terms) > self.max_expansions:
+                # The word as typed always stays in, ahead of longer ones
+                exact = terms[0] == prefix
+                terms = heapq.nlargest(self.max_expansions - exact, terms[exact:], key=lambda term: len(self._postings[term]))
+                if exact:
+                    terms.insert(0, prefix)
+            if len(self._expansions) >= 4096:
+                self._expansions.clear()
+            self._expansions[prefix] = terms
+        return list(terms)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings[term])
+        return math.log(1.0 + (len(self._doc_terms) - df + 0.5) / (df + 0.5))
+
+    def _ranked_postings(self, term: str) -> List[Tuple[float, str]]:
+        """A term's postings as (-weight, id), best first"""
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            postings = self._postings[term]
+            ranked = self._ranked[term] = sorted(zip([-weight for weight in postings.values()], postings))
+        return ranked
+
+    def _stream(self, clause: List[str]) -> Iterator[Tuple[float, str]]:
+        """(-score, id) for every posting of a clause's terms, best first; ids may repeat"""
+        streams = [self._scaled(self._ranked_postings(term), self._idf(term)) for term in clause]
+        if len(streams) == 1:
+            return streams[0]
+        return heapq.merge(*streams)
+
+    @staticmethod
+    def _scaled(ranked: List[Tuple[float, str]], idf: float) -> Iterator[Tuple[float, str]]:
+        for weight, template_id in ranked:
+            yield weight * idf, template_id
+
+    def _top(self, clauses: List[List[str]], count: int, category: Optional[str]) -> List[Tuple[float, str]]:
+        """Best `count` (score, id) pairs matching every clause, best first"""
+        postings = self._postings
+        # Per clause, (postings, idf) of each term; a template's clause
+        # score is its best term's
+        weighted = [[(postings[term], self._idf(term)) for term in clause] for clause in clauses]
+        categories = self._doc_category
+
+        def score(template_id: str) -> float:
+            """Sum of the clause scores, or 0 if a clause doesn't match"""
+            total = 0.0
+            for terms in weighted:
+                best = 0.0
+                for term_postings, idf in terms:
+                    weight = term_postings.get(template_id)
+                    if weight is not None and weight * idf > best:
+                        best = weight * idf
+                if not best:
+                    return 0.0
+                total += best
+            return total
+
+        sizes = [sum(len(postings[term]) for term in clause) for clause in clauses]
+        if len(clauses) > 1 and min(sizes) <= self.exhaustive_limit:
+            # A rare word: scoring its few postings beats walking the others
+            driver = clauses[sizes.index(min(sizes))]
+            scored = []
+            for template_id in set().union(*(postings[term] for term in driver)):
+                if category is not None and categories[template_id] != category:
+                    continue
+                total = score(template_id)
+                if total:
+                    scored.append((total, template_id))
+            return heapq.nlargest(count, scored)
+
+        # Threshold algorithm: advance every clause's stream in turn. An
+        # unseen template scores at most the sum of the scores the streams
+        # are currently at, so once the page beats that, it is final.
+        streams = [self._stream(clause) for clause in clauses]
+        frontier = [0.0] * len(streams)  # Negated, like the streams
+        top: List[Tuple[float, str]] = []  # Min-heap of the best `count`
+        seen = set()
+        while True:
+            for i, stream in enumerate(streams):
+                item = next(stream, None)
+                if item is None:
+                    # Everything matching every clause also matches this one,
+                    # so all candidates have been seen
+                    top.sort(reverse=True)
+                    return top
+                frontier[i], template_id = item
+                if template_id in seen:
+                    continue
+                seen.add(template_id)
+                if category is not None and categories[template_id] != category:
+                    continue
+                total = score(template_id)
+                if not total:
+                    continue
+                if len(top) < count:
+                    heapq.heappush(top, (total, template_id))
+                elif total > top[0][0]:
+                    heapq.heapreplace(top, (total, template_id))
+            if len(top) == count and -sum(frontier) <= top[0][0]:
+                top.sort(reverse=True)
+                return top
@@ -0,0 +1,409 @@
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process file locks, one writer process only
+    fcntl = None
+
+# A write operation: ('put', template) inserts or replaces by id, keeping the
+# template's position; ('delete', template_id) removes it
+Operation = Tuple[str, Any]
+
+
+class _Batch:
+    """Operations committed together by one group commit"""
+
+    __slots__ = ('ops', 'done', 'error')
+
+    def __init__(self):
+        self.ops: List[Operation] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+def _apply(templates: Dict[str, Dict[str, Any]], ops: List[Operation]):
+    """Apply write operations to an id -> template dict in insertion order"""
+    for op, value in ops:
+        if op == 'put':
+            templates[value["id"]] = value
+        else:
+            templates.pop(value, None)
+
+
+class TemplateStore(ABC):
+    """
+    Durable template storage with group commit
+
+    Writers queue operations with append() (cheap, call it under the
+    caller's own lock to fix the order) and then wait in commit(). The first
+    waiter becomes the leader and writes everything queued so far in one
+    _write() call, so a burst of concurrent writes shares one flush/fsync.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._open = _Batch()
+        self._flushing = False
+
+    @abstractmethod
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        """Return every stored template in order, or None if nothing was ever stored"""
+
+    @abstractmethod
+    def has_changed(self) -> bool:
+        """Whether another process changed the storage since the last load or write"""
+
+    def append(self, ops: List[Operation]) -> _Batch:
+        """Queue operations for the next group commit and return their batch"""
+        with self._cond:
+            batch = self._open
+            batch.ops.extend(ops)
+            return batch
+
+    def commit(self, batch: _Batch):
+        """Wait until a batch is durable, writing it (and anything queued since) if no one else is"""
+        with self._cond:
+            while not batch.done:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                self._flushing = True
+                current, self._open = self._open, _Batch()
+                self._cond.release()
+                try:
+                    self._write(current.ops)
+                except Exception as e:
+                    current.error = e
+                finally:
+                    self._cond.acquire()
+                    current.done = True
+                    self._flushing = False
+                    self._cond.notify_all()
+        if batch.error is not None:
+            raise batch.error
+
+    def close(self):
+        """Release any open files or connections"""
+
+    @abstractmethod
+    def _write(self, ops: List[Operation]):
+        """Make operations durable; only ever called by one thread at a time"""
+
+
+class JsonTemplateStore(TemplateStore):
+    """The original format: the whole library as one JSON array, rewritten per commit"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._templates: Dict[str, Dict[str, Any]] = {}
+        self._signature: Optional[Tuple[int, int]] = None
+        self._foreign = False
+
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        self._signature = _file_signature(self.path)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                templates = json.load(f)
+        except FileNotFoundError:
+            self._templates = {}
+            return None
+        self._templates = {template.get("id"): template for template in templates}
+        self._foreign = False
+        return templates
+
+    def has_changed(self) -> bool:
+        return self._foreign or _file_signature(self.path) != self._signature
+
+    def _write(self, ops: List[Operation]):
+        with _FileLock(self.path):
+            if _file_signature(self.path) != self._signature:
+                # Rewrite on top of another process's changes, not over them
+                self.load()
+                self._foreign = True
+            _apply(self._templates, ops)
+            _atomic_write(self.path, json.dumps(list(self._templates.values()), indent=2, ensure_ascii=False).encode('utf-8'))
+            self._signature = _file_signature(self.path)
+
+
+class JournalTemplateStore(TemplateStore):
+    """
+    Append-only JSON Lines journal of put/delete records
+
+    A commit appends one line per operation and fsyncs once, so writes cost
+    O(batch) instead of O(library). When dead records outnumber live ones
+    the journal is compacted: live templates are written to a temporary
+    file, fsynced and renamed over the journal. A crash mid-append leaves at
+    most one torn last line, which load() discards.
+    """
+
+    def __init__(self, path: str, compact_ratio: float = 2.0, compact_min_records: int = 1000):
+        """
+        Args:
+            path: Journal file
+            compact_ratio: Compact once records exceed this many per live template
+            compact_min_records: Never compact journals with fewer records
+        """
+        super().__init__()
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        self._templates: Dict[str, Dict[str, Any]] = {}
+        self._records = 0
+        self._position: Optional[Tuple[int, int]] = None  # (inode, bytes read)
+        self._foreign = False
+
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        with _FileLock(self.path):
+            if not os.path.exists(self.path):
+                self._templates = {}
+                self._records = 0
+                self._position = None
+                return None
+            with open(self.path, 'rb+') as f:
+                self._templates = {}
+                self._records = 0
+                self._read_from(f, 0)
+        self._foreign = False
+        return list(self._templates.values())
+
+    def has_changed(self) -> bool:
+        if self._foreign:
+            return True
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._position is not None
+        return self._position != (stat.st_ino, stat.st_size)
+
+    def _write(self, ops: List[Operation]):
+        data = b''.join(_journal_record(op, value) for op, value in ops)
+        with _FileLock(self.path):
+            with open(self.path, 'ab+') as f:
+                stat = os.fstat(f.fileno())
+                if self._position is None or self._position[0] != stat.st_ino:
+                    if self._position is not None or stat.st_size:
+                        # Compacted or created by another process: start over
+                        self._templates = {}
+                        self._records = 0
+                        self._read_from(f, 0)
+                        self._foreign = True
+                elif stat.st_size != self._position[1]:
+                    # Catch up with records appended by another process
+                    self._read_from(f, self._position[1])
+                    self._foreign = True
+
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                _apply(self._templates, ops)
+                self._records += len(ops)
+                self._position = (stat.st_ino, f.tell())
+
+            if self._records > max(self.compact_min_records, self.compact_ratio * len(self._templates)):
+                self._compact()
+
+    def _read_from(self, f, offset: int):
+        """Replay records from a byte offset; caller holds the file lock"""
+        f.seek(offset)
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            # Torn record from a crash mid-append: drop it so the next
+            # append starts on a fresh line
+            f.truncate(offset + end)
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            if record["op"] == "put":
+                self._templates[record["template"]["id"]] = record["template"]
+            else:
+                self._templates.pop(record["id"], None)
+            self._records += 1
+        self._position = (os.fstat(f.fileno()).st_ino, offset + end)
+
+    def _compact(self):
+        """Rewrite the journal with one record per live template; caller holds the file lock"""
+        data = b''.join(_journal_record('put', template) for template in self._templates.values())
+        _atomic_write(self.path, data)
+        stat = os.stat(self.path)
+        self._records = len(self._templates)
+        self._position = (stat.st_ino, stat.st_size)
+
+
+class SqliteTemplateStore(TemplateStore):
+    """
+    SQLite database in WAL mode with indexed id and category columns
+
+    Each group commit is one transaction. Templates keep their insertion
+    position; another process's commits are detected via PRAGMA data_version.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._db_lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS templates ("
+            "id TEXT PRIMARY KEY, position INTEGER NOT NULL, category TEXT, data TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS templates_category ON templates (category)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS templates_position ON templates (position)")
+        self._data_version = None
+
+    def load(self) -> Optional[List[Dict[str, Any]]]:
+        with self._db_lock:
+            self._data_version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            # user_version marks a store that has been written to, even if
+            # every template was deleted since
+            if not self._db.execute("PRAGMA user_version").fetchone()[0]:
+                return None
+            rows = self._db.execute("SELECT data FROM templates ORDER BY position").fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def has_changed(self) -> bool:
+        # Never block a reader behind a commit; a change shows up next time
+        if not self._db_lock.acquire(blocking=False):
+            return False
+        try:
+            return self._db.execute("PRAGMA data_version").fetchone()[0] != self._data_version
+        finally:
+            self._db_lock.release()
+
+    def close(self):
+        with self._db_lock:
+            self._db.close()
+
+    def _write(self, ops: List[Operation]):
+        with self._db_lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                position = db.execute("SELECT COALESCE(MAX(position), 0) FROM templates").fetchone()[0]
+                for op, value in ops:
+                    if op == 'put':
+                        position += 1
+                        db.execute(
+                            "INSERT INTO templates (id, position, category, data) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (id) DO UPDATE SET category = excluded.category, data = excluded.data",
+                            (value["id"], position, value.get("category"), json.dumps(value, ensure_ascii=False))
+                        )
+                    else:
+                        db.execute("DELETE FROM templates WHERE id = ?", (value,))
+                db.execute("PRAGMA user_version = 1")
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+
+def open_template_store(path: str, legacy_json: Optional[str] = "templates.json") -> TemplateStore:
+    """
+    Open the template store for a path, choosing the backend by extension
+
+    '.jsonl' opens a JournalTemplateStore, '.db', '.sqlite' and '.sqlite3'
+    a SqliteTemplateStore, anything else the original JSON file. A new
+    journal or database is seeded from the legacy JSON file if it exists.
+
+    Args:
+        path: Store location
+        legacy_json: JSON templates file to migrate from (None to skip)
+
+    Returns:
+        The opened TemplateStore
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.jsonl':
+        store = JournalTemplateStore(path)
+    elif extension in ('.db', '.sqlite', '.sqlite3'):
+        store = SqliteTemplateStore(path)
+    else:
+        return JsonTemplateStore(path)
+
+    if legacy_json and os.path.exists(legacy_json) and store.load() is None:
+        migrate_json_templates(legacy_json, store)
+    return store
+
+
+def migrate_json_templates(json_path: str, store: TemplateStore) -> int:
+    """
+    Copy every template from a JSON templates file into a store
+
+    Args:
+        json_path: File in the original templates.json format
+        store: Destination store; existing templates with the same ids are replaced
+
+    Returns:
+        Number of templates copied
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        templates = json.load(f)
+    store.commit(store.append([('put', template) for template in templates]))
+    return len(templates)
+
+
+def _journal_record(op: str, value: Any) -> bytes:
+    if op == 'put':
+        record = {"op": "put", "template": value}
+    else:
+        record = {"op": "delete", "id": value}
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int]]:
+    """Modification time and size of a file, or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _atomic_write(path: str, data: bytes):
+    """Replace a file so readers see either the old or the new contents, even after a crash"""
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if hasattr(os, 'O_DIRECTORY'):
+        # Persist the rename itself
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+class _FileLock:
+    """Exclusive cross-process lock on a sidecar '.lock' file (no-op without fcntl)"""
+
+    def __init__(self, path: str):
+        self.path = f"{path}.lock"
+        self._fd: Optional[int] = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -1,26 +1,136 @@
-import json
+import threading
 import uuid
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
+
+from app.services.response import Payload
+from app.services.template_render import CompiledTemplate
+from app.services.template_search import TemplateIndex
+from app.services.template_store import Operation, TemplateStore, open_template_store
+
+
+# Fields of a template in listings, in the order they are sent
+LISTED_FIELDS = ("id", "name", "content", "category", "description")
+
+
+class _TemplateViews:
+    """Read-only lists of all templates and of each category, built on demand"""
+
+    __slots__ = ('templates', 'by_category', 'payloads')
+
+    def __init__(self, templates: List[Dict[str, Any]]):
+        self.templates = templates
+        self.by_category: Dict[str, List[Dict[str, Any]]] = {}
+        for template in templates:
+            self.by_category.setdefault(template.get("category"), []).append(template)
+        # Serialized listings by category (None = all), made on first request
+        self.payloads: Dict[Optional[str], Payload] = {}
+
 
 class TemplateService:
-    """Manages LinkedIn post templates"""
+    """Manages LinkedIn post templates
+
+    Templates are loaded once from a TemplateStore and kept in memory as an
+    id -> template dict. Reads never lock: lookups by id hit the dict, and
+    the full and per-category lists are rebuilt only on the first read
+    after a write. Writes update the dict under a lock, queue the change
+    with the store and wait for its group commit outside the lock. The
+    store is only re-read when another process changed it.
+
+    Every template is compiled for rendering as it is loaded or written.
+    The search index is built on the first search and from then on
+    updated by every write, under the same lock.
+    """
     
-    def __init__(self):
-        self.templates_file = "templates.json"
-        self.templates = self._load_templates()
+    def __init__(self, templates_file: str = "templates.json", store: Optional[TemplateStore] = None):
+        """
+        Args:
+            templates_file: Store location, see open_template_store
+            store: Already opened store (overrides templates_file)
+        """
+        self.store = store if store is not None else open_template_store(templates_file)
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        self._views: Optional[_TemplateViews] = None
+        self._seeded = False
+        self._pending = 0  # Writes queued with the store but not yet committed
+        self._index: Optional[TemplateIndex] = None
+        self._reload()
     
-    def _load_templates(self) -> List[Dict[str, Any]]:
-        """Load templates from file or return default templates"""
-        try:
-            with open(self.templates_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except FileNotFoundError:
-            return self._get_default_templates()
+    @property
+    def templates(self) -> List[Dict[str, Any]]:
+        """All templates in their stored order (shared; do not mutate)"""
+        return self._current_views().templates
+    
+    def _reload(self):
+        """Replace the in-memory templates with the store's (or the defaults); caller holds the lock or is __init__"""
+        templates = self.store.load()
+        self._seeded = templates is not None
+        if templates is None:
+            templates = self._get_default_templates()
+        by_id: Dict[str, Dict[str, Any]] = {}
+        for template in templates:
+            # First template wins on duplicate ids, as the old linear scan did
+            by_id.setdefault(template.get("id"), template)
+        self._by_id = by_id
+        self._compiled = {template_id: CompiledTemplate(template.get("content", "")) for template_id, template in by_id.items()}
+        self._views = None
+        self._index = None
     
-    def _save_templates(self):
-        """Save templates to file"""
-        with open(self.templates_file, 'w', encoding='utf-8') as f:
-            json.dump(self.templates, f, indent=2, ensure_ascii=False)
+    def _refresh(self):
+        """Pick up changes another process made to the store"""
+        # While our own writes are in flight the store legitimately looks
+        # changed, and reloading would drop the queued ones from memory
+        if not self._pending and self.store.has_changed():
+            with self._lock:
+                if not self._pending and self.store.has_changed():
+                    self._reload()
+    
+    def _current_views(self) -> _TemplateViews:
+        self._refresh()
+        views = self._views
+        if views is None:
+            with self._lock:
+                if self._views is None:
+                    self._views = _TemplateViews(list(self._by_id.values()))
+                views = self._views
+        return views
+    
+    def _write(self, ops: List[Operation]) -> Any:
+        """Queue operations for the store and publish them to readers; caller holds the lock"""
+        if self._index is not None:
+            for op, value in ops:
+                if op == 'put':
+                    self._index.add(value)
+                else:
+                    self._index.remove(value)
+        if not self._seeded:
+            # The defaults only lived in memory so far: store them first
+            ops = [('put', template) for template in self._by_id.values()] + ops
+            self._seeded = True
+        for op, value in ops:
+            if op == 'put':
+                self._by_id[value["id"]] = value
+                self._compiled[value["id"]] = CompiledTemplate(value.get("content", ""))
+            else:
+                self._by_id.pop(value, None)
+                self._compiled.pop(value, None)
+        self._views = None
+        self._pending += 1
+        return self.store.append(ops)
+    
+    def _commit(self, batch: Any):
+        """Wait for a queued write to become durable"""
+        try:
+            self.store.commit(batch)
+        except Exception:
+            # Memory may now be ahead of the store; resync before failing
+            with self._lock:
+                self._pending -= 1
+                self._reload()
+            raise
+        with self._lock:
+            self._pending -= 1
     
     def _get_default_templates(self) -> List[Dict[str, Any]]:
         """Get default LinkedIn post templates"""
@@ -70,17 +180,67 @@ class TemplateService:
         ]
     
     def get_templates(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
-        """Get all templates, optionally filtered by category"""
+        """Get all templates, optionally filtered by category (shared lists; do not mutate)"""
+        views = self._current_views()
         if category:
-            return [t for t in self.templates if t.get("category") == category]
-        return self.templates
+            return views.by_category.get(category, [])
+        return views.templates
+
+    def get_templates_payload(self, category: Optional[str] = None) -> Payload:
+        """
+        The template listing as a JSON response body, serialized once until templates change
+
+        Args:
+            category: Only list this category's templates
+
+        Returns:
+            Payload of a list of templates, each with LISTED_FIELDS
+        """
+        views = self._current_views()
+        category = category or None
+        payload = views.payloads.get(category)
+        if payload is None:
+            if category is not None and category not in views.by_category:
+                # Not cached: any string can be asked for
+                return Payload([])
+            templates = views.by_category[category] if category else views.templates
+            payload = views.payloads[category] = Payload([
+                {field: template.get(field) for field in LISTED_FIELDS} for template in templates
+            ])
+        return payload
+    
+    def search_templates(self, query: str, limit: int = 20, offset: int = 0,
+                         category: Optional[str] = None) -> Tuple[List[Tuple[Dict[str, Any], float]], bool]:
+        """
+        Full-text search over template name, category, description and content
+
+        Args:
+            query: Search words; the last one also matches as a prefix
+            limit: Page size
+            offset: Number of ranked results to skip
+            category: Only return templates of this category
+
+        Returns:
+            (page of (template, score) pairs, best first; whether more results follow)
+        """
+        self._refresh()
+        with self._lock:
+            if self._index is None:
+                self._index = TemplateIndex()
+                for template in self._by_id.values():
+                    self._index.add(template)
+            hits, has_more = self._index.search(query, limit, offset, category)
+            return [(self._by_id[template_id], score) for template_id, score in hits], has_more
     
     def get_template(self, template_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific template by ID"""
-        for template in self.templates:
-            if template.get("id") == template_id:
-                return template
-        return None
+        self._refresh()
+        return self._by_id.get(template_id)
+    
+    def get_compiled_template(self, template_id: str) -> Optional[CompiledTemplate]:
+        """Get a template's compiled form for rendering"""
+        self._refresh()
+        return self._compiled.get(template_id)
     
     def create_template(self, name: str, content: str, category: str, description: Optional[str] = None) -> Dict[str, Any]:
         """Create a new custom template"""
@@ -92,25 +252,35 @@ class TemplateService:
             "description": description or ""
         }
         
-        self.templates.append(template)
-        self._save_templates()
+        self._refresh()
+        with self._lock:
+            batch = self._write([('put', template)])
+        self._commit(batch)
         
         return template
     
     def update_template(self, template_id: str, **kwargs) -> Optional[Dict[str, Any]]:
         """Update an existing template"""
-        for i, template in enumerate(self.templates):
-            if template.get("id") == template_id:
-                self.templates[i].update(kwargs)
-                self._save_templates()
-                return self.templates[i]
-        return None
+        self._refresh()
+        with self._lock:
+            template = self._by_id.get(template_id)
+            if template is None:
+                return None
+            # Replace rather than mutate: readers may hold the old dict
+            template = {**template, **kwargs}
+            ops = [('put', template)]
+            if template.get("id") != template_id:
+                ops.insert(0, ('delete', template_id))
+            batch = self._write(ops)
+        self._commit(batch)
+        return template
     
     def delete_template(self, template_id: str) -> bool:
         """Delete a template"""
-        for i, template in enumerate(self.templates):
-            if template.get("id") == template_id:
-                del self.templates[i]
-                self._save_templates()
-                return True
-        return False
+        self._refresh()
+        with self._lock:
+            if template_id not in self._by_id:
+                return False
+            batch = self._write([('delete', template_id)])
+        self._commit(batch)
+        return True
@@ -0,0 +1,96 @@
+"""
+Unicode character tables, precomputed into unicode_tables.json
+
+Finding every character of a general category, or every cased character,
+means testing some 140,000 code points, which takes tens of milliseconds
+on each start; the serverless function pays it on every cold start. The tables are
+built once into a small JSON file of code point ranges instead, and are
+only rebuilt in memory if the Python running the app has a different
+Unicode version than the one they were built with.
+
+Regenerate the file after changing the tables (from the backend directory):
+    python -m app.services.unicode_tables
+"""
+import json
+import os
+import unicodedata
+from itertools import chain
+from typing import Callable, Dict, FrozenSet, List, Optional
+
+TABLES_PATH = os.path.join(os.path.dirname(__file__), 'unicode_tables.json')
+
+
+
+def _in_categories(*categories: str) -> Callable[[str], bool]:
+    return lambda char: unicodedata.category(char) in categories
+
+
+# Table name -> whether a character belongs in it
+TABLES = {
+    'format': _in_categories('Cf'),  # Invisible format characters: zero-width spaces, joiners, bidi controls, tags
+    'marks': _in_categories('Mn', 'Me', 'Mc'),  # Combining, enclosing and spacing marks
+    # Characters with another case; every character re.IGNORECASE matches
+    # to a different one is among them
+    'cased': lambda char: char.lower() != char or char.upper() != char,
+}
+
+# The code points scanned: the BMP, the first supplementary planes and the
+# tags plane
+_SCANNED_RANGES = (range(0x20000), range(0xe0000, 0xe1000))
+
+_tables: Optional[Dict[str, List[List[int]]]] = None
+
+
+def build_tables() -> Dict[str, List[List[int]]]:
+    """Test every scanned character for every table, as [first, last] code point ranges"""
+    ranges: Dict[str, List[List[int]]] = {name: [] for name in TABLES}
+    for code in chain(*_SCANNED_RANGES):
+        char = chr(code)
+        for name, belongs in TABLES.items():
+            if belongs(char):
+                table = ranges[name]
+                if table and table[-1][1] == code - 1:
+                    table[-1][1] = code
+                else:
+                    table.append([code, code])
+    return ranges
+
+
+def _load() -> Dict[str, List[List[int]]]:
+    global _tables
+    if _tables is None:
+        try:
+            with open(TABLES_PATH, encoding='utf-8') as f:
+                stored = json.load(f)
+            if stored['unidata_version'] == unicodedata.unidata_version and set(stored['tables']) == set(TABLES):
+                _tables = stored['tables']
+        except (OSError, ValueError, KeyError):
+            pass
+        if _tables is None:
+            _tables = build_tables()
+    return _tables
+
+
+def table_chars(name: str) -> FrozenSet[str]:
+    """
+    Every character in a table
+
+    Args:
+        name: Table name, a key of TABLES
+
+    Returns:
+        Frozen set of the table's characters
+    """
+    return frozenset(chr(code) for first, last in _load()[name] for code in range(first, last + 1))
+
+
+def write_tables(path: str = TABLES_PATH):
+    """Build the tables and save them with the Unicode version they came from"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'unidata_version': unicodedata.unidata_version, 'tables': build_tables()}, f, separators=(',', ':'))
+        f.write('\n')
+
+
+if __name__ == "__main__":
+    write_tables()
+    print(f"Wrote {TABLES_PATH} (Unicode {unicodedata.unidata_version})")
@@ -1,136 +1,518 @@
 import re
-from typing import Dict, List, Any
+from typing import TYPE_CHECKING, Dict, List, Any, Iterable, Optional, Tuple
+
+from app.services.length import utf16_length
+from app.services.sanitize import CONTROL_CHARS, INVISIBLE_CHARS, char_class
+from app.services.unicode_tables import table_chars
+
+if TYPE_CHECKING:
+    from app.services.formatter import FormatStats
+
+# Phrases that count as a call-to-action, matched case-insensitively anywhere
+CTA_PHRASES = (
+    "what do you think",
+    "let me know",
+    "share your thoughts",
+    "comment below",
+    "what's your experience",
+)
+
+_EMOJI_CLASS = r'\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF'
+# The characters the formatter's cleanup removes (see sanitize)
+_INVISIBLE_CLASS = char_class(INVISIBLE_CHARS)
+_CONTROL_CLASS = char_class(CONTROL_CHARS)
+_CASED_CHARS = table_chars('cased')
+
+
+def _plane_spans(chars: Iterable[str]) -> str:
+    """Class body covering the given astral characters with one range per plane"""
+    planes: Dict[int, List[int]] = {}
+    for char in chars:
+        planes.setdefault(ord(char) >> 16, []).append(ord(char))
+    return ''.join(f'\\U{min(codes):08x}-\\U{max(codes):08x}' for codes in planes.values())
+
+
+# The leading set only has to let invisible characters through; the engine
+# tests astral ranges one at a time, so the astral ones are covered by a
+# span per plane there and matched exactly by the lookbehind
+_INVISIBLE_LEAD_CLASS = (
+    char_class(char for char in INVISIBLE_CHARS if char <= '\uffff')
+    + _plane_spans(char for char in INVISIBLE_CHARS if char > '\uffff')
+)
+
+# Every signal the validator needs, as branches of one pattern. Each match
+# consumes a single signal character (plus the rest of a newline or spacing
+# run), so one finditer pass sees all of them. The pattern starts with a
+# bare character set, which lets the regex engine skip plain text quickly;
+# lookbehinds on that character then pick the branch, and an empty named
+# group at the end of each branch tells the scanner which signal it was.
+# {cta_chars} and {cta} are filled in from the CTA phrase trie.
+_SCAN_TEMPLATE = (
+    r'[\n \t#<>?!' + _EMOJI_CLASS + _INVISIBLE_LEAD_CLASS + _CONTROL_CLASS + r'{cta_chars}]'
+    r'(?:(?<=\n)\n*(?P<newlines>)'
+    r'|(?<=[ \t])[ \t]{{2,}}(?P<spacing>)'
+    r'|(?<=#)(?=\w)(?P<hashtag>)'
+    r'|(?<=<)(?P<lt>)'
+    r'|(?<=>)(?P<gt>)'
+    r'|(?<=[?!])(?P<punctuation>)'
+    r'|(?<=[' + _EMOJI_CLASS + r'])(?P<emoji>)'
+    r'|(?<=[' + _INVISIBLE_CLASS + r'])(?P<invisible>)'
+    r'|(?<=[' + _CONTROL_CLASS + r'])(?P<control>)'
+    r'|{cta}(?P<cta>))'
+)
+
+# The same scan for formatter output, minus what FormatStats already
+# records or the formatter's cleanup rules out: newlines, tabs, spacing
+# runs, invisible and control characters. Dropping spaces from the leading
+# set means most of the text is skipped without trying a branch at all.
+_FORMATTED_SCAN_TEMPLATE = (
+    r'[#<>?!' + _EMOJI_CLASS + r'{cta_chars}]'
+    r'(?:(?<=#)(?=\w)(?P<hashtag>)'
+    r'|(?<=<)(?P<lt>)'
+    r'|(?<=>)(?P<gt>)'
+    r'|(?<=[?!])(?P<punctuation>)'
+    r'|(?<=[' + _EMOJI_CLASS + r'])(?P<emoji>)'
+    r'|{cta}(?P<cta>))'
+)
+
+
+def _trie_pattern(node: Dict[str, Any]) -> str:
+    """Render a phrase trie as a regex, sharing common prefixes"""
+    if '' in node:
+        # A phrase ends here; any longer phrase would match this one first
+        return ''
+    branches = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items())]
+    if len(branches) == 1:
+        return branches[0]
+    return '(?:' + '|'.join(branches) + ')'
+
+
+def _case_variants(chars: str) -> str:
+    """Every character re.IGNORECASE considers equal to one of `chars`"""
+    # Any other character it matches has a case of its own
+    universe = ''.join(_CASED_CHARS.union(chars))
+    return ''.join(sorted(set(re.findall('(?i)[' + re.escape(chars) + ']', universe))))
+
+
+def compile_scanners(cta_phrases: Iterable[str]) -> Tuple['re.Pattern[str]', 're.Pattern[str]']:
+    """
+    Compile the single-pass content scanners for a set of CTA phrases
+
+    The phrases are merged into a trie, which compiles to nested
+    alternatives: at any position the regex engine follows one path of
+    shared prefixes instead of trying every phrase in turn, so hundreds of
+    phrases cost little more than five.
+
+    Args:
+        cta_phrases: Call-to-action phrases, matched case-insensitively;
+                     each must start with a letter or digit
+
+    Returns:
+        Tuple of the scanner for any content and the reduced scanner for
+        formatter output, each with an empty named group per signal
+
+    Raises:
+        ValueError: If a phrase starts with a non-word character
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in cta_phrases:
+        if not phrase:
+            continue
+        if not re.match(r'\w', phrase):
+            raise ValueError(f"CTA phrase must start with a letter or digit: {phrase!r}")
+        node = trie
+        for char in phrase.lower():
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    # The matched first character is checked by a lookbehind, the rest of
+    # the phrase by a lookahead, so phrase text is still scanned for signals
+    branches = [
+        f'(?<=(?i:{re.escape(char)}))(?=(?i:{_trie_pattern(child)}))'
+        for char, child in sorted(trie.items())
+    ]
+    cta_chars = re.escape(_case_variants(''.join(trie))) if trie else ''
+    cta = '(?:' + '|'.join(branches) + ')' if branches else '(?!)'
+    return (
+        re.compile(_SCAN_TEMPLATE.format(cta_chars=cta_chars, cta=cta)),
+        re.compile(_FORMATTED_SCAN_TEMPLATE.format(cta_chars=cta_chars, cta=cta))
+    )
+
+
+_SCANNERS = compile_scanners(CTA_PHRASES)
+
+
+class ContentSignals:
+    """Everything the validator checks, collected in one scan of the content"""
+
+    __slots__ = (
+        'character_count', 'utf16_units', 'invisible', 'control', 'html_chars', 'html_tags',
+        'excessive_breaks', 'inconsistent_spacing', 'long_lines', 'punctuation',
+        'hashtags', 'cta', 'emojis', 'paragraphs', 'has_gt', 'unclosed_lt'
+    )
+
+    def __init__(self):
+        self.character_count = 0
+        self.utf16_units = 0  # The length LinkedIn's limit applies to
+        self.invisible = False
+        self.control = False
+        self.html_chars = False
+        self.html_tags = False
+        self.excessive_breaks = False
+        self.inconsistent_spacing = False
+        self.long_lines = False
+        self.punctuation = False
+        self.hashtags = 0
+        self.cta = False
+        self.emojis = False
+        self.paragraphs = 0  # Only 0, 1 or 2 (= more than one) are distinguished
+        # Tag state at the ends, for joining scans (see JoinedSignals)
+        self.has_gt = False
+        self.unclosed_lt = False  # A '<' with no '>' after it
+
+
+class JoinedSignals:
+    """
+    Signals of paragraphs joined by blank lines, kept up to date as they change
+
+    Each paragraph is scanned on its own; it must be non-empty and have no
+    leading or trailing whitespace, as formatter output paragraphs do. The
+    blank lines between them can't extend or start a match, so signals
+    combine by count: adding or removing a paragraph is O(1). The one
+    exception, a '<' in one paragraph closed by a '>' in a later one, is
+    only looked for when both occur.
+    """
+
+    _FLAGS = (
+        'invisible', 'control', 'html_chars', 'html_tags', 'excessive_breaks',
+        'inconsistent_spacing', 'long_lines', 'punctuation', 'cta', 'emojis',
+        'has_gt', 'unclosed_lt'
+    )
+
+    def __init__(self):
+        self.count = 0
+        self._characters = 0
+        self._utf16_units = 0
+        self._hashtags = 0
+        self._multi_paragraph = 0  # Paragraphs whose own scan found a paragraph break
+        self._flags = dict.fromkeys(self._FLAGS, 0)
+
+    def add(self, signals: ContentSignals):
+        """Count a paragraph's scan in"""
+        self._update(signals, 1)
+
+    def remove(self, signals: ContentSignals):
+        """Count a previously added paragraph's scan out"""
+        self._update(signals, -1)
+
+    def _update(self, signals: ContentSignals, sign: int):
+        self.count += sign
+        self._characters += sign * signals.character_count
+        self._utf16_units += sign * signals.utf16_units
+        self._hashtags += sign * signals.hashtags
+        if signals.paragraphs == 2:
+            self._multi_paragraph += sign
+        flags = self._flags
+        for name in self._FLAGS:
+            if getattr(signals, name):
+                flags[name] += sign
+
+    def signals(self, paragraphs: Iterable[ContentSignals]) -> ContentSignals:
+        """
+        Combine into the signals of the joined text
+
+        Args:
+            paragraphs: The added scans in document order, only iterated
+                        when a tag may span paragraphs
+
+        Returns:
+            ContentSignals equal to scanning the joined text
+        """
+        flags = self._flags
+        signals = ContentSignals()
+        for name in self._FLAGS:
+            setattr(signals, name, flags[name] > 0)
+        signals.character_count = self._characters + 2 * max(self.count - 1, 0)
+        signals.utf16_units = self._utf16_units + 2 * max(self.count - 1, 0)
+        signals.hashtags = self._hashtags
+        if self.count > 1:
+            signals.control = True  # The blank lines themselves
+            signals.paragraphs = 2
+        elif self.count == 1:
+            signals.paragraphs = 2 if self._multi_paragraph else 1
+
+        if flags['unclosed_lt'] and flags['has_gt'] and not signals.html_tags:
+            opened = False
+            for paragraph in paragraphs:
+                if opened and paragraph.has_gt:
+                    signals.html_tags = True
+                    break
+                opened = opened or paragraph.unclosed_lt
+        return signals
+
 
 class ContentValidator:
     """Validates content for LinkedIn compatibility and provides suggestions"""
-    
-    def __init__(self):
+
+    def __init__(self, cta_phrases: Optional[Iterable[str]] = None):
         self.max_characters = 3000
         self.warning_threshold = 2500
-        
+        self.max_line_length = 200
+        self._scanner, self._formatted_scanner = _SCANNERS if cta_phrases is None else compile_scanners(cta_phrases)
+
     def validate_content(self, content: str) -> Dict[str, Any]:
         """
         Validate content for LinkedIn compatibility
-        
+
         Args:
             content: Content to validate
-            
+
+        Returns:
+            Dictionary with validation results
+        """
+        return self._report(self.scan(content))
+
+    def validate_formatted(self, content: str, stats: 'FormatStats') -> Dict[str, Any]:
+        """
+        Validate formatter output using the stats recorded while formatting it
+
+        Gives the same result as validate_content(content), but line
+        structure and the character count come from the stats instead of
+        another pass over the text.
+
+        Args:
+            content: Output of LinkedInFormatter.format_with_stats
+            stats: FormatStats returned with that output
+
+        Returns:
+            Dictionary with validation results
+        """
+        return self._report(self.scan_formatted(content, stats))
+
+    def validate_joined(self, joined: JoinedSignals, paragraphs: Iterable[ContentSignals]) -> Dict[str, Any]:
+        """
+        Validate paragraphs joined by blank lines from their separate scans
+
+        Gives the same result as validate_content on the joined text.
+
+        Args:
+            joined: Totals of the paragraphs' scans
+            paragraphs: The same scans in document order
+
         Returns:
             Dictionary with validation results
         """
+        return self._report(joined.signals(paragraphs))
+
+    def _report(self, signals: ContentSignals) -> Dict[str, Any]:
+        """Turn scanned signals into the validation result"""
         warnings = []
-        suggestions = []
-        
-        # Check character count
-        char_count = len(content)
-        if char_count > self.max_characters:
-            warnings.append(f"Content exceeds LinkedIn's character limit ({char_count}/{self.max_characters})")
-        elif char_count > self.warning_threshold:
-            warnings.append(f"Content is approaching character limit ({char_count}/{self.max_characters})")
-        
+
+        # Check character count, as LinkedIn counts it: styled letters and
+        # most emojis take two UTF-16 units
+        char_count = signals.character_count
+        length = signals.utf16_units
+        if length > self.max_characters:
+            warnings.append(f"Content exceeds LinkedIn's character limit ({length}/{self.max_characters})")
+        elif length > self.warning_threshold:
+            warnings.append(f"Content is approaching character limit ({length}/{self.max_characters})")
+
         # Check for problematic characters
-        problematic_chars = self._find_problematic_characters(content)
+        problematic_chars = self._find_problematic_characters(signals)
         if problematic_chars:
             warnings.append(f"Found potentially problematic characters: {', '.join(problematic_chars)}")
-        
+
         # Check for formatting issues
-        formatting_issues = self._check_formatting_issues(content)
-        if formatting_issues:
-            warnings.extend(formatting_issues)
-        
+        warnings.extend(self._check_formatting_issues(signals))
+
         # Generate suggestions
-        suggestions = self._generate_suggestions(content)
-        
+        suggestions = self._generate_suggestions(signals)
+
         return {
             "is_valid": len(warnings) == 0,
             "warnings": warnings,
             "suggestions": suggestions,
             "character_count": char_count
         }
-    
-    def _find_problematic_characters(self, content: str) -> List[str]:
+
+    def scan(self, content: str) -> ContentSignals:
+        """
+        Collect every validation signal in one pass over the content
+
+        Args:
+            content: Content to scan
+
+        Returns:
+            ContentSignals for the content
+        """
+        signals = ContentSignals()
+        length = len(content)
+        signals.character_count = length
+        signals.utf16_units = utf16_length(content)
+
+        # Paragraphs are separated by a run of two or more newlines with
+        # non-whitespace on both sides, as content.split('\n\n') would find
+        first_text = length - len(content.lstrip())
+        end_text = len(content.rstrip())
+        if first_text < length:
+            signals.paragraphs = 1
+
+        line_start = self._collect(self._scanner, content, signals, first_text, end_text)
+        if length - line_start > self.max_line_length:
+            signals.long_lines = True
+
+        return signals
+
+    def scan_formatted(self, content: str, stats: 'FormatStats') -> ContentSignals:
+        """
+        Collect validation signals for formatter output
+
+        Args:
+            content: Output of LinkedInFormatter.format_with_stats
+            stats: FormatStats returned with that output
+
+        Returns:
+            ContentSignals for the content
+        """
+        if not stats.cleaned:
+            # Nothing is known about the text beyond its length
+            return self.scan(content)
+
+        signals = ContentSignals()
+        signals.character_count = stats.character_count
+        signals.utf16_units = utf16_length(content)
+        signals.control = stats.line_count > 1  # Newlines are control characters
+        signals.long_lines = stats.longest_line > self.max_line_length
+        signals.paragraphs = min(stats.paragraph_count, 2)
+        # Tabs are gone, but stripping tags can leave spaces side by side
+        signals.inconsistent_spacing = '   ' in content
+
+        self._collect(self._formatted_scanner, content, signals, 0, 0)
+        return signals
+
+    def _collect(self, scanner: 're.Pattern[str]', content: str, signals: ContentSignals, first_text: int, end_text: int) -> int:
+        """
+        Record every signal a scanner finds in the content
+
+        Args:
+            scanner: One of the patterns from compile_scanners
+            content: Content to scan
+            signals: Signals to update
+            first_text: Index of the first non-whitespace character
+            end_text: Index just past the last non-whitespace character
+
+        Returns:
+            Start index of the last line, for the caller's line length check
+        """
+        line_start = 0
+        tag_start = -1  # First '<' since the last '>'
+        max_line = self.max_line_length
+
+        for match in scanner.finditer(content):
+            kind = match.lastgroup
+            if kind == 'newlines':
+                start, end = match.span()
+                signals.control = True
+                if start - line_start > max_line:
+                    signals.long_lines = True
+                line_start = end
+                if end - start >= 2:
+                    if end - start >= 4:
+                        signals.excessive_breaks = True
+                    if first_text < start and end < end_text:
+                        signals.paragraphs = 2
+            elif kind == 'spacing':
+                signals.inconsistent_spacing = True
+                if '\t' in match.group():
+                    signals.control = True
+            elif kind == 'cta':
+                signals.cta = True
+            elif kind == 'hashtag':
+                signals.hashtags += 1
+            elif kind == 'lt':
+                signals.html_chars = True
+                if tag_start < 0:
+                    tag_start = match.start()
+            elif kind == 'gt':
+                signals.html_chars = True
+                signals.has_gt = True
+                if tag_start >= 0:
+                    if match.start() > tag_start + 1:
+                        signals.html_tags = True
+                    tag_start = -1
+            elif kind == 'punctuation':
+                signals.punctuation = True
+            elif kind == 'emoji':
+                signals.emojis = True
+            elif kind == 'invisible':
+                signals.invisible = True
+            else:
+                signals.control = True
+
+        signals.unclosed_lt = tag_start >= 0
+        return line_start
+
+    def _find_problematic_characters(self, signals: ContentSignals) -> List[str]:
         """Find characters that might cause issues on LinkedIn"""
         problematic = []
-        
-        # Check for invisible characters
-        invisible_chars = re.findall(r'[\u200b-\u200d\ufeff]', content)
-        if invisible_chars:
+
+        # Invisible characters
+        if signals.invisible:
             problematic.append("invisible characters")
-        
-        # Check for unusual Unicode characters that might not display well
-        unusual_chars = re.findall(r'[\u0000-\u001f\u007f-\u009f]', content)
-        if unusual_chars:
+
+        # Unusual Unicode characters that might not display well
+        if signals.control:
             problematic.append("control characters")
-        
-        # Check for characters that might break formatting
-        breaking_chars = re.findall(r'[<>]', content)
-        if breaking_chars:
+
+        # Characters that might break formatting
+        if signals.html_chars:
             problematic.append("HTML-like characters")
-        
+
         return problematic
-    
-    def _check_formatting_issues(self, content: str) -> List[str]:
+
+    def _check_formatting_issues(self, signals: ContentSignals) -> List[str]:
         """Check for common formatting issues"""
         issues = []
-        
-        # Check for HTML tags that won't work
-        html_tags = re.findall(r'<[^>]+>', content)
-        if html_tags:
+
+        if signals.html_tags:
             issues.append("HTML tags detected - these won't display on LinkedIn")
-        
-        # Check for excessive line breaks
-        excessive_breaks = re.search(r'\n{4,}', content)
-        if excessive_breaks:
+
+        if signals.excessive_breaks:
             issues.append("Excessive line breaks detected")
-        
-        # Check for inconsistent spacing
-        inconsistent_spacing = re.search(r'[ \t]{3,}', content)
-        if inconsistent_spacing:
+
+        if signals.inconsistent_spacing:
             issues.append("Inconsistent spacing detected")
-        
-        # Check for very long lines (might cause display issues)
-        lines = content.split('\n')
-        long_lines = [line for line in lines if len(line) > 200]
-        if long_lines:
+
+        # Very long lines might cause display issues
+        if signals.long_lines:
             issues.append("Very long lines detected - consider breaking into shorter paragraphs")
-        
+
         return issues
-    
-    def _generate_suggestions(self, content: str) -> List[str]:
+
+    def _generate_suggestions(self, signals: ContentSignals) -> List[str]:
         """Generate improvement suggestions for the content"""
         suggestions = []
-        
-        # Check for engagement opportunities
-        if not re.search(r'[?!]', content):
+
+        # Engagement opportunities
+        if not signals.punctuation:
             suggestions.append("Consider adding questions or exclamations to increase engagement")
-        
-        # Check for hashtags
-        hashtags = re.findall(r'#\w+', content)
-        if len(hashtags) < 3:
+
+        # Hashtags
+        if signals.hashtags < 3:
             suggestions.append("Consider adding 3-5 relevant hashtags for better reach")
-        elif len(hashtags) > 10:
+        elif signals.hashtags > 10:
             suggestions.append("Consider reducing hashtags - 3-5 is optimal")
-        
-        # Check for call-to-action
-        cta_patterns = [
-            r'what do you think',
-            r'let me know',
-            r'share your thoughts',
-            r'comment below',
-            r'what\'s your experience'
-        ]
-        has_cta = any(re.search(pattern, content, re.IGNORECASE) for pattern in cta_patterns)
-        if not has_cta:
+
+        # Call-to-action
+        if not signals.cta:
             suggestions.append("Consider adding a call-to-action to encourage engagement")
-        
-        # Check for emojis
-        emojis = re.findall(r'[\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF]', content)
-        if not emojis:
+
+        # Emojis
+        if not signals.emojis:
             suggestions.append("Consider adding emojis to make your post more engaging")
-        
-        # Check for paragraph structure
-        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-        if len(paragraphs) == 1 and len(content) > 500:
+
+        # Paragraph structure
+        if signals.paragraphs == 1 and signals.character_count > 500:
             suggestions.append("Consider breaking long content into multiple paragraphs for better readability")
-        
+
         return suggestions
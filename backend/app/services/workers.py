@@ -0,0 +1,121 @@
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+from app.services.formatter import LinkedInFormatter
+from app.services.validator import ContentValidator
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future, ProcessPoolExecutor
+
+T = TypeVar('T')
+
+# Warm engines owned by each worker process, built once by _init_worker
+_worker_formatter: Optional[LinkedInFormatter] = None
+_worker_validator: Optional[ContentValidator] = None
+
+
+def _init_worker():
+    """Build the worker's formatter and validator once, when the process starts"""
+    global _worker_formatter, _worker_validator
+    _worker_formatter = LinkedInFormatter()
+    _worker_validator = ContentValidator()
+
+
+def _with_engines(func: Callable[..., T], *args: Any) -> T:
+    """Pool entry point: func(formatter, validator, *args) with the worker's warm engines"""
+    return func(_worker_formatter, _worker_validator, *args)
+
+
+class WorkerPool:
+    """
+    Worker processes with warm engines, shared by batches and offloaded requests
+
+    The processes are started by the first task. A worker that dies (killed,
+    or out of memory) breaks its executor for good: every task on it fails
+    with BrokenProcessPool. The pool then drops that executor, and the next
+    task starts a fresh one, so one lost worker costs the tasks in flight
+    rather than every task until the server restarts.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Args:
+            max_workers: Worker processes (None = CPU count)
+
+        Raises:
+            ValueError: If max_workers isn't positive
+        """
+        if max_workers is not None and max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        self.max_workers = max_workers
+        self._executor: Optional['ProcessPoolExecutor'] = None
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable[..., T], *args: Any) -> 'Future[T]':
+        """
+        Start func(formatter, validator, *args) in a worker process
+
+        Args:
+            func: Module-level function, called with the worker's warm engines
+                  and args; it and args must pickle
+
+        Returns:
+            The task's future; its result raises BrokenProcessPool if the
+            worker died
+        """
+        # Imported here, as in _get_executor: the serverless function never
+        # starts a pool, and multiprocessing would slow its cold start
+        from concurrent.futures.process import BrokenProcessPool
+        executor = self._get_executor()
+        try:
+            future = executor.submit(_with_engines, func, *args)
+        except BrokenProcessPool:
+            # Broken by a task whose failure hasn't been seen yet
+            self._discard(executor)
+            executor = self._get_executor()
+            future = executor.submit(_with_engines, func, *args)
+        future.add_done_callback(lambda done: self._check(executor, done))
+        return future
+
+    def run(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        func(formatter, validator, *args) in a worker process, waiting for the result
+
+        A task whose worker died is run once more, in a fresh pool.
+
+        Raises:
+            BrokenProcessPool: If its worker died again
+        """
+        from concurrent.futures.process import BrokenProcessPool
+        try:
+            return self.submit(func, *args).result()
+        except BrokenProcessPool:
+            return self.submit(func, *args).result()
+
+    def shutdown(self):
+        """Stop the worker processes, if any were started"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+    def _check(self, executor: 'ProcessPoolExecutor', future: 'Future'):
+        from concurrent.futures.process import BrokenProcessPool
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard(executor)
+
+    def _discard(self, executor: 'ProcessPoolExecutor'):
+        """Forget a broken executor; its processes are already gone"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def _get_executor(self) -> 'ProcessPoolExecutor':
+        """Start the worker processes on first use"""
+        # Imported here: most processes never start a pool, and the
+        # serverless function never does
+        from concurrent.futures import ProcessPoolExecutor
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker)
+            return self._executor
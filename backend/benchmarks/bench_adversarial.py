@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Benchmark: formatting time on adversarial markup, and how it grows with size
+
+Each case repeats a pattern that is hard for backtracking matchers
+(unclosed tags and emphasis, runs of '<', snake_case identifiers, deep
+nesting, ...) to each size and times format_for_linkedin with both
+parsers. The growth exponent is fitted between the smallest and largest
+size: about 1 for linear time, 2 for quadratic. --check exits 1 when any
+case grows faster than --max-exponent, so it can guard the formatter
+against patterns that backtrack.
+
+Run from the backend directory:
+    python -m benchmarks.bench_adversarial
+    python -m benchmarks.bench_adversarial --check --sizes 20000 160000
+"""
+
+import argparse
+import math
+import sys
+import time
+
+from app.dependencies import get_formatter
+
+# Case name -> unit repeated up to the input size
+CASES = {
+    'unclosed_b': '<b>x ',
+    'unclosed_i_b': '<i>a<b>',
+    'lt_run': '<',
+    'lt_words': '<a ',
+    'lone_star': 'a * ',
+    'unclosed_star': '*a ',
+    'unclosed_bold': '**a ',
+    'unclosed_underscore': '_a ',
+    'snake_case': 'snake_case_name ',
+    'star_underscore': '*a_',
+    'star_run': '*',
+    'underscore_run': '_',
+    'nested_open': '***a ',
+    'blank_lines': 'a\n \n \n',
+    'mixed': '<b>*_a</i>__ ',
+}
+PARSERS = ('regex', 'fast')
+
+
+def make_input(unit: str, size: int) -> str:
+    return (unit * (size // len(unit) + 1))[:size]
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def growth_exponent(sizes, seconds) -> float:
+    """Exponent k of time ~ size**k, between the smallest and largest size"""
+    return math.log(seconds[-1] / seconds[0]) / math.log(sizes[-1] / sizes[0])
+
+
+def run(args) -> int:
+    formatter = get_formatter()
+    sizes = sorted(args.sizes)
+    print(f"format_for_linkedin on adversarial inputs (best of {args.repeat}, ms)")
+    header = ''.join(f"{size:>10,}" for size in sizes)
+    print(f"{'case':<22}{'parser':<7}{header}{'exponent':>10}")
+    print("=" * (39 + 10 * len(sizes)))
+
+    failures = []
+    for name, unit in CASES.items():
+        if args.filter and args.filter not in name:
+            continue
+        for parser in PARSERS:
+            seconds = [
+                _best_of(lambda: formatter.format_for_linkedin(make_input(unit, size), parser=parser), args.repeat)
+                for size in sizes
+            ]
+            exponent = growth_exponent(sizes, seconds)
+            flag = '  TOO STEEP' if exponent > args.max_exponent else ''
+            timings = ''.join(f"{value * 1e3:>10.2f}" for value in seconds)
+            print(f"{name:<22}{parser:<7}{timings}{exponent:>10.2f}{flag}")
+            if flag:
+                failures.append(f"{name}/{parser}")
+
+    if args.check and failures:
+        print(f"\n{len(failures)} case(s) grew faster than size**{args.max_exponent}: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[25_000, 50_000, 100_000, 200_000],
+                        help='input sizes in characters')
+    parser.add_argument('--repeat', type=int, default=3, help='timings per size; the best is kept')
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--max-exponent', type=float, default=1.5,
+                        help='steepest growth --check accepts (default: %(default)s)')
+    parser.add_argument('--check', action='store_true', help='exit 1 if any case grows too steeply')
+    sys.exit(run(parser.parse_args()))
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Benchmark: batch formatting throughput, inline vs process-pool fan-out
+
+Run from the backend directory:
+    python -m benchmarks.bench_batch
+"""
+
+from app.dependencies import get_formatter, get_validator
+from app.services.batch import BatchProcessor
+from app.services.workers import WorkerPool
+from benchmarks.bench_parser import make_post
+
+BATCH_SIZES = (10, 100, 1000, 5000)
+POST_SIZE = 2000
+
+
+def run():
+    formatter = get_formatter()
+    validator = get_validator()
+    documents = [
+        {"content": make_post(POST_SIZE, 0.1, seed=seed)}
+        for seed in range(max(BATCH_SIZES))
+    ]
+
+    pool = WorkerPool()
+    inline = BatchProcessor()
+    pooled = BatchProcessor(inline_threshold=0, pool=pool)
+    pooled.run(formatter, validator, documents[:pooled.chunk_size])  # start and warm the workers
+
+    print(f"Batch formatting of {POST_SIZE}-character posts (items/second)")
+    print("=" * 60)
+    print(f"{'batch size':>12}{'inline':>16}{'process pool':>16}")
+    try:
+        for size in BATCH_SIZES:
+            batch = documents[:size]
+            inline_rate = inline.run(formatter, validator, batch)["items_per_second"]
+            pooled_rate = pooled.run(formatter, validator, batch)["items_per_second"]
+            print(f"{size:>12}{inline_rate:>16.0f}{pooled_rate:>16.0f}")
+    finally:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cold start of the serverless handler and the FastAPI app
+
+Every run is a fresh interpreter, as a cold serverless instance is. Each
+one reports how long importing api/index.py takes, and how long its first
+/api/format request takes after that, when nothing is built or cached
+yet; importing app.main, the FastAPI app, is timed the same way for
+comparison, along with the whole process from exec to exit. Times are
+the min and median over the runs.
+
+--importtime lists the slowest modules a handler import loads, from
+python -X importtime, to show where a cold start goes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --runs 20 --importtime 15
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_INDEX_PATH = os.path.join(BACKEND_DIR, '..', 'api', 'index.py')
+
+# Run in the fresh interpreter; prints the in-process timings as JSON
+_HANDLER_SCRIPT = '''
+import io, json, sys, time
+start = time.perf_counter()
+import importlib.util
+spec = importlib.util.spec_from_file_location('api_index', sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+imported = time.perf_counter()
+
+class Handler(module.handler):
+    def log_message(self, format, *args):
+        pass
+
+body = json.dumps({'content': '**Launch day** for *Clipsy*\\n\\n- faster cold starts\\n- same output'}).encode()
+request = Handler.__new__(Handler)
+request.rfile, request.wfile = io.BytesIO(body), io.BytesIO()
+request.headers = {'Content-Length': str(len(body))}
+request.command, request.path, request.request_version = 'POST', '/api/format', 'HTTP/1.1'
+request.requestline, request.client_address = 'POST /api/format HTTP/1.1', ('127.0.0.1', 0)
+request.do_POST()
+assert request.wfile.getvalue().split(b' ', 2)[1] == b'200', request.wfile.getvalue()[:200]
+done = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_request': done - imported}))
+'''
+
+_APP_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import app.main
+print(json.dumps({'import': time.perf_counter() - start}))
+'''
+
+
+def _run(args: List[str]) -> Dict[str, float]:
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, *args], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    timings = json.loads(output.stdout.strip().splitlines()[-1]) if output.stdout.strip() else {}
+    timings['process'] = time.perf_counter() - started
+    return timings
+
+
+def measure(runs: int) -> Dict[str, List[float]]:
+    """Timings in ms of every run, per measurement"""
+    samples: Dict[str, List[float]] = {}
+    scripts = {
+        'interpreter': ['-c', 'pass'],
+        'handler': ['-c', _HANDLER_SCRIPT, API_INDEX_PATH],
+        'app': ['-c', _APP_SCRIPT],
+    }
+    for _ in range(runs):
+        # Interleaved, so drift in machine load hits every measurement alike
+        for name, args in scripts.items():
+            for key, seconds in _run(args).items():
+                samples.setdefault(f'{name}.{key}', []).append(seconds * 1e3)
+    return samples
+
+
+def slowest_imports(top: int) -> List[tuple]:
+    """The modules with the most cumulative import time in a handler import, as (ms, module)"""
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         f'import importlib.util; spec = importlib.util.spec_from_file_location("api_index", {API_INDEX_PATH!r}); '
+         'spec.loader.exec_module(importlib.util.module_from_spec(spec))'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in output.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() == 'site' and not name.startswith('  '):
+            # Everything so far was the interpreter starting up, not the handler
+            modules = []
+            continue
+        modules.append((int(cumulative) / 1e3, name.rstrip()))
+    modules.sort(reverse=True)
+    return modules[:top]
+
+
+def run(runs: int, importtime: int):
+    samples = measure(runs)
+    print(f"Cold start over {runs} fresh interpreters (ms)\n")
+    print(f"{'measurement':<28} {'min':>9} {'median':>9}")
+    print("=" * 48)
+    for name, values in samples.items():
+        print(f"{name:<28} {min(values):>9.1f} {statistics.median(values):>9.1f}")
+
+    if importtime:
+        print(f"\nSlowest modules imported by the handler (cumulative ms)\n")
+        for ms, name in slowest_imports(importtime):
+            print(f"{ms:>9.1f}  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters per measurement')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='also list the N slowest modules a handler import loads')
+    args = parser.parse_args()
+    run(args.runs, args.importtime)
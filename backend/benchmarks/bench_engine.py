@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-request LinkedInFormatter construction vs the shared engine
+
+Run from the backend directory:
+    python -m benchmarks.bench_engine
+"""
+
+import time
+import tracemalloc
+
+from app.dependencies import get_formatter
+from app.services.formatter import LinkedInFormatter, BOLD_CHARS, ITALIC_CHARS
+
+POST_SIZE = 3000
+ITERATIONS = 2000
+
+SAMPLE_POST = (
+    "**Exciting news!** I'm thrilled to announce our new *product* launch.\n\n"
+    "Here's what makes it <b>special</b> and <i>different</i> from __the rest__:\n"
+    "• _Innovative features_ that solve real problems 🚀\n\n"
+    "What do you think? Let me know below! #launch #product #startup\n\n"
+)
+
+
+def make_post(size: int = POST_SIZE) -> str:
+    """Build a markup-heavy post of exactly `size` characters"""
+    repeated = SAMPLE_POST * (size // len(SAMPLE_POST) + 1)
+    return repeated[:size]
+
+
+class _DictJoinFormatter(LinkedInFormatter):
+    """The pre-engine conversion path: rebuild the maps and join per character"""
+
+    def __init__(self):
+        super().__init__()
+        self.bold_chars = dict(BOLD_CHARS)
+        self.italic_chars = dict(ITALIC_CHARS)
+
+    def _to_bold(self, text: str) -> str:
+        return ''.join(self.bold_chars.get(char, char) for char in text)
+
+    def _to_italic(self, text: str) -> str:
+        return ''.join(self.italic_chars.get(char, char) for char in text)
+
+
+def _time_per_call(func, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def _allocated_per_call(func, iterations: int) -> float:
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    for _ in range(iterations):
+        func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (peak - before) / 1024
+
+
+def run():
+    post = make_post()
+    engine = get_formatter()
+    legacy = _DictJoinFormatter()
+
+    cases = {
+        "construct (legacy)": _DictJoinFormatter,
+        "construct (engine)": LinkedInFormatter,
+        "bold (dict join)": lambda: legacy._to_bold(post),
+        "bold (translate)": lambda: engine._to_bold(post),
+        "request (legacy)": lambda: _DictJoinFormatter().format_for_linkedin(post),
+        "request (engine)": lambda: engine.format_for_linkedin(post),
+    }
+
+    print(f"Formatting {POST_SIZE}-character posts, {ITERATIONS} iterations")
+    print("=" * 60)
+    print(f"{'case':<24}{'latency (us)':>16}{'peak alloc (KiB)':>20}")
+    for name, func in cases.items():
+        func()  # warm up
+        latency = _time_per_call(func, ITERATIONS)
+        allocated = _allocated_per_call(func, 200)
+        print(f"{name:<24}{latency:>16.1f}{allocated:>20.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-keystroke cost of reformatting the whole document vs a session
+
+Simulates typing one character at a time at random places in a document
+and compares formatting and validating the full text after every keystroke
+with applying the keystroke to a FormatSession, which reformats only the
+paragraph it lands in and returns a patch.
+
+Run from the backend directory:
+    python -m benchmarks.bench_format_session
+"""
+
+import random
+import time
+
+from app.dependencies import get_formatter, get_validator
+from app.services.format_session import FormatSessions
+from benchmarks.bench_parser import make_post
+
+SIZES = (3_000, 20_000, 100_000)
+KEYSTROKES = 200
+
+
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1e3
+
+
+def run():
+    formatter = get_formatter()
+    validator = get_validator()
+    sessions = FormatSessions(max_characters=2 * max(SIZES))
+
+    print(f"Per-keystroke format + validate ({KEYSTROKES} keystrokes, milliseconds)")
+    print("=" * 72)
+    print(f"{'size':>10}{'mode':>10}{'median':>12}{'p95':>12}{'speedup':>12}")
+    for size in SIZES:
+        content = make_post(size, 0.1, seed=size)
+        rng = random.Random(size)
+        positions = [rng.randrange(len(content)) for _ in range(KEYSTROKES)]
+
+        full = []
+        text = content
+        for position in positions:
+            text = text[:position] + 'x' + text[position:]
+            start = time.perf_counter()
+            validator.validate_content(formatter.format_for_linkedin(text))
+            full.append(time.perf_counter() - start)
+
+        session = sessions.create(formatter, validator, content)
+        incremental = []
+        for position in positions:
+            start = time.perf_counter()
+            session.apply([{'start': position, 'text': 'x'}])
+            session.validate()
+            incremental.append(time.perf_counter() - start)
+        assert session.formatted_content == formatter.format_for_linkedin(text)
+
+        full_median = _percentile(full, 0.5)
+        session_median = _percentile(incremental, 0.5)
+        print(f"{size:>10}{'full':>10}{full_median:>12.3f}{_percentile(full, 0.95):>12.3f}{'':>12}")
+        print(f"{size:>10}{'session':>10}{session_median:>12.3f}{_percentile(incremental, 0.95):>12.3f}"
+              f"{full_median / session_median:>11.1f}x")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark: format then validate vs the fused format-and-validate path
+
+Run from the backend directory:
+    python -m benchmarks.bench_fused
+"""
+
+import time
+
+from app.dependencies import get_formatter, get_validator
+from benchmarks.bench_parser import make_post
+
+SIZES = (3_000, 100_000, 1_000_000)
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run():
+    formatter = get_formatter()
+    validator = get_validator()
+
+    print("Format + validate latency (ms, best of runs)")
+    print("=" * 72)
+    print(f"{'size':>10}{'unfused':>12}{'fused':>12}{'validate':>14}{'validate fused':>18}")
+    for size in SIZES:
+        content = make_post(size, 0.1, seed=size)
+        repeat = max(3, 200_000 // size)
+        formatted, stats = formatter.format_with_stats(content)
+
+        def unfused():
+            validator.validate_content(formatter.format_for_linkedin(content))
+
+        def fused():
+            validator.validate_formatted(*formatter.format_with_stats(content))
+
+        total = _best_of(unfused, repeat)
+        total_fused = _best_of(fused, repeat)
+        validate = _best_of(lambda: validator.validate_content(formatted), repeat)
+        validate_fused = _best_of(lambda: validator.validate_formatted(formatted, stats), repeat)
+        print(f"{size:>10}{total * 1000:>12.2f}{total_fused * 1000:>12.2f}"
+              f"{validate * 1000:>14.2f}{validate_fused * 1000:>18.2f}")
+
+
+if __name__ == "__main__":
+    run()
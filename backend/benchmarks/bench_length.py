@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: measuring formatted text and splitting it into threads
+
+Times measure_text (code points, UTF-16 units and graphemes) against
+formatting the same text, and split_thread at LinkedIn's 3000-unit limit
+in each unit, on styled posts, Cyrillic and emoji-heavy text.
+
+Run from the backend directory:
+    python -m benchmarks.bench_length
+"""
+
+import time
+
+from app.dependencies import get_formatter
+from app.services.length import LENGTH_UNITS, measure_text, split_thread
+from benchmarks.bench_parser import make_post
+
+SIZES = (3_000, 100_000, 1_000_000)
+LIMIT = 3000
+
+
+def _best_of(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def run():
+    formatter = get_formatter()
+
+    print("Measure and split (best of runs, milliseconds)")
+    print("=" * 84)
+    print(f"{'size':>10}{'text':>10}{'format':>10}{'measure':>10}"
+          + ''.join(f"{'split ' + unit.split('_')[0]:>16}" for unit in LENGTH_UNITS))
+    for size in SIZES:
+        repeat = 20 if size < 100_000 else 3
+        texts = {
+            'styled': formatter.format_for_linkedin(make_post(size, 0.1, seed=size)),
+            'cyrillic': ('Привет, как дела? Всё хорошо. ' * (size // 30 + 1))[:size],
+            'emoji': ('Launch day 🚀🇺🇸 thanks team 👍🏽 👨‍👩‍👧 ' * (size // 40 + 1))[:size],
+        }
+        for name, text in texts.items():
+            format_ms = _best_of(lambda: formatter.format_for_linkedin(text), repeat) if name == 'styled' else None
+            measure_ms = _best_of(lambda: measure_text(text), repeat)
+            splits = []
+            for unit in LENGTH_UNITS:
+                posts = split_thread(text, LIMIT, unit)
+                assert all(getattr(measure_text(post), unit) <= LIMIT for post in posts)
+                splits.append(f"{_best_of(lambda: split_thread(text, LIMIT, unit), repeat):>10.2f} ({len(posts):>3})")
+            format_column = f"{format_ms:>10.2f}" if format_ms is not None else f"{'-':>10}"
+            print(f"{size:>10}{name:>10}{format_column}{measure_ms:>10.2f}" + ''.join(f"{split:>16}" for split in splits))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: small-request tail latency while large posts are formatted
+
+Starts the API under uvicorn once per offload setting (formatting inline
+on the event loop, in the thread pool, in worker processes) and sends a
+fixed rate of small /api/format and /health requests: first alone, then
+while a few clients keep large /api/format requests in flight. Every post
+is distinct, so nothing is answered from the result cache. With
+formatting on the event loop, a small request that arrives during a
+large one waits for all of it; offloaded, its latency should stay close
+to what it is alone.
+
+Latency is measured from when each small request was due (see
+benchmarks.load), in milliseconds.
+
+Run from the backend directory:
+    python -m benchmarks.bench_offload
+    python -m benchmarks.bench_offload --large-size 500000 --large-clients 4 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+from benchmarks.corpus import make_corpus
+from benchmarks.load import Connection, Recorder, _free_port, percentile, run_open_loop, start_server
+
+# Offload setting -> server environment
+SETTINGS = {
+    'inline': {'OFFLOAD_THRESHOLD': 'off'},
+    'thread': {'OFFLOAD_MODE': 'thread'},
+    'process': {'OFFLOAD_MODE': 'process'},
+}
+
+
+class SmallTraffic:
+    """Small distinct /api/format posts, alternating with /health checks"""
+
+    def __init__(self, size: int, seed: int = 0):
+        self.posts = [document['content'] for document in make_corpus(64, seed=seed, sizes=(size,))]
+        self.sent = 0
+
+    def next_request(self) -> Tuple[str, str, str, Optional[bytes]]:
+        self.sent += 1
+        if self.sent % 2:
+            return 'health', 'GET', '/health', None
+        post = f"{self.posts[self.sent % len(self.posts)]} {self.sent}"
+        return 'format', 'POST', '/api/format', json.dumps({'content': post}).encode()
+
+
+async def _large_client(host: str, port: int, post: str, client: int, stop_at: float, completed: List[float]):
+    connection = Connection(host, port)
+    sent = 0
+    try:
+        while time.perf_counter() < stop_at:
+            sent += 1
+            body = json.dumps({'content': f"{post} {client}.{sent}"}).encode()
+            started = time.perf_counter()
+            status, _ = await connection.request('POST', '/api/format', body)
+            if status != 200:
+                raise RuntimeError(f"Large /api/format failed with {status}")
+            completed.append(time.perf_counter() - started)
+    finally:
+        connection.close()
+
+
+async def measure(host: str, port: int, rps: float, warmup: float, duration: float,
+                  large_post: Optional[str], large_clients: int) -> Tuple[Recorder, List[float]]:
+    """Small-request latencies, with large requests in flight when large_post is given, and the large requests' times"""
+    traffic = SmallTraffic(600)
+    completed: List[float] = []
+    stop_at = time.perf_counter() + warmup + duration
+    large = [
+        asyncio.ensure_future(_large_client(host, port, large_post, client, stop_at, completed))
+        for client in range(large_clients if large_post else 0)
+    ]
+    recorder, _ = await run_open_loop(host, port, traffic, rps, 64, warmup, duration)
+    await asyncio.gather(*large)
+    return recorder, completed
+
+
+def _latencies(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        'p50': percentile(values, 0.50) * 1e3,
+        'p99': percentile(values, 0.99) * 1e3,
+        'max': values[-1] * 1e3,
+    }
+
+
+def run(args):
+    large_post = make_corpus(1, seed=1, sizes=(args.large_size,))[0]['content']
+    print(f"{args.rps:g} small requests/s; under load, {args.large_clients} clients with "
+          f"{args.large_size:,}-character posts in flight (latency ms)\n")
+    print(f"{'setting':<9} {'phase':<11} {'format p50':>10} {'p99':>8} {'max':>8} "
+          f"{'health p99':>10} {'large/s':>8} {'large p50':>10}")
+    print("=" * 82)
+
+    scratch = tempfile.mkdtemp(prefix='clipsy-offload-')
+    try:
+        for setting in args.settings:
+            port = _free_port()
+            server = start_server('uvicorn', port, scratch, SETTINGS[setting])
+            try:
+                for phase, post in (('alone', None), ('under load', large_post)):
+                    recorder, completed = asyncio.run(
+                        measure('127.0.0.1', port, args.rps, args.warmup, args.duration, post, args.large_clients)
+                    )
+                    errors = sum(sum(counts.values()) for counts in recorder.errors.values())
+                    if errors:
+                        raise RuntimeError(f"{errors} small requests failed: {recorder.errors}")
+                    small = _latencies(recorder.latencies['format'])
+                    health = _latencies(recorder.latencies['health'])
+                    large = (f"{len(completed) / (args.warmup + args.duration):>8.1f} "
+                             f"{_latencies(completed)['p50']:>10.1f}" if completed else f"{'-':>8} {'-':>10}")
+                    print(f"{setting:<9} {phase:<11} {small['p50']:>10.1f} {small['p99']:>8.1f} {small['max']:>8.1f} "
+                          f"{health['p99']:>10.1f} {large}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rps', type=float, default=50, help='small requests per second (default: %(default)s)')
+    parser.add_argument('--large-size', type=int, default=300_000, help='characters per large post')
+    parser.add_argument('--large-clients', type=int, default=2, help='large requests kept in flight')
+    parser.add_argument('--duration', type=float, default=5.0, help='measured seconds per phase')
+    parser.add_argument('--warmup', type=float, default=1.0, help='seconds sent before measuring')
+    parser.add_argument('--settings', nargs='+', choices=tuple(SETTINGS), default=list(SETTINGS),
+                        help='offload settings to compare')
+    run(parser.parse_args())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: the regex parser's HTML and markdown passes vs the single-pass parser
+
+Run from the backend directory:
+    python -m benchmarks.bench_parser
+"""
+
+import random
+import time
+
+from app.dependencies import get_formatter
+
+WORDS = ['growth', 'team', 'launch', 'customers', 'product', 'learned', 'today', 'insight']
+SIZES = (3_000, 100_000, 1_000_000)
+DENSITIES = (0.0, 0.02, 0.1, 0.3)
+
+
+def make_post(size: int, density: float, seed: int = 0) -> str:
+    """Build a post of roughly `size` characters where `density` of the words carry markup"""
+    rng = random.Random(seed)
+    markups = ('**{}**', '*{}*', '__{}__', '<b>{}</b>', '<i>{}</i>', '***{}***', '<b><i>{}</i></b>')
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        if rng.random() < density:
+            word = rng.choice(markups).format(word)
+        if rng.random() < 0.02:
+            word += '\n\n'
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e3
+
+
+def run():
+    formatter = get_formatter()
+
+    print("Markup conversion: HTML then markdown pass vs single-pass parser (best of 5, ms)")
+    print("=" * 60)
+    print(f"{'size':>10}{'density':>10}{'regex':>12}{'fast':>12}{'speedup':>12}")
+    for size in SIZES:
+        for density in DENSITIES:
+            post = formatter._clean_content(make_post(size, density))
+            regex = _best_of(lambda: formatter._convert_markdown_to_unicode(
+                formatter._convert_html_to_unicode(post)), 5)
+            fast = _best_of(lambda: formatter._convert_markup_to_unicode(post), 5)
+            print(f"{size:>10}{density:>10.2f}{regex:>12.2f}{fast:>12.2f}{regex / fast:>11.2f}x")
+
+
+if __name__ == "__main__":
+    run()
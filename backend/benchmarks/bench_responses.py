@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON serialization and response bytes, before and after the response layer
+
+For a format response, batch results and the template listing, times
+json.dumps (the serverless handler's old path), Starlette's JSONResponse
+render (the routes' old path) and the shared encoder, then the size and
+cost of each body as sent: as it is, gzip compressed and, when the
+brotli package is installed, brotli compressed. The template listing is
+also timed as a pre-serialized payload, which costs a lookup per request.
+
+Run from the backend directory:
+    python -m benchmarks.bench_responses
+"""
+
+import json
+import time
+
+from starlette.responses import JSONResponse
+
+from app.dependencies import get_formatter, get_template_service, get_validator
+from app.services.batch import format_document
+from app.services.response import ENCODINGS, ResponseEncoder, compress, dumps
+from benchmarks.corpus import make_corpus
+
+
+def _best_of(func, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6
+
+
+def make_responses():
+    """Response bodies as the routes return them, keyed by name"""
+    formatter, validator = get_formatter(), get_validator()
+    posts = make_corpus(50, seed=11)
+    results = [format_document(formatter, validator, post) for post in posts]
+    return {
+        'format.3k': results[0],
+        'format_batch.8': {'results': [{'index': i, 'result': result} for i, result in enumerate(results[:8])]},
+        'format_batch.50': {'results': [{'index': i, 'result': result} for i, result in enumerate(results)]},
+        'templates': get_template_service().get_templates(),
+    }
+
+
+def run():
+    responses = make_responses()
+    render = JSONResponse(None).render
+
+    print("Serialization (best of 20, us)")
+    print("=" * 64)
+    print(f"{'response':<18}{'json.dumps':>14}{'JSONResponse':>14}{'dumps':>10}{'speedup':>8}")
+    for name, value in responses.items():
+        stdlib = _best_of(lambda: json.dumps(value).encode(), 20)
+        starlette = _best_of(lambda: render(value), 20)
+        fast = _best_of(lambda: dumps(value), 20)
+        print(f"{name:<18}{stdlib:>14.1f}{starlette:>14.1f}{fast:>10.1f}{min(stdlib, starlette) / fast:>7.1f}x")
+
+    print("\nResponse bytes; compressed as bytes/us to compress (best of 20)")
+    print("=" * 64)
+    print(f"{'response':<18}{'json.dumps':>12}{'dumps':>10}" + ''.join(f"{encoding:>12}" for encoding in ENCODINGS))
+    for name, value in responses.items():
+        body = dumps(value)
+        sizes = ''.join(
+            f"{len(compress(body, encoding)):>7}/{_best_of(lambda: compress(body, encoding), 20):>4.0f}"
+            for encoding in ENCODINGS
+        )
+        print(f"{name:<18}{len(json.dumps(value).encode()):>12}{len(body):>10}{sizes}")
+
+    service = get_template_service()
+    encoder = ResponseEncoder()
+    accept = ', '.join(ENCODINGS)
+    templates = service.get_templates()
+    print(f"\nTemplate listing per request, Accept-Encoding: {accept} (best of 200, us)")
+    print("=" * 64)
+    print(f"{'serialize and compress each time':<40}"
+          f"{_best_of(lambda: encoder.encode(dumps(templates), accept), 200):>10.1f}")
+    print(f"{'pre-serialized payload':<40}"
+          f"{_best_of(lambda: encoder.encode_payload(service.get_templates_payload(), accept), 200):>10.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark: whole-document formatting vs the streaming pipeline
+
+Reports total time, time to first output and peak traced memory for
+multi-megabyte inputs fed in 64 KB chunks.
+
+Run from the backend directory:
+    python -m benchmarks.bench_stream
+"""
+
+import time
+import tracemalloc
+
+from app.dependencies import get_formatter
+from benchmarks.bench_parser import make_post
+
+SIZES = (1_000_000, 4_000_000)
+CHUNK_SIZE = 64 * 1024
+
+
+def _measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = func(start)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, first - start, peak
+
+
+def run():
+    formatter = get_formatter()
+
+    print("Whole-document vs streaming formatting (64 KB chunks)")
+    print("=" * 72)
+    print(f"{'size':>10}{'mode':>12}{'total ms':>14}{'first out ms':>16}{'peak MB':>12}")
+    for size in SIZES:
+        content = make_post(size, 0.1, seed=size)
+        chunks = [content[i:i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)]
+
+        def whole(start):
+            formatter.format_for_linkedin(content)
+            return time.perf_counter()
+
+        def streamed(start):
+            first = None
+            for piece in formatter.format_stream(chunks):
+                if first is None and piece:
+                    first = time.perf_counter()
+            return first
+
+        for mode, func in (("whole", whole), ("stream", streamed)):
+            elapsed, first, peak = _measure(func)
+            print(f"{size:>10}{mode:>12}{elapsed * 1000:>14.1f}{first * 1000:>16.1f}{peak / 2**20:>12.1f}")
+
+
+if __name__ == "__main__":
+    run()
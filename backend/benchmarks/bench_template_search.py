@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: template search through the inverted index vs a linear scan
+
+The corpus is synthetic: words are drawn from a Zipf-like distribution over
+a generated vocabulary, so a handful of words appear in most templates and
+most words in very few, as in real text. The linear scan is the substring
+filter the gallery applied to the full template list.
+
+Run from the backend directory:
+    python -m benchmarks.bench_template_search
+"""
+
+import random
+import statistics
+import time
+
+from app.services.template_search import TemplateIndex
+
+TEMPLATE_COUNT = 100_000
+VOCABULARY_SIZE = 20_000
+CATEGORIES = ('business', 'personal', 'professional', 'custom')
+CONSONANTS = 'bcdfghklmnprstvz'
+VOWELS = 'aeiou'
+
+
+def make_vocabulary(size: int, rng: random.Random) -> list:
+    words = set()
+    while len(words) < size:
+        syllables = rng.randint(1, 4)
+        words.add(''.join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(syllables)))
+    return sorted(words, key=lambda word: (len(word), word))
+
+
+def make_templates(count: int, vocabulary: list, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    # Zipf-like: the word at rank r is drawn with weight 1 / (r + 1)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocabulary))]
+
+    def words(n: int) -> str:
+        return ' '.join(rng.choices(vocabulary, weights, k=n))
+
+    return [
+        {"id": f"t{i}", "name": words(3), "category": CATEGORIES[i % len(CATEGORIES)],
+         "description": words(8), "content": words(60)}
+        for i in range(count)
+    ]
+
+
+def linear_scan(templates: list, query: str, limit: int) -> list:
+    query = query.lower()
+    matches = [
+        template for template in templates
+        if query in template["name"].lower() or query in template["description"].lower()
+        or query in template["content"].lower()
+    ]
+    return matches[:limit]
+
+
+def _latencies(func, queries: list, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        for query in queries:
+            start = time.perf_counter()
+            func(query)
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run():
+    rng = random.Random(1)
+    vocabulary = make_vocabulary(VOCABULARY_SIZE, rng)
+    templates = make_templates(TEMPLATE_COUNT, vocabulary)
+
+    index = TemplateIndex()
+    start = time.perf_counter()
+    for template in templates:
+        index.add(template)
+    build = time.perf_counter() - start
+    print(f"Indexed {TEMPLATE_COUNT:,} templates in {build:.2f}s ({build / TEMPLATE_COUNT * 1e6:.1f} us each)")
+
+    common, mid, rare = vocabulary[0], vocabulary[200], vocabulary[5000]
+    workloads = [
+        ("most common word", [common]),
+        ("mid-frequency word", [mid]),
+        ("rare word", [rare]),
+        ("1-letter prefix", [word[0] for word in vocabulary[:50]]),
+        ("3-letter prefix", [word[:3] for word in vocabulary[100:150]]),
+        ("two common words", [f"{common} {vocabulary[1]}"]),
+        ("common + rare", [f"{common} {rare}"]),
+        ("typing a phrase", [f"{vocabulary[3]} {mid[:2]}", f"{vocabulary[3]} {mid}"]),
+        ("word in category", [mid]),
+    ]
+
+    print()
+    print("Query latency at 100k templates (microseconds, first page of 20)")
+    print("=" * 72)
+    print(f"{'query':<22}{'index p50':>12}{'index p95':>12}{'index max':>12}{'scan p50':>12}")
+    for name, queries in workloads:
+        category = 'personal' if name == "word in category" else None
+        # Warm the per-term ranked postings, as steady-state traffic would
+        for query in queries:
+            index.search(query, category=category)
+        samples = _latencies(lambda q: index.search(q, category=category), queries, max(1, 200 // len(queries)))
+        scan = _latencies(lambda q: linear_scan(templates, q, 20), queries[:1], 1)
+        quantiles = statistics.quantiles(samples, n=20)
+        print(f"{name:<22}{statistics.median(samples) * 1e6:>12.1f}{quantiles[18] * 1e6:>12.1f}"
+              f"{max(samples) * 1e6:>12.1f}{scan[0] * 1e6:>12.0f}")
+
+    print()
+    print("Incremental updates (microseconds per template)")
+    print("=" * 72)
+    extra = make_templates(2_000, vocabulary, seed=2)
+    for template in extra:
+        template["id"] = "new-" + template["id"]
+    start = time.perf_counter()
+    for template in extra:
+        index.add(template)
+    added = time.perf_counter() - start
+    start = time.perf_counter()
+    for template in extra:
+        index.remove(template["id"])
+    removed = time.perf_counter() - start
+    print(f"add {added / len(extra) * 1e6:.1f}   remove {removed / len(extra) * 1e6:.1f}")
+
+    start = time.perf_counter()
+    index.search(common)
+    print(f"first query for a word after updates touched it: {(time.perf_counter() - start) * 1e6:.0f} us")
+
+
+if __name__ == "__main__":
+    run()
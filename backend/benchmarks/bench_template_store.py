@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark: template write throughput per storage backend at 100k templates
+
+Each backend is seeded with LIBRARY_SIZE templates, then timed for
+sequential creates and for concurrent creates from several threads, where
+group commit lets one flush cover many writes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_template_store
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from app.services.template_store import open_template_store
+from app.services.templates import TemplateService
+
+LIBRARY_SIZE = 100_000
+THREADS = 8
+# The JSON backend rewrites the whole library per commit, so it gets fewer writes
+WRITES = {'templates.json': 20, 'templates.jsonl': 2_000, 'templates.db': 2_000}
+
+
+def _seed(store):
+    templates = [
+        {"id": f"seed-{i}", "name": f"Template {i}", "content": "Hello [NAME]!\n\n#tag " * 5,
+         "category": ('business', 'personal', 'professional')[i % 3], "description": ""}
+        for i in range(LIBRARY_SIZE)
+    ]
+    store.commit(store.append([('put', template) for template in templates]))
+
+
+def _creates(service: TemplateService, count: int, threads: int) -> float:
+    def worker(n):
+        for _ in range(n):
+            service.create_template("Bench", "Body #tag", "bench")
+
+    workers = [threading.Thread(target=worker, args=(count // threads,)) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return (count // threads) * threads / (time.perf_counter() - start)
+
+
+def run():
+    print(f"Template writes with {LIBRARY_SIZE:,} templates stored (writes/second)")
+    print("=" * 72)
+    print(f"{'backend':>16}{'seed s':>10}{'open s':>10}{'sequential':>14}{f'{THREADS} threads':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, writes in WRITES.items():
+            path = os.path.join(directory, name)
+
+            start = time.perf_counter()
+            store = open_template_store(path, legacy_json=None)
+            _seed(store)
+            seed_time = time.perf_counter() - start
+            store.close()
+
+            start = time.perf_counter()
+            service = TemplateService(store=open_template_store(path, legacy_json=None))
+            open_time = time.perf_counter() - start
+
+            sequential = _creates(service, writes, 1)
+            concurrent = _creates(service, writes, THREADS)
+            service.store.close()
+            print(f"{name:>16}{seed_time:>10.2f}{open_time:>10.2f}{sequential:>14.0f}{concurrent:>14.0f}")
+
+
+if __name__ == "__main__":
+    run()
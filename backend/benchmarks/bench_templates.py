@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Benchmark: template reads with a per-request service vs the shared repository
+
+A per-request TemplateService re-reads and re-parses templates.json, as the
+routes used to; the shared one answers from memory after a stat() check.
+
+Run from the backend directory:
+    python -m benchmarks.bench_templates
+"""
+
+import json
+import os
+import tempfile
+import time
+
+from app.services.templates import TemplateService
+
+TEMPLATE_COUNTS = (6, 1_000, 10_000)
+CATEGORIES = ('business', 'personal', 'professional', 'custom')
+
+
+def _per_call(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def run():
+    print("Template reads (microseconds per call)")
+    print("=" * 76)
+    print(f"{'templates':>10}{'per-request by id':>20}{'shared by id':>15}{'shared by category':>20}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'templates.json')
+        for count in TEMPLATE_COUNTS:
+            templates = [
+                {"id": f"t{i}", "name": f"Template {i}", "content": "Hello [NAME]!\n\n#tag " * 5,
+                 "category": CATEGORIES[i % len(CATEGORIES)], "description": ""}
+                for i in range(count)
+            ]
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(templates, f)
+
+            last_id = f"t{count - 1}"
+            repeat = max(5, 20_000 // count)
+            shared = TemplateService(path)
+            per_request = _per_call(lambda: TemplateService(path).get_template(last_id), repeat)
+            by_id = _per_call(lambda: shared.get_template(last_id), 20_000)
+            by_category = _per_call(lambda: shared.get_templates('custom'), 2_000)
+            print(f"{count:>10}{per_request * 1e6:>20.1f}{by_id * 1e6:>15.1f}{by_category * 1e6:>20.1f}")
+
+
+if __name__ == "__main__":
+    run()
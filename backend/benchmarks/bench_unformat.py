@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Benchmark: converting formatted posts back to markdown
+
+Unformats an archive of formatted posts one call per post and with
+unformat_many, and checks that formatting the result again round-trips.
+
+Run from the backend directory:
+    python -m benchmarks.bench_unformat
+"""
+
+import time
+
+from app.dependencies import get_formatter
+from benchmarks.bench_parser import make_post
+
+POST_COUNTS = (10_000, 100_000)
+POST_SIZE = 600
+
+
+def run():
+    formatter = get_formatter()
+    # A pool of distinct posts, repeated to reach archive sizes
+    pool = [formatter.format_for_linkedin(make_post(POST_SIZE, 0.1, seed=seed), parser='fast') for seed in range(1000)]
+    for post in pool:
+        assert formatter.format_for_linkedin(formatter.unformat(post), parser='fast') == post
+
+    print(f"Unformat archives of ~{POST_SIZE}-character posts")
+    print("=" * 64)
+    print(f"{'posts':>10}{'mode':>12}{'seconds':>12}{'posts/s':>14}{'MB/s':>10}")
+    for count in POST_COUNTS:
+        posts = pool * (count // len(pool))
+        size = sum(map(len, posts)) / 1e6
+        for mode, func in (("per post", lambda: [formatter.unformat(post) for post in posts]),
+                           ("many", lambda: formatter.unformat_many(posts))):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            print(f"{count:>10}{mode:>12}{elapsed:>12.2f}{count / elapsed:>14.0f}{size / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-scan content validation and CTA phrase scaling
+
+The CTA table compares the validator's phrase trie against searching for
+each phrase separately, as the validator used to.
+
+Run from the backend directory:
+    python -m benchmarks.bench_validator
+"""
+
+import random
+import re
+import time
+
+from app.dependencies import get_formatter
+from app.services.validator import CTA_PHRASES, ContentValidator
+from benchmarks.bench_parser import make_post
+
+SIZES = (3_000, 100_000, 1_000_000)
+PHRASE_COUNTS = (5, 50, 500)
+# Not used by make_post, so no phrase matches and every scan runs to the end
+PHRASE_WORDS = ('tell', 'us', 'how', 'drop', 'your', 'would', 'you', 'share', 'story', 'reply')
+
+
+def _time(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def _phrases(count: int):
+    rng = random.Random(count)
+    extra = [' '.join(rng.choice(PHRASE_WORDS) for _ in range(3)) for _ in range(count - len(CTA_PHRASES))]
+    return list(CTA_PHRASES) + extra
+
+
+def run():
+    formatter = get_formatter()
+    validator = ContentValidator()
+
+    print("validate_content on formatted posts")
+    print("=" * 40)
+    print(f"{'size':>10}{'ms':>14}")
+    for size in SIZES:
+        content = formatter.format_for_linkedin(make_post(size, 0.1, seed=size))
+        repeat = max(1, 300_000 // size)
+        print(f"{size:>10}{_time(lambda: validator.validate_content(content), repeat) * 1000:>14.3f}")
+
+    content = formatter.format_for_linkedin(make_post(3_000, 0.1, seed=1))
+    print()
+    print("CTA phrases, 3,000-character post (ms)")
+    print("=" * 52)
+    print(f"{'phrases':>10}{'validator':>14}{'re.search each':>18}{'compile':>10}")
+    for count in PHRASE_COUNTS:
+        phrases = _phrases(count)
+        start = time.perf_counter()
+        custom = ContentValidator(phrases)
+        compile_time = time.perf_counter() - start
+        scan = _time(lambda: custom.validate_content(content), 200)
+        each = _time(lambda: any(re.search(re.escape(p), content, re.IGNORECASE) for p in phrases), 20)
+        print(f"{count:>10}{scan * 1000:>14.3f}{each * 1000:>18.3f}{compile_time * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,77 @@
+"""
+Seeded synthetic corpus for the benchmarks
+
+Posts are built from a small vocabulary with markup, emojis and paragraph
+breaks mixed in at configurable rates, so a seed always gives the same
+corpus and runs on different machines or commits compare like for like.
+"""
+
+import random
+from typing import Any, Dict, List, Sequence
+
+WORDS = ('growth', 'team', 'launch', 'customers', 'product', 'learned', 'today', 'insight',
+         'hiring', 'feedback', 'roadmap', 'shipped', 'users', 'metrics', 'story', 'why')
+MARKUPS = ('**{}**', '*{}*', '__{}__', '<b>{}</b>', '<i>{}</i>', '***{}***', '<b><i>{}</i></b>', '<u>{}</u>')
+# Single code points, skin tones, ZWJ sequences, flags and a variation selector
+EMOJIS = ('\U0001f680', '\U0001f389', '\U0001f4a1', '\U0001f44d\U0001f3fd', '\U0001f469\u200d\U0001f4bb',
+          '\U0001f468\u200d\U0001f469\u200d\U0001f467', '\U0001f1fa\U0001f1f8', '\u2764\ufe0f', '\u2705', '\U0001f4c8')
+ENDINGS = ('.', '!', '?', ',', '', '', '', '')
+STYLES = (('bold',), ('italic',), ('underline',), ('bold', 'italic'), ('bold', 'underline'))
+
+
+def make_post(rng: random.Random, size: int, markup_density: float = 0.1, emoji_ratio: float = 0.02) -> str:
+    """
+    Build a post of about `size` characters
+
+    Args:
+        rng: Random source
+        size: Target length in characters
+        markup_density: Fraction of words wrapped in markdown or HTML markup
+        emoji_ratio: Fraction of words followed by an emoji
+    """
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS) + rng.choice(ENDINGS)
+        if rng.random() < markup_density:
+            word = rng.choice(MARKUPS).format(word)
+        if rng.random() < emoji_ratio:
+            word += ' ' + rng.choice(EMOJIS)
+        if rng.random() < 0.03:
+            word += '\n\n' if rng.random() < 0.7 else '\n'
+        words.append(word)
+        length += len(word) + 1
+    if rng.random() < 0.5:
+        words.append('#' + rng.choice(WORDS))
+    return ' '.join(words)
+
+
+def make_ranges(rng: random.Random, length: int, count: int) -> List[Dict[str, Any]]:
+    """`count` random, possibly overlapping style ranges over a text of `length` characters"""
+    ranges = []
+    for _ in range(count):
+        start = rng.randrange(max(length, 1))
+        end = min(length, start + rng.randint(1, 40))
+        ranges.append({'start': start, 'end': end, 'styles': list(rng.choice(STYLES))})
+    return ranges
+
+
+def make_corpus(count: int, seed: int = 0, sizes: Sequence[int] = (300, 1_200, 3_000),
+                markup_density: float = 0.1, emoji_ratio: float = 0.02, range_count: int = 0) -> List[Dict[str, Any]]:
+    """
+    Build `count` documents as format requests: {'content', 'ranges'}
+
+    Args:
+        count: Number of documents
+        seed: Seed; the same arguments always give the same corpus
+        sizes: Post sizes, picked at random per document
+        markup_density: Fraction of words carrying markup
+        emoji_ratio: Fraction of words followed by an emoji
+        range_count: Style ranges per document, for range formatting
+    """
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(count):
+        content = make_post(rng, rng.choice(sizes), markup_density, emoji_ratio)
+        documents.append({'content': content, 'ranges': make_ranges(rng, len(content), range_count)})
+    return documents
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Load test: latency percentiles and throughput under concurrency
+
+Starts the API on localhost, under uvicorn and/or as the serverless
+handler in api/index.py behind a threading HTTP server, and drives a mix
+of /api/format, /api/format-advanced, /api/validate and /api/templates
+traffic at it from an asyncio client, either at a fixed request rate
+(open loop) or with a fixed number of requests in flight (closed loop).
+
+At a fixed rate, latency is measured from when each request was due, not
+when it was sent, so a server that falls behind shows it in the tail
+instead of slowing the client down.
+
+The report gives throughput, error rates and p50/p95/p99/max latency per
+endpoint, as a text summary and optionally as JSON for diffing runs
+across commits.
+
+Run from the backend directory:
+    python -m benchmarks.load --concurrency 16 --duration 10
+    python -m benchmarks.load --rps 200 --mix format=4,validate=2,templates=1 --json load.json
+    python -m benchmarks.load --target handler --concurrency 4
+    python -m benchmarks.load --url http://localhost:8000 --rps 50
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from benchmarks.corpus import make_corpus
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), '..')
+API_INDEX_PATH = os.path.join(BACKEND_DIR, '..', 'api', 'index.py')
+TARGETS = ('uvicorn', 'handler')
+ENDPOINTS = ('format', 'format-advanced', 'validate', 'templates')
+DEFAULT_MIX = 'format=4,format-advanced=1,validate=2,templates=1'
+STARTUP_TIMEOUT = 30.0
+
+
+class Connection:
+    """Minimal HTTP/1.1 client connection, kept alive while the server allows it"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Optional[bytes] = None) -> Tuple[int, bytes]:
+        """
+        Send a request and read the whole response
+
+        Returns:
+            Tuple of the status code and the response body
+        """
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if body is not None:
+            head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        message = head.encode('latin-1') + b"\r\n" + (body or b'')
+        # A kept-alive connection the server has since closed fails before any
+        # response; send those requests again on a new connection
+        for reused in (self.writer is not None, False):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.writer.write(message)
+            try:
+                return await self._read_response()
+            except ConnectionError:
+                self.close()
+                if not reused:
+                    raise
+            except Exception:
+                self.close()
+                raise
+
+    async def _read_response(self) -> Tuple[int, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed before a response")
+        version, status = status_line.split(None, 2)[:2]
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            body = b''.join(chunks)
+        else:
+            # HTTP/1.0 servers such as BaseHTTPRequestHandler end the body by closing
+            body = await self.reader.read()
+            self.close()
+        if version == b'HTTP/1.0' or headers.get('connection', '').lower() == 'close':
+            self.close()
+        return int(status), body
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class Traffic:
+    """Requests for each endpoint of the mix, built from the seeded corpus"""
+
+    def __init__(self, mix: Dict[str, int], seed: int = 0):
+        self.names = list(mix)
+        self.weights = [mix[name] for name in self.names]
+        self.rng = random.Random(seed)
+        self.posts = make_corpus(100, seed=seed)
+        self.ranged = make_corpus(50, seed=seed + 1, range_count=10)
+        # Numbering each body keeps the result cache from answering for the engine
+        self.counter = itertools.count()
+
+    def next_request(self) -> Tuple[str, str, str, Optional[bytes]]:
+        """Tuple of endpoint name, method, path and JSON body"""
+        name = self.rng.choices(self.names, self.weights)[0]
+        n = next(self.counter)
+        if name == 'templates':
+            return name, 'GET', '/api/templates', None
+        if name == 'format-advanced':
+            document = self.ranged[n % len(self.ranged)]
+            body = {'content': f"{document['content']}\n\n#{n}", 'ranges': document['ranges']}
+        else:
+            body = {'content': f"{self.posts[n % len(self.posts)]['content']}\n\n#{n}"}
+        return name, 'POST', f'/api/{name}', json.dumps(body).encode()
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    """Parse 'format=4,validate=1' into endpoint weights"""
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{name}', expected one of: {', '.join(ENDPOINTS)}")
+        weights[name] = int(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("The mix needs at least one endpoint with a positive weight")
+    return weights
+
+
+class Recorder:
+    """Latencies and errors of the requests sent inside the measured window"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, Dict[str, int]] = {}
+
+    def record(self, name: str, latency: float, error: Optional[str] = None):
+        self.latencies.setdefault(name, []).append(latency)
+        if error is not None:
+            counts = self.errors.setdefault(name, {})
+            counts[error] = counts.get(error, 0) + 1
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    return values[max(0, math.ceil(fraction * len(values)) - 1)]
+
+
+def summarize(recorder: Recorder, elapsed: float) -> Dict[str, dict]:
+    """Throughput, error rate and latency percentiles in milliseconds, per endpoint and in total"""
+    groups = {name: recorder.latencies[name] for name in ENDPOINTS if name in recorder.latencies}
+    groups['total'] = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    summary = {}
+    for name, latencies in groups.items():
+        if not latencies:
+            continue
+        latencies = sorted(latencies)
+        errors = (sum(sum(counts.values()) for counts in recorder.errors.values()) if name == 'total'
+                  else sum(recorder.errors.get(name, {}).values()))
+        summary[name] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'error_rate': round(errors / len(latencies), 4),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies) * 1e3, 2),
+                'p50': round(percentile(latencies, 0.50) * 1e3, 2),
+                'p95': round(percentile(latencies, 0.95) * 1e3, 2),
+                'p99': round(percentile(latencies, 0.99) * 1e3, 2),
+                'max': round(latencies[-1] * 1e3, 2),
+            },
+        }
+        if name != 'total' and recorder.errors.get(name):
+            summary[name]['error_kinds'] = recorder.errors[name]
+    return summary
+
+
+async def _send(connections: asyncio.Queue, host: str, port: int, request, recorder: Optional[Recorder], due: float):
+    name, method, path, body = request
+    connection = connections.get_nowait() if not connections.empty() else Connection(host, port)
+    error = None
+    try:
+        status, _ = await connection.request(method, path, body)
+        if status >= 400:
+            error = str(status)
+    except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+        error = type(e).__name__
+    latency = time.perf_counter() - due
+    connections.put_nowait(connection)
+    if recorder is not None:
+        recorder.record(name, latency, error)
+
+
+async def run_closed_loop(host: str, port: int, traffic: Traffic, concurrency: int,
+                          warmup: float, duration: float) -> Tuple[Recorder, float]:
+    """Keep `concurrency` requests in flight; returns the recorder and the measured seconds"""
+    recorder = Recorder()
+    connections: asyncio.Queue = asyncio.Queue()
+    start = time.perf_counter()
+    measure_from, stop_at = start + warmup, start + warmup + duration
+
+    async def worker():
+        while True:
+            sent = time.perf_counter()
+            if sent >= stop_at:
+                return
+            await _send(connections, host, port, traffic.next_request(),
+                        recorder if sent >= measure_from else None, sent)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    _close_all(connections)
+    return recorder, time.perf_counter() - measure_from
+
+
+async def run_open_loop(host: str, port: int, traffic: Traffic, rps: float, max_connections: int,
+                        warmup: float, duration: float) -> Tuple[Recorder, float]:
+    """
+    Send requests at a fixed rate whatever the server's speed
+
+    At most `max_connections` requests are in flight; requests due while all
+    are busy wait for one, and their wait counts toward their latency.
+    """
+    recorder = Recorder()
+    connections: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(max_connections)
+    tasks = set()
+    start = time.perf_counter()
+    measure_from = start + warmup
+    total = int((warmup + duration) * rps)
+
+    async def send(request, due):
+        async with slots:
+            await _send(connections, host, port, request, recorder if due >= measure_from else None, due)
+
+    for i in range(total):
+        due = start + i / rps
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(send(traffic.next_request(), due))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+    _close_all(connections)
+    return recorder, start + total / rps - measure_from
+
+
+def _close_all(connections: asyncio.Queue):
+    while not connections.empty():
+        connections.get_nowait().close()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(target: str, port: int, scratch: str, settings: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    """Start the API under uvicorn or as the serverless handler, in a child process, with extra environment settings"""
+    env = dict(os.environ, TEMPLATES_STORE=os.path.join(scratch, 'templates.json'), PYTHONPATH=BACKEND_DIR,
+               **(settings or {}))
+    if target == 'uvicorn':
+        command = [sys.executable, '-m', 'uvicorn', 'app.main:app', '--host', '127.0.0.1',
+                   '--port', str(port), '--log-level', 'warning']
+    else:
+        command = [sys.executable, '-m', 'benchmarks.load', '--serve-handler', '--port', str(port)]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The {target} server exited with status {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"The {target} server didn't start within {STARTUP_TIMEOUT:.0f} seconds")
+
+
+def serve_handler(port: int):
+    """Serve api/index.py's handler the way the serverless platform calls it, one thread per request"""
+    spec = importlib.util.spec_from_file_location('api_index', API_INDEX_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    class QuietHandler(module.handler):
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # Every request opens a connection; the default backlog of 5 would have
+        # the kernel drop connects under load and add seconds of retries
+        request_queue_size = 1024
+        daemon_threads = True
+
+    server = Server(('127.0.0.1', port), QuietHandler)
+    server.serve_forever()
+
+
+def run_target(args, mix: Dict[str, int], host: str, port: int) -> Dict[str, dict]:
+    traffic = Traffic(mix, args.seed)
+    if args.rps:
+        recorder, elapsed = asyncio.run(run_open_loop(host, port, traffic, args.rps, args.max_connections,
+                                                      args.warmup, args.duration))
+    else:
+        recorder, elapsed = asyncio.run(run_closed_loop(host, port, traffic, args.concurrency,
+                                                        args.warmup, args.duration))
+    return summarize(recorder, elapsed)
+
+
+def print_summary(target: str, summary: Dict[str, dict]):
+    print(f"\n{target}")
+    print(f"{'endpoint':<18}{'requests':>10}{'rps':>9}{'errors':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    print("=" * 86)
+    for name, stats in summary.items():
+        latency = stats['latency_ms']
+        print(f"{name:<18}{stats['requests']:>10}{stats['throughput_rps']:>9.1f}{stats['error_rate']:>9.1%}"
+              f"{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}{latency['max']:>10.2f}")
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--rps', type=float, help='send at this fixed rate (open loop)')
+    load.add_argument('--concurrency', type=int, default=8, help='keep this many requests in flight (default: %(default)s)')
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds (default: %(default)s)')
+    parser.add_argument('--warmup', type=float, default=2.0, help='unmeasured seconds first (default: %(default)s)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='endpoint weights (default: %(default)s)')
+    parser.add_argument('--target', choices=TARGETS + ('both',), default='uvicorn', help='server to start')
+    parser.add_argument('--url', help='test an already running server instead of starting one')
+    parser.add_argument('--max-connections', type=int, default=64,
+                        help='most requests in flight at a fixed rate (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='corpus and mix seed')
+    parser.add_argument('--json', dest='json_path', help='also write the report here as JSON')
+    parser.add_argument('--serve-handler', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve_handler:
+        serve_handler(args.port)
+        return 0
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    report = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'mode': {'rps': args.rps} if args.rps else {'concurrency': args.concurrency},
+        'duration_s': args.duration,
+        'warmup_s': args.warmup,
+        'mix': mix,
+        'seed': args.seed,
+        'targets': {},
+    }
+    if args.url:
+        url = urlsplit(args.url)
+        report['targets'][args.url] = run_target(args, mix, url.hostname, url.port or 80)
+    else:
+        scratch = tempfile.mkdtemp(prefix='clipsy-load-')
+        try:
+            for target in (TARGETS if args.target == 'both' else (args.target,)):
+                port = _free_port()
+                server = start_server(target, port, scratch)
+                try:
+                    report['targets'][target] = run_target(args, mix, '127.0.0.1', port)
+                finally:
+                    server.terminate()
+                    server.wait()
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    mode = f"{args.rps:g} requests/s" if args.rps else f"{args.concurrency} in flight"
+    print(f"Load test: {mode}, {args.duration:g} s after {args.warmup:g} s warmup")
+    for target, summary in report['targets'].items():
+        print_summary(target, summary)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nReport written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark suite with stored baselines and a regression gate
+
+Times the engines directly (formatter, range formatting, validator,
+template reads and writes), every FastAPI route in-process through
+TestClient and the serverless handler in api/index.py, all on the seeded
+corpus from benchmarks/corpus.py. No server or network is needed.
+
+Each case is timed in rounds sized to take about 20 ms; the best round
+per call is the result, as it is the least disturbed by the rest of the
+machine. A fixed reference workload is timed next to every case, and the
+gate divides every change by the median change of the reference, so a
+machine that is slower or busier as a whole doesn't read as a regression.
+Baselines are still best recorded on the machine that checks against them.
+
+Run from the backend directory:
+    python -m benchmarks.suite                      # print timings
+    python -m benchmarks.suite --save               # record them as the baseline
+    python -m benchmarks.suite --check              # exit 1 on a regression
+    python -m benchmarks.suite --check --threshold 0.5 --filter route.
+"""
+
+import argparse
+import atexit
+import importlib.util
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Templates written by the route and handler cases go to a scratch store,
+# never to the repository's; this must be set before app.dependencies loads
+_SCRATCH = tempfile.mkdtemp(prefix='clipsy-bench-')
+os.environ['TEMPLATES_STORE'] = os.path.join(_SCRATCH, 'templates.json')
+atexit.register(shutil.rmtree, _SCRATCH, ignore_errors=True)
+
+from fastapi.routing import APIRoute  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.dependencies import get_formatter, get_metrics, get_template_service, get_validator  # noqa: E402
+from app.main import app  # noqa: E402
+from app.services.templates import TemplateService  # noqa: E402
+from benchmarks.corpus import make_corpus  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines.json')
+API_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'api', 'index.py')
+ROUND_SECONDS = 0.02
+DEFAULT_ROUNDS = 5
+DEFAULT_THRESHOLD = 0.25
+
+Case = Tuple[str, Callable[[], object]]
+
+
+# Shared by every run in the process, so a repeated run doesn't hit the
+# result cache with the contents of the one before
+_UNIQUE = itertools.count()
+
+
+def _distinct(documents: List[dict]) -> Callable[[], dict]:
+    """Cycle through documents, making each call's content unique so result caches always miss"""
+
+    def next_document() -> dict:
+        n = next(_UNIQUE)
+        document = documents[n % len(documents)]
+        return {**document, 'content': f"{document['content']}\n\n#{n}"}
+    return next_document
+
+
+def engine_cases() -> List[Case]:
+    formatter = get_formatter()
+    validator = get_validator()
+    posts = make_corpus(50, seed=1, sizes=(3_000,))
+    large = make_corpus(2, seed=2, sizes=(100_000,))
+    emoji = make_corpus(50, seed=3, sizes=(3_000,), emoji_ratio=0.3)
+    ranged = make_corpus(20, seed=4, sizes=(3_000,), range_count=10)
+    many_ranged = make_corpus(5, seed=5, sizes=(20_000,), range_count=1_000)
+    formatted = [formatter.format_for_linkedin(document['content']) for document in posts]
+
+    def cycle(items):
+        iterator = itertools.cycle(items)
+        return lambda: next(iterator)
+
+    post, big, emoji_post = cycle(posts), cycle(large), cycle(emoji)
+    ranged_post, many_ranged_post, formatted_post = cycle(ranged), cycle(many_ranged), cycle(formatted)
+    return [
+        ('format.regex.3k', lambda: formatter.format_for_linkedin(post()['content'])),
+        ('format.fast.3k', lambda: formatter.format_for_linkedin(post()['content'], parser='fast')),
+        ('format.regex.emoji.3k', lambda: formatter.format_for_linkedin(emoji_post()['content'])),
+        ('format.regex.100k', lambda: formatter.format_for_linkedin(big()['content'])),
+        ('format_with_ranges.10', lambda: _with_ranges(formatter, ranged_post())),
+        ('format_with_ranges.1000', lambda: _with_ranges(formatter, many_ranged_post())),
+        ('validate.raw.3k', lambda: validator.validate_content(post()['content'])),
+        ('validate.formatted.3k', lambda: validator.validate_content(formatted_post())),
+        ('validate.raw.100k', lambda: validator.validate_content(big()['content'])),
+    ]
+
+
+def _with_ranges(formatter, document):
+    return formatter.format_with_ranges(document['content'], document['ranges'])
+
+
+def template_cases() -> List[Case]:
+    service = TemplateService(os.path.join(_SCRATCH, 'service.json'))
+    for document in make_corpus(200, seed=6, sizes=(300, 1_200)):
+        service.create_template(name=document['content'][:30], content=document['content'], category='custom')
+    ids = itertools.cycle([template['id'] for template in service.get_templates()])
+    queries = itertools.cycle(['launch', 'team growth', 'cust', 'roadmap shipped', 'why'])
+    created: List[str] = []
+
+    def write():
+        template = service.create_template(name='Benchmark', content='Hello [NAME]!', category='custom')
+        created.append(template['id'])
+        if len(created) > 20:
+            service.delete_template(created.pop(0))
+
+    return [
+        ('templates.list', lambda: service.get_templates()),
+        ('templates.list.category', lambda: service.get_templates('custom')),
+        ('templates.get', lambda: service.get_template(next(ids))),
+        ('templates.search', lambda: service.search_templates(next(queries))),
+        ('templates.update', lambda: service.update_template(next(ids), description='updated')),
+        ('templates.create_delete', write),
+    ]
+
+
+def route_cases(client: TestClient) -> Tuple[List[Case], set]:
+    """Cases calling every route, and the (method, path) pairs they cover"""
+    post = _distinct(make_corpus(50, seed=7))
+    ranged = _distinct(make_corpus(20, seed=8, range_count=10))
+    template_id = client.post('/api/templates', json={
+        'name': 'Launch', 'content': '**[PRODUCT]** is live, [NAME]!', 'category': 'business'}).json()['id']
+    session_id = client.post('/api/format/sessions', json={'content': post()['content']}).json()['session_id']
+    edits = itertools.count()
+
+    def ok(response):
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.request.method} {response.request.url.path}: "
+                               f"{response.status_code} {response.text[:200]}")
+        return response
+
+    def session_edit():
+        ok(client.post(f'/api/format/sessions/{session_id}/edits',
+                       json={'edits': [{'start': next(edits) % 500, 'text': 'x'}]}))
+
+    def session_cycle():
+        created_id = ok(client.post('/api/format/sessions', json={'content': post()['content']})).json()['session_id']
+        ok(client.get(f'/api/format/sessions/{created_id}'))
+        ok(client.delete(f'/api/format/sessions/{created_id}'))
+
+    def template_create():
+        # There is no delete route; delete through the service so the store doesn't grow
+        created = ok(client.post('/api/templates', json={
+            'name': 'Benchmark', 'content': 'Hello [NAME]!', 'category': 'custom'})).json()
+        get_template_service().delete_template(created['id'])
+
+    bulk_body = '\n'.join(json.dumps({'PRODUCT': f'Product {i}', 'NAME': f'Name {i}'}) for i in range(50))
+    cases = [
+        ('route.root', lambda: ok(client.get('/'))),
+        ('route.health', lambda: ok(client.get('/health'))),
+        ('route.format', lambda: ok(client.post('/api/format', json={'content': post()['content']}))),
+        ('route.format_advanced', lambda: ok(client.post('/api/format-advanced', json=ranged()))),
+        ('route.format_batch.8', lambda: ok(client.post('/api/format/batch', json={
+            'documents': [{'content': post()['content']} for _ in range(8)]}))),
+        ('route.format_stream', lambda: ok(client.post('/api/format/stream', content=post()['content'].encode()))),
+        ('route.validate', lambda: ok(client.post('/api/validate', json={'content': post()['content']}))),
+        ('route.unformat', lambda: ok(client.post('/api/unformat', json={
+            'content': get_formatter().format_for_linkedin(post()['content'])}))),
+        ('route.unformat_batch.8', lambda: ok(client.post('/api/unformat/batch', json={
+            'contents': [post()['content'] for _ in range(8)]}))),
+        ('route.cache_stats', lambda: ok(client.get('/api/cache/stats'))),
+        ('route.session_edit', session_edit),
+        ('route.session_create_get_delete', session_cycle),
+        ('route.templates', lambda: ok(client.get('/api/templates'))),
+        ('route.templates_create_delete', template_create),
+        ('route.templates_search', lambda: ok(client.get('/api/templates/search', params={'q': 'launch'}))),
+        ('route.template_get', lambda: ok(client.get(f'/api/templates/{template_id}'))),
+        ('route.template_render', lambda: ok(client.post(f'/api/templates/{template_id}/render', json={
+            'variables': {'PRODUCT': 'Clipsy', 'NAME': 'team'}}))),
+        ('route.template_render_bulk.50', lambda: ok(client.post(
+            f'/api/templates/{template_id}/render/bulk', content=bulk_body.encode()))),
+    ]
+    covered = {
+        ('GET', '/'), ('GET', '/health'), ('POST', '/api/format'), ('POST', '/api/format-advanced'),
+        ('POST', '/api/format/batch'), ('POST', '/api/format/stream'), ('POST', '/api/validate'),
+        ('POST', '/api/unformat'), ('POST', '/api/unformat/batch'), ('GET', '/api/cache/stats'),
+        ('POST', '/api/format/sessions'), ('GET', '/api/format/sessions/{session_id}'),
+        ('POST', '/api/format/sessions/{session_id}/edits'), ('DELETE', '/api/format/sessions/{session_id}'),
+        ('GET', '/api/templates'), ('POST', '/api/templates'), ('GET', '/api/templates/search'),
+        ('GET', '/api/templates/{template_id}'), ('POST', '/api/templates/{template_id}/render'),
+        ('POST', '/api/templates/{template_id}/render/bulk'),
+    }
+    if get_metrics() is not None:
+        cases.append(('route.metrics', lambda: ok(client.get('/metrics'))))
+        covered.add(('GET', '/metrics'))
+    return cases, covered
+
+
+def _load_handler():
+    """The serverless handler class from api/index.py, with logging silenced"""
+    spec = importlib.util.spec_from_file_location('api_index', API_INDEX_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    class QuietHandler(module.handler):
+        def log_message(self, format, *args):
+            pass
+
+    return QuietHandler
+
+
+def _call_handler(handler_class, method: str, path: str, body: Optional[dict] = None) -> bytes:
+    """Run one request through a BaseHTTPRequestHandler subclass without a socket"""
+    data = json.dumps(body).encode() if body is not None else b''
+    request = handler_class.__new__(handler_class)
+    request.rfile = io.BytesIO(data)
+    request.wfile = io.BytesIO()
+    request.headers = {'Content-Length': str(len(data)), 'Content-Type': 'application/json'}
+    request.command = method
+    request.path = path
+    request.request_version = 'HTTP/1.1'
+    request.requestline = f'{method} {path} HTTP/1.1'
+    request.client_address = ('127.0.0.1', 0)
+    request.close_connection = True
+    getattr(request, f'do_{method}')()
+    response = request.wfile.getvalue()
+    status = int(response.split(b' ', 2)[1])
+    if status >= 400:
+        raise RuntimeError(f"{method} {path}: {response[:200]!r}")
+    return response
+
+
+def handler_cases() -> List[Case]:
+    handler_class = _load_handler()
+    post = _distinct(make_corpus(50, seed=9))
+    ranged = _distinct(make_corpus(20, seed=10, range_count=10))
+    template_id = get_template_id()
+
+    def call(method, path, body=None):
+        return lambda: _call_handler(handler_class, method, path, body() if callable(body) else body)
+
+    return [
+        ('handler.format', call('POST', '/api/format', lambda: {'content': post()['content']})),
+        ('handler.format_advanced', call('POST', '/api/format-advanced', ranged)),
+        ('handler.format_batch.8', call('POST', '/api/format/batch', lambda: {
+            'documents': [{'content': post()['content']} for _ in range(8)]})),
+        ('handler.validate', call('POST', '/api/validate', lambda: {'content': post()['content']})),
+        ('handler.unformat', call('POST', '/api/unformat', lambda: {
+            'content': get_formatter().format_for_linkedin(post()['content'])})),
+        ('handler.unformat_batch.8', call('POST', '/api/unformat/batch', lambda: {
+            'contents': [post()['content'] for _ in range(8)]})),
+        ('handler.templates', call('GET', '/api/templates')),
+        ('handler.templates_search', call('GET', '/api/templates/search?q=launch')),
+        ('handler.template_render', call('POST', f'/api/templates/{template_id}/render', {
+            'variables': {'PRODUCT': 'Clipsy', 'NAME': 'team'}})),
+        ('handler.cache_stats', call('GET', '/api/cache/stats')),
+    ]
+
+
+def get_template_id() -> str:
+    """Id of a template in the process-wide service, as the route cases created it"""
+    return next(template['id'] for template in get_template_service().get_templates() if template['name'] == 'Launch')
+
+
+def measure(func: Callable[[], object], rounds: int) -> float:
+    """Best time per call over `rounds` rounds of about ROUND_SECONDS, in microseconds"""
+    func()  # Warm up caches and lazily built state
+    start = time.perf_counter()
+    func()
+    single = time.perf_counter() - start
+    number = max(1, int(ROUND_SECONDS / max(single, 1e-7)))
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+_REFERENCE_WORDS = re.compile(r'\w+')
+_REFERENCE_TEXT = ' '.join(f'word{i % 97} **bold{i % 13}**' for i in range(200))
+
+
+def reference_workload():
+    """Fixed pure-Python work (regex, string, dict and JSON) that sizes the machine's current speed"""
+    counts: Dict[str, int] = {}
+    for word in _REFERENCE_WORDS.findall(_REFERENCE_TEXT):
+        counts[word] = counts.get(word, 0) + 1
+    return json.loads(json.dumps(counts)), _REFERENCE_TEXT.replace('**', '').upper()
+
+
+def _uncovered_routes(covered: set) -> List[str]:
+    missing = []
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            for method in route.methods:
+                if (method, route.path) not in covered:
+                    missing.append(f"{method} {route.path}")
+    return sorted(missing)
+
+
+Results = Dict[str, Tuple[float, float]]  # Case name -> (microseconds per call, reference microseconds)
+
+
+def run_cases(select: Callable[[str], bool], rounds: int) -> Results:
+    """Time the cases whose names `select` accepts, each with the reference workload beside it"""
+    results: Results = {}
+    with TestClient(app) as client:
+        routes, covered = route_cases(client)
+        missing = _uncovered_routes(covered)
+        if missing:
+            raise SystemExit(f"Routes without a benchmark case: {', '.join(missing)}")
+        cases = engine_cases() + template_cases() + routes + handler_cases()
+        for name, func in cases:
+            if select(name):
+                reference = measure(reference_workload, rounds)
+                results[name] = (measure(func, rounds), reference)
+                print(f"  {name:<36}{results[name][0]:>12.1f} us", flush=True)
+    return results
+
+
+def load_baseline(path: str) -> Results:
+    with open(path, encoding='utf-8') as f:
+        baseline = json.load(f)
+    return {name: (value, baseline['reference'][name]) for name, value in baseline['cases'].items()}
+
+
+def save_baseline(path: str, results: Results):
+    names = sorted(results)
+    baseline = {
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+        'recorded': time.strftime('%Y-%m-%d'),
+        'cases': {name: round(results[name][0], 2) for name in names},
+        'reference': {name: round(results[name][1], 2) for name in names},
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, indent=2)
+        f.write('\n')
+
+
+def compare(results: Results, baseline: Results, threshold: float,
+            machine: Optional[float] = None) -> Tuple[List[str], float]:
+    """
+    Print each case against the baseline
+
+    Changes are relative to the machine's: the median change of the
+    reference workload timed beside each case, unless `machine` is given.
+
+    Returns:
+        Tuple of the cases slower by more than threshold and the machine's change
+    """
+    if machine is None:
+        common = [name for name in results if name in baseline]
+        machine = statistics.median(results[name][1] / baseline[name][1] for name in common) if common else 1.0
+    regressed = []
+    print()
+    print(f"Machine speed against the baseline: {1 / machine - 1:+.0%}")
+    print(f"{'case':<36}{'baseline us':>14}{'now us':>12}{'change':>10}")
+    print("=" * 72)
+    for name, (value, _) in results.items():
+        if name not in baseline:
+            print(f"{name:<36}{'-':>14}{value:>12.1f}{'new':>10}")
+            continue
+        base = baseline[name][0]
+        change = value / base / machine - 1
+        flag = '  REGRESSED' if change > threshold else ''
+        print(f"{name:<36}{base:>14.1f}{value:>12.1f}{change:>+9.0%}{flag}")
+        if change > threshold:
+            regressed.append(name)
+    return regressed, machine
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--save', action='store_true', help='record the results as the baseline')
+    parser.add_argument('--check', action='store_true', help='exit 1 if a case regressed beyond the threshold')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='baseline file (default: %(default)s)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown as a fraction of the baseline (default: %(default)s)')
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS, help='timed rounds per case')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='run the suite this many times and keep the median of each case')
+    parser.add_argument('--filter', help='only run cases whose name contains this')
+    args = parser.parse_args(argv)
+
+    print(f"Benchmark suite (best of {args.rounds} rounds, microseconds per call)")
+    runs = [run_cases(lambda name: not args.filter or args.filter in name, args.rounds) for _ in range(args.repeat)]
+    results = {
+        name: (statistics.median(run[name][0] for run in runs), statistics.median(run[name][1] for run in runs))
+        for name in runs[0]
+    }
+
+    if args.save:
+        if args.filter:
+            # Keep the baselines of the cases that didn't run
+            results = {**load_baseline(args.baseline), **results} if os.path.exists(args.baseline) else results
+        save_baseline(args.baseline, results)
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        regressed, machine = compare(results, load_baseline(args.baseline), args.threshold)
+        if args.check and regressed:
+            # A noisy round can make a case look slow; only fail if it is
+            # slow again over twice the rounds. The few cases re-run are too
+            # few for a machine estimate of their own, so the first run's is kept.
+            print(f"\nRe-running {len(regressed)} case(s) over the threshold")
+            retry = run_cases(set(regressed).__contains__, args.rounds * 2)
+            regressed, _ = compare(retry, load_baseline(args.baseline), args.threshold, machine)
+            if regressed:
+                print(f"\n{len(regressed)} case(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+                return 1
+        if args.check:
+            print(f"\nNo case regressed by more than {args.threshold:.0%}")
+    elif args.check:
+        print(f"\nNo baseline at {args.baseline}; record one with --save")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Run from the repository root or the backend directory alike: tests import
+# the app package the way api/index.py does
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Templates written by route tests go to a scratch store, not the working tree
+os.environ.setdefault('TEMPLATES_STORE', os.path.join(tempfile.mkdtemp(), 'templates.json'))
+
+
+def pytest_addoption(parser):
+    parser.addoption('--benchmarks', action='store_true', help="also run the wall-clock timing tests")
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "benchmark: wall-clock timing test, only run with --benchmarks")
+
+
+def pytest_collection_modifyitems(config, items):
+    # Timing ratios are only meaningful on an otherwise idle machine
+    if config.getoption('--benchmarks'):
+        return
+    skip = pytest.mark.skip(reason="timing test; run with --benchmarks")
+    for item in items:
+        if 'benchmark' in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from app.services import cache as cache_module
+from app.services.cache import ResultCache, make_key
+
+WAITERS = 8
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def _call_together(cache: ResultCache, key: str, compute):
+    """Have WAITERS threads ask for a key while the first computation is held open; return what each got"""
+    release = threading.Event()
+    outcomes = [None] * WAITERS
+
+    def held():
+        release.wait(5)
+        return compute()
+
+    def call(index):
+        try:
+            outcomes[index] = ('value', cache.get_or_compute(key, held))
+        except Exception as e:
+            outcomes[index] = ('error', e)
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(WAITERS)]
+    for thread in threads:
+        thread.start()
+    # Every thread but the leader is waiting on its flight
+    _wait_for(lambda: cache.stats()['coalesced'] == WAITERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+        assert not thread.is_alive()
+    return outcomes
+
+
+def test_concurrent_callers_compute_a_key_once():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(threading.get_ident())
+        return {'formatted': 'x'}
+
+    outcomes = _call_together(cache, 'key', compute)
+    assert len(calls) == 1
+    assert all(kind == 'value' for kind, _ in outcomes)
+    # Every caller gets the same shared result
+    assert all(value is outcomes[0][1] for _, value in outcomes)
+    assert cache.stats()['misses'] == 1
+    assert cache.get_or_compute('key', lambda: pytest.fail('recomputed')) is outcomes[0][1]
+
+
+def test_a_failing_leader_raises_to_every_waiter():
+    cache = ResultCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        raise ValueError('bad input')
+
+    outcomes = _call_together(cache, 'key', compute)
+    assert len(calls) == 1
+    assert all(kind == 'error' and str(error) == 'bad input' for kind, error in outcomes)
+    # Errors are never cached; the next caller computes again
+    assert cache.get_or_compute('key', lambda: 'ok') == 'ok'
+    assert cache.stats()['entries'] == 1
+
+
+def test_a_new_engine_version_misses_old_entries(monkeypatch):
+    cache = ResultCache()
+    old_key = make_key('format', 'hi', {})
+    cache.get_or_compute(old_key, lambda: 'old engine')
+
+    monkeypatch.setattr(cache_module, 'ENGINE_VERSION', cache_module.ENGINE_VERSION + '-next')
+    new_key = make_key('format', 'hi', {})
+    assert new_key != old_key
+    assert cache.get_or_compute(new_key, lambda: 'new engine') == 'new engine'
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = ResultCache(max_entries=2)
+    cache.get_or_compute('a', lambda: 'a')
+    cache.get_or_compute('b', lambda: 'b')
+    cache.get_or_compute('a', lambda: pytest.fail('recomputed'))
+    cache.get_or_compute('c', lambda: 'c')
+    assert cache.get_or_compute('b', lambda: 'b again') == 'b again'
+    assert cache.stats()['evictions'] == 2
+
+
+def test_entries_expire_after_the_ttl():
+    now = [0.0]
+    cache = ResultCache(ttl=10, clock=lambda: now[0])
+    cache.get_or_compute('a', lambda: 'first')
+    now[0] = 9.0
+    assert cache.get_or_compute('a', lambda: 'second') == 'first'
+    now[0] = 10.0
+    assert cache.get_or_compute('a', lambda: 'second') == 'second'
+    assert cache.stats()['expirations'] == 1
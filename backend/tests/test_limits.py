@@ -0,0 +1,189 @@
+import asyncio
+import importlib.util
+import io
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.dependencies import get_request_limits
+from app.main import app
+
+API_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'api', 'index.py')
+
+client = TestClient(app)
+MAX_UNIT = get_request_limits().max_stream_unit
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_stream_rejects_an_unclosed_tag_past_the_cap():
+    response = client.post('/api/format/stream', content=('<' + 'x' * (MAX_UNIT + 1)).encode())
+    assert response.status_code == 413
+
+
+def _stream(path: str, chunks):
+    """Send the body to the app in these chunks; returns the status and body"""
+    messages = [{'type': 'http.request', 'body': chunk, 'more_body': True} for chunk in chunks]
+    messages.append({'type': 'http.request', 'body': b'', 'more_body': False})
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+             'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+             'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80)}
+    asyncio.run(app(scope, receive, send))
+    status = next(message['status'] for message in sent if message['type'] == 'http.response.start')
+    return status, b''.join(message.get('body', b'') for message in sent if message['type'] == 'http.response.body')
+
+
+def test_stream_ends_with_an_error_once_output_was_sent():
+    status, body = _stream('/api/format/stream', [b'**done** first\n\n', b'y' * (MAX_UNIT + 1)])
+    lines = [json.loads(line) for line in body.decode().splitlines()]
+    assert status == 200
+    assert lines[0]['formatted_content'].startswith('\U0001d5f1')
+    assert 'error' in lines[-1]
+
+
+def test_stream_under_the_cap_matches_format():
+    body = '**Launch** day\n\n<b>team</b>\n\n_done_'
+    lines = _ndjson(client.post('/api/format/stream', content=body.encode()))
+    formatted = client.post('/api/format', json={'content': body}).json()['formatted_content']
+    assert ''.join(line.get('formatted_content', '') for line in lines) == formatted
+    assert lines[-1]['done']
+
+
+def test_stream_past_the_time_budget_gets_422(monkeypatch):
+    monkeypatch.setattr(get_request_limits(), 'time_budget', 0.0)
+    response = client.post('/api/format/stream', content=b'**Launch** day\n\nmore\n\n')
+    assert response.status_code == 422
+
+
+def test_session_edit_past_the_time_budget_leaves_the_session_as_it_was(monkeypatch):
+    created = client.post('/api/format/sessions', json={'content': '**Launch** day'}).json()
+    path = f"/api/format/sessions/{created['session_id']}"
+
+    monkeypatch.setattr(get_request_limits(), 'time_budget', 0.0)
+    response = client.post(path + '/edits', json={'edits': [{'start': 0, 'text': 'New\n\n'}]})
+    assert response.status_code == 422
+
+    monkeypatch.undo()
+    session = client.get(path).json()
+    assert (session['version'], session['formatted_content']) == (created['version'], created['formatted_content'])
+
+
+def test_session_create_past_the_time_budget_gets_422(monkeypatch):
+    monkeypatch.setattr(get_request_limits(), 'time_budget', 0.0)
+    response = client.post('/api/format/sessions', json={'content': '**Launch** day'})
+    assert response.status_code == 422
+
+
+def test_bulk_render_rejects_a_row_past_the_cap():
+    template_id = client.get('/api/templates').json()[0]['id']
+    row = json.dumps({'NAME': 'x' * (MAX_UNIT + 1)}).encode()
+    response = client.post(f'/api/templates/{template_id}/render/bulk', content=row)
+    assert response.status_code == 413
+
+
+def test_render_past_the_time_budget_gets_422(monkeypatch):
+    template_id = client.get('/api/templates').json()[0]['id']
+    monkeypatch.setattr(get_request_limits(), 'time_budget', 0.0)
+    response = client.post(f'/api/templates/{template_id}/render', json={'variables': {'NAME': 'x'}})
+    assert response.status_code == 422
+
+
+def test_bulk_render_reports_a_row_past_the_time_budget(monkeypatch):
+    template_id = client.get('/api/templates').json()[0]['id']
+    monkeypatch.setattr(get_request_limits(), 'time_budget', 0.0)
+    rows = b'{"NAME": "a"}\n{"NAME": "b"}\n'
+    lines = _ndjson(client.post(f'/api/templates/{template_id}/render/bulk', content=rows))
+    assert [line['error'].split(':')[0] for line in lines[:2]] == ['BudgetExceeded', 'BudgetExceeded']
+    assert lines[-1] == {'done': True, 'count': 2, 'error_count': 2}
+
+
+def _load_handler():
+    spec = importlib.util.spec_from_file_location('api_index', API_INDEX_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    class QuietHandler(module.handler):
+        def log_message(self, format, *args):
+            pass
+
+    return QuietHandler
+
+
+def _status(handler_class, headers, body: bytes = b'', path: str = '/api/format') -> int:
+    """Status of a POST through the serverless handler, without a socket"""
+    request = handler_class.__new__(handler_class)
+    request.rfile = io.BytesIO(body)
+    request.wfile = io.BytesIO()
+    request.headers = headers
+    request.command = 'POST'
+    request.path = path
+    request.request_version = 'HTTP/1.1'
+    request.requestline = f'POST {path} HTTP/1.1'
+    request.client_address = ('127.0.0.1', 0)
+    request.close_connection = True
+    request.do_POST()
+    return int(request.wfile.getvalue().split(b' ', 2)[1])
+
+
+@pytest.mark.parametrize('content_length', [None, '-1', 'abc', '1e3', '\u00b2'])
+def test_handler_rejects_a_bad_content_length(content_length):
+    headers = {} if content_length is None else {'Content-Length': content_length}
+    assert _status(_load_handler(), headers, b'{"content": "hi"}' * 10) == 400
+
+
+def test_handler_accepts_a_valid_content_length():
+    body = b'{"content": "hi"}'
+    assert _status(_load_handler(), {'Content-Length': str(len(body))}, body) == 200
+
+
+def test_tens_of_thousands_of_ranges_are_accepted():
+    # Range formatting is built for documents with tens of thousands of
+    # ranges, which take more than 2 MiB of JSON
+    ranges = [{'start': index * 5, 'end': index * 5 + 4, 'styles': ['bold']} for index in range(50_000)]
+    body = json.dumps({'content': 'word ' * 50_000, 'ranges': ranges}).encode()
+    assert len(body) > 2 * 1024 * 1024
+    assert _status(_load_handler(), {'Content-Length': str(len(body))}, body, '/api/format-advanced') == 200
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/validate', {'content': 5}),
+    ('/api/format', {'content': ['hi']}),
+    ('/api/format', {'content': 'hi', 'thread_limit': 'a'}),
+    ('/api/format-advanced', {'content': 'hi', 'ranges': [{'start': 'a'}]}),
+    ('/api/format-advanced', {'content': 'hi', 'ranges': [{'start': 0, 'end': 1, 'styles': 'bold'}]}),
+    ('/api/format-advanced', {'content': 'hi', 'ranges': {'start': 0, 'end': 1}}),
+])
+def test_malformed_documents_are_client_errors(path, body):
+    data = json.dumps(body).encode()
+    assert _status(_load_handler(), {'Content-Length': str(len(data))}, data, path) == 400
+    assert client.post(path, json=body).status_code == 422
+
+
+def test_batch_reports_a_malformed_range_per_document():
+    from app.dependencies import get_formatter, get_validator
+    from app.services.batch import BatchProcessor
+
+    documents = [{'content': 'hi', 'ranges': [{'start': 'a'}]}, {'content': 'hi'}]
+    results = BatchProcessor().run(get_formatter(), get_validator(), documents)['results']
+    assert results[0]['error'].startswith("Each range needs integer 'start' and 'end'")
+    assert results[1]['error'] is None
+
+
+def test_handler_renders_templates_under_the_time_budget(monkeypatch):
+    template_id = client.get('/api/templates').json()[0]['id']
+    monkeypatch.setattr(get_request_limits(), 'time_budget', 0.0)
+    body = b'{"variables": {"NAME": "x"}}'
+    headers = {'Content-Length': str(len(body))}
+    assert _status(_load_handler(), headers, body, f'/api/templates/{template_id}/render') == 422
@@ -0,0 +1,124 @@
+import random
+import re
+import time
+
+import pytest
+
+from app.services.markup_parser import BOLD, ITALIC, LINE, PARAGRAPH, StyleSpan, parse_markup
+
+# Pieces random inputs are built from: style tags in any case, other tags,
+# emphasis runs, words, punctuation, spaces and line breaks
+PIECES = [
+    '<b>', '</b>', '<B>', '<strong>', '</STRONG>', '<i>', '</i>', '<em>', '</em>', '<p>', '<br/>', '<',
+    '*', '**', '***', '_', '__', 'word', 'snake_case', 'x', ' ', ' ', '.', '(', ')', '\n', '\n\n',
+]
+TAG_RE = re.compile(r'<[^<>]+>')
+# Where styles end, in each scope
+BREAK_RES = {PARAGRAPH: re.compile(r'(\n(?:[^\S\n]*\n)+)'), LINE: re.compile(r'(\n)')}
+
+
+def _random_content(rng: random.Random, pieces: int) -> str:
+    return ''.join(rng.choice(PIECES) for _ in range(pieces))
+
+
+def _runs(span: StyleSpan, styles=frozenset()):
+    """(text, styles) for every text node of the tree, in order"""
+    runs = []
+    for child in span.children:
+        if isinstance(child, str):
+            runs.append((child, set(styles)))
+        else:
+            runs.extend(_runs(child, styles | {child.style}))
+    return runs
+
+
+def _spans(span: StyleSpan):
+    for child in span.children:
+        if isinstance(child, StyleSpan):
+            yield child
+            yield from _spans(child)
+
+
+def _text(span: StyleSpan) -> str:
+    return ''.join(text for text, _ in _runs(span))
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_random_markup_keeps_its_text(seed):
+    content = _random_content(random.Random(seed), 60)
+    tree = parse_markup(content)
+    # Matched markers and tags are consumed, unmatched markers kept; either
+    # way, what is left once they are all removed is the same text
+    assert re.sub(r'[*_]', '', _text(tree)) == re.sub(r'[*_]', '', TAG_RE.sub('', content))
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_random_markup_gives_a_well_formed_tree(seed):
+    content = _random_content(random.Random(seed), 60)
+    for scope in (PARAGRAPH, LINE):
+        tree = parse_markup(content, scope=scope)
+        assert tree.style is None
+        for span in _spans(tree):
+            assert span.style in (BOLD, ITALIC)
+            if scope == LINE:
+                assert '\n' not in _text(span)
+
+
+def _styled_chars(span: StyleSpan):
+    return [(char, frozenset(styles)) for text, styles in _runs(span) for char in text]
+
+
+@pytest.mark.parametrize('scope', [PARAGRAPH, LINE])
+@pytest.mark.parametrize('seed', range(100))
+def test_random_markup_matches_each_unit_parsed_alone(seed, scope):
+    content = _random_content(random.Random(seed), 60)
+    expected = []
+    for number, part in enumerate(BREAK_RES[scope].split(content)):
+        # Odd parts are the breaks between units, which are never styled
+        expected.extend([(char, frozenset()) for char in part] if number % 2 else
+                        _styled_chars(parse_markup(part, scope=scope)))
+    assert _styled_chars(parse_markup(content, scope=scope)) == expected
+
+
+def _best_time(content: str) -> float:
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        parse_markup(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('seed', range(5))
+def test_random_markup_parses_in_linear_time(seed):
+    # A random mix of markers, repeated: unbalanced ones are the inputs
+    # that made the lazy regex patterns quadratic
+    unit = _random_content(random.Random(seed), 40).replace('\n', ' ')
+    # 16 times the input; quadratic growth would take about 256 times as long
+    assert _best_time(unit * 800) < 64 * _best_time(unit * 50)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize('unit', ['<b>', '**x ', '<', '_a'], ids=['open_tags', 'open_stars', 'angles', 'underscores'])
+def test_unbalanced_markers_parse_in_linear_time(unit):
+    assert _best_time(unit * 32_000) < 64 * _best_time(unit * 2_000)
+
+
+@pytest.mark.parametrize('content, runs', [
+    ('<b>a<i>b</i>c</b>', [('a', {BOLD}), ('b', {BOLD, ITALIC}), ('c', {BOLD})]),
+    # A closing tag closes the nearest open tag of its name; tags opened
+    # inside a span that closes are dropped
+    ('<b>a<i>b</b>c</i>', [('a', {BOLD}), ('b', {BOLD}), ('c', set())]),
+    ('<i>a<b>b</i>c</b>', [('a', {ITALIC}), ('b', {ITALIC}), ('c', set())]),
+    ('<b><i>x</b></i>', [('x', {BOLD})]),
+    ('<b>x<b>y</b>z</b>', [('x', {BOLD}), ('y', {BOLD}), ('z', {BOLD})]),
+    ('</b>x<b>y', [('x', set()), ('y', set())]),
+    # </i> closes the inner <i>, so the outer one is never closed and a
+    # and b stay plain
+    ('<i>a<i></i>b', [('a', set()), ('b', set())]),
+    # Likewise the first <i> here, so X stays plain
+    ('<B></em><i><strong></strong>X<i></i>', [('X', set())]),
+])
+def test_misnested_html(content, runs):
+    assert [run for run in _runs(parse_markup(content)) if run[0]] == runs
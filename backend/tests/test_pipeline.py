@@ -0,0 +1,73 @@
+import tracemalloc
+
+import pytest
+
+from app.services.admission import RequestLimitError
+from app.services.formatter import LinkedInFormatter
+from app.services.pipeline import FormatStream, ParagraphSplitter
+
+CHUNK = 'growth <b>team</b> launch ' * 40 + '\n'  # About 1 KB
+
+
+def _peak_while_feeding(stream, chunks) -> int:
+    """Peak memory allocated while feeding the chunks, in bytes"""
+    tracemalloc.start()
+    try:
+        for chunk in chunks:
+            stream.feed(chunk)
+    finally:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return peak
+
+
+def test_memory_stays_flat_over_many_paragraphs():
+    stream = FormatStream(LinkedInFormatter(), max_paragraph=64_000)
+    paragraphs = (CHUNK * 3 + '\n' for _ in range(500))  # About 1.5 MB
+    assert _peak_while_feeding(stream, paragraphs) < 500_000
+
+
+def test_unclosed_tag_is_rejected_once_the_cap_is_reached():
+    splitter = ParagraphSplitter(track_tags=True, max_paragraph=64_000)
+    splitter.feed('<never closed\n\n')
+    line = 'growth team launch ' * 50 + '\n'
+    held = 0
+    with pytest.raises(RequestLimitError) as info:
+        for _ in range(5_000):  # About 5 MB, all after the open '<'
+            splitter.feed(line + '\n')
+            held += len(line) + 1
+    assert info.value.reason == 'paragraph_too_large'
+    assert held <= 64_000
+
+
+def test_memory_stays_flat_on_an_unclosed_tag():
+    stream = FormatStream(LinkedInFormatter(), max_paragraph=64_000)
+    chunks = ['<' + 'x' * 1_000 for _ in range(1_000)]  # About 1 MB, no '>' and no newline
+
+    def feed_all():
+        for chunk in chunks:
+            stream.feed(chunk)
+
+    tracemalloc.start()
+    try:
+        with pytest.raises(RequestLimitError):
+            feed_all()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 500_000
+
+
+def test_long_line_without_newline_is_rejected():
+    splitter = ParagraphSplitter(max_paragraph=10)
+    splitter.feed('12345')
+    with pytest.raises(RequestLimitError):
+        splitter.feed('678901')
+
+
+def test_output_unchanged_under_the_cap():
+    formatter = LinkedInFormatter()
+    text = '**Launch** day\n\n<b>team</b> <i>grew</i>\nfast\n\n\n_done_'
+    stream = FormatStream(formatter, max_paragraph=len(text))
+    pieces = [stream.feed(text[i:i + 3]) for i in range(0, len(text), 3)]
+    assert ''.join(pieces) + stream.close() == formatter.format_for_linkedin(text)
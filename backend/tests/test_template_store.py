@@ -0,0 +1,141 @@
+import os
+import threading
+
+import pytest
+
+from app.services.template_store import JournalTemplateStore, SqliteTemplateStore, open_template_store
+
+
+def _template(template_id: str, name: str = 'Post') -> dict:
+    return {'id': template_id, 'name': name, 'content': f'{name} [NAME]', 'category': 'general'}
+
+
+def _write(store, ops):
+    store.commit(store.append(ops))
+
+
+@pytest.fixture(params=['templates.json', 'templates.jsonl', 'templates.db'])
+def path(request, tmp_path):
+    return str(tmp_path / request.param)
+
+
+def test_store_keeps_the_latest_version_of_each_template_across_reopens(path):
+    store = open_template_store(path, legacy_json=None)
+    assert store.load() is None
+    _write(store, [('put', _template('a', 'one')), ('put', _template('b')), ('put', _template('c'))])
+    _write(store, [('put', _template('a', 'two')), ('delete', 'b')])
+    store.close()
+
+    store = open_template_store(path, legacy_json=None)
+    # An updated template keeps its position
+    assert [(t['id'], t['name']) for t in store.load()] == [('a', 'two'), ('c', 'Post')]
+    store.close()
+
+
+def test_store_that_was_emptied_is_not_new(path):
+    store = open_template_store(path, legacy_json=None)
+    _write(store, [('put', _template('a')), ('delete', 'a')])
+    store.close()
+    store = open_template_store(path, legacy_json=None)
+    assert store.load() == []
+    store.close()
+
+
+def test_concurrent_commits_are_all_durable(path):
+    store = open_template_store(path, legacy_json=None)
+    store.load()
+    threads = [
+        threading.Thread(target=_write, args=(store, [('put', _template(str(index)))]))
+        for index in range(16)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    store = open_template_store(path, legacy_json=None)
+    assert sorted(t['id'] for t in store.load()) == sorted(str(index) for index in range(16))
+    store.close()
+
+
+def test_another_process_commit_is_seen(path):
+    first = open_template_store(path, legacy_json=None)
+    second = open_template_store(path, legacy_json=None)
+    first.load()
+    second.load()
+    _write(second, [('put', _template('a'))])
+    assert first.has_changed()
+    assert [t['id'] for t in first.load()] == ['a']
+    assert not first.has_changed()
+    first.close()
+    second.close()
+
+
+@pytest.mark.parametrize('keep', [1, 10, -1], ids=['one_byte', 'mid_record', 'no_newline'])
+def test_journal_drops_a_torn_last_record(tmp_path, keep):
+    path = str(tmp_path / 'templates.jsonl')
+    store = JournalTemplateStore(path)
+    store.load()
+    _write(store, [('put', _template('a'))])
+    _write(store, [('put', _template('b'))])
+
+    # A crash part way through appending b's record
+    with open(path, 'rb') as f:
+        data = f.read()
+    first_end = data.index(b'\n') + 1
+    with open(path, 'wb') as f:
+        f.write(data[:first_end + keep] if keep > 0 else data[:keep])
+
+    store = JournalTemplateStore(path)
+    assert [t['id'] for t in store.load()] == ['a']
+    # The torn bytes are gone, so the next record starts on a line of its own
+    _write(store, [('put', _template('c'))])
+    assert [t['id'] for t in JournalTemplateStore(path).load()] == ['a', 'c']
+
+
+def test_journal_compaction_keeps_the_latest_version_of_each_template(tmp_path):
+    path = str(tmp_path / 'templates.jsonl')
+    store = JournalTemplateStore(path, compact_ratio=2.0, compact_min_records=4)
+    store.load()
+    _write(store, [('put', _template('a', 'a0')), ('put', _template('b', 'b0')), ('put', _template('c'))])
+    for version in range(1, 4):
+        _write(store, [('put', _template('a', f'a{version}'))])
+    _write(store, [('delete', 'c'), ('put', _template('b', 'b1'))])
+
+    # 9 records for 2 live templates: compacted to one record each
+    with open(path, 'rb') as f:
+        assert len(f.read().splitlines()) == 2
+    assert [(t['id'], t['name']) for t in JournalTemplateStore(path).load()] == [('a', 'a3'), ('b', 'b1')]
+
+    # Appends after compaction land in the new file
+    _write(store, [('put', _template('d'))])
+    assert [t['id'] for t in JournalTemplateStore(path).load()] == ['a', 'b', 'd']
+
+
+def test_journal_write_catches_up_with_a_compaction_by_another_process(tmp_path):
+    path = str(tmp_path / 'templates.jsonl')
+    first = JournalTemplateStore(path)
+    second = JournalTemplateStore(path, compact_ratio=1.0, compact_min_records=0)
+    first.load()
+    _write(first, [('put', _template('a', 'a0')), ('put', _template('a', 'a1'))])
+    second.load()
+    _write(second, [('put', _template('b'))])  # Compacts, replacing the file
+
+    _write(first, [('put', _template('c'))])
+    assert [(t['id'], t['name']) for t in JournalTemplateStore(path).load()] == [
+        ('a', 'a1'), ('b', 'Post'), ('c', 'Post')
+    ]
+
+
+def test_sqlite_rolls_back_a_failed_commit(tmp_path):
+    path = str(tmp_path / 'templates.db')
+    store = SqliteTemplateStore(path)
+    store.load()
+    _write(store, [('put', _template('a'))])
+    with pytest.raises(TypeError):
+        # The second template can't be serialized, so neither is stored
+        _write(store, [('put', _template('b')), ('put', {**_template('c'), 'content': object()})])
+    assert [t['id'] for t in store.load()] == ['a']
+    store.close()
+    assert os.path.exists(path)
@@ -0,0 +1,89 @@
+import os
+import signal
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.batch import BatchProcessor
+from app.services.formatter import LinkedInFormatter
+from app.services.offload import Offloader
+from app.services.template_render import CompiledTemplate, TemplateRenderer
+from app.services.validator import ContentValidator
+from app.services.workers import WorkerPool
+
+
+def _pid(formatter, validator):
+    return os.getpid()
+
+
+def _die(formatter, validator):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _die_once(formatter, validator, marker):
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os.kill(os.getpid(), signal.SIGKILL)
+    return 'done'
+
+
+@pytest.fixture
+def pool():
+    pool = WorkerPool(1)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_is_replaced_after_a_worker_is_killed(pool):
+    first = pool.run(_pid)
+    with pytest.raises(BrokenProcessPool):
+        pool.run(_die)
+    assert pool.run(_pid) != first
+
+
+def test_task_is_retried_once_when_its_worker_dies(pool, tmp_path):
+    assert pool.run(_die_once, str(tmp_path / 'killed')) == 'done'
+
+
+def test_offloader_recovers_on_a_shared_pool(pool):
+    offloader = Offloader(threshold=0, pool=pool)
+    formatted = LinkedInFormatter().format_for_linkedin('**hi**')
+    with pytest.raises(BrokenProcessPool):
+        pool.run(_die)
+    assert offloader.unformat(None, formatted) == '**hi**'
+    offloader.shutdown()
+
+
+
+def test_offloader_renders_templates_in_a_worker(pool):
+    offloader = Offloader(threshold=0, pool=pool)
+    renderer = TemplateRenderer(LinkedInFormatter(), ContentValidator(), CompiledTemplate('**Hi** [NAME], [DAY]'))
+    variables = {'NAME': 'Ada'}
+    assert offloader.render_template(renderer, variables) == renderer.render(variables)
+    offloader.shutdown()
+
+
+class _KillsWorker:
+    """A document that kills the worker process unpickling it"""
+
+    def __reduce__(self):
+        return _die, (None, None)
+
+
+def test_batch_fails_only_the_chunk_that_kills_its_worker():
+    pool = WorkerPool(2)
+    processor = BatchProcessor(inline_threshold=0, chunk_size=2, pool=pool)
+    documents = [{'content': f'post {index}'} for index in range(22)]
+    documents[5] = _KillsWorker()
+    try:
+        batch = processor.run(None, None, documents)
+    finally:
+        pool.shutdown()
+
+    assert [item['index'] for item in batch['results']] == list(range(22))
+    for item in batch['results']:
+        if item['index'] in (4, 5):
+            assert item['result'] is None and item['error'].startswith('BrokenProcessPool')
+        else:
+            assert item['error'] is None and item['result'] is not None
+    assert batch['error_count'] == 2
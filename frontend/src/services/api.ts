@@ -12,6 +12,9 @@ const api = axios.create({
 export interface FormatRequest {
   content: string;
   preserve_formatting?: boolean;
+  normalization?: 'NFC' | 'NFKC';
+  // Also split the output into numbered posts of at most this many UTF-16 units
+  thread_limit?: number;
 }
 
 export interface AdvancedFormatRequest {
@@ -21,12 +24,21 @@ export interface AdvancedFormatRequest {
     end: number;
     styles: string[];
   }>;
+  thread_limit?: number;
 }
 
 export interface FormatResponse {
   formatted_content: string;
   character_count: number;
   warnings: string[];
+  // [input_start, output_start, width] runs; only set by /api/format-advanced
+  offset_map?: Array<[number, number, number]> | null;
+  length?: {
+    code_points: number;
+    utf16_units: number; // What LinkedIn's character limit counts
+    graphemes: number;
+  } | null;
+  thread?: string[] | null;
 }
 
 export interface ValidateRequest {
@@ -39,6 +51,15 @@ export interface ValidateResponse {
   suggestions: string[];
 }
 
+export interface UnformatRequest {
+  content: string;
+}
+
+export interface UnformatResponse {
+  content: string;
+  character_count: number;
+}
+
 export interface Template {
   id: string;
   name: string;
@@ -47,6 +68,17 @@ export interface Template {
   description?: string;
 }
 
+export interface TemplateSearchResult extends Template {
+  score: number;
+}
+
+export interface TemplateSearchResponse {
+  results: TemplateSearchResult[];
+  offset: number;
+  limit: number;
+  has_more: boolean;
+}
+
 export const formatContent = async (request: FormatRequest): Promise<FormatResponse> => {
   const response = await api.post<FormatResponse>('/api/format', request);
   return response.data;
@@ -62,12 +94,47 @@ export const validateContent = async (request: ValidateRequest): Promise<Validat
   return response.data;
 };
 
+export const unformatContent = async (request: UnformatRequest): Promise<UnformatResponse> => {
+  const response = await api.post<UnformatResponse>('/api/unformat', request);
+  return response.data;
+};
+
 export const getTemplates = async (category?: string): Promise<Template[]> => {
   const params = category ? { category } : {};
   const response = await api.get<Template[]>('/api/templates', { params });
   return response.data;
 };
 
+export const searchTemplates = async (
+  q: string,
+  options: { category?: string; limit?: number; offset?: number } = {}
+): Promise<TemplateSearchResponse> => {
+  const response = await api.get<TemplateSearchResponse>('/api/templates/search', { params: { q, ...options } });
+  return response.data;
+};
+
+export interface RenderTemplateRequest {
+  variables: Record<string, string>;
+  format_output?: boolean;
+  preserve_formatting?: boolean;
+  parser?: 'regex' | 'fast';
+}
+
+export interface RenderTemplateResponse {
+  template_id: string;
+  content: string;
+  character_count: number;
+  missing_placeholders: string[];
+  is_valid: boolean;
+  warnings: string[];
+  suggestions: string[];
+}
+
+export const renderTemplate = async (id: string, request: RenderTemplateRequest): Promise<RenderTemplateResponse> => {
+  const response = await api.post<RenderTemplateResponse>(`/api/templates/${id}/render`, request);
+  return response.data;
+};
+
 export const createTemplate = async (template: Omit<Template, 'id'>): Promise<Template> => {
   const response = await api.post<Template>('/api/templates', template);
   return response.data;